@@ -14,77 +14,87 @@ bl_info = {
 
 import bpy
 import os
-import asyncio
-import requests
-import functools
-import shutil
 import json
+import itertools
+import time
 from . import async_computation
+from . import api_client
+from . import downloads
+from . import materials
+from . import texture_cache
+from . import polling
+from . import job_queue
+from . import mesh_upload
+from . import mesh_fingerprint
+from . import mesh_export
+from . import selection_index
+from . import texture_processing
+from . import resilience
+from . import instrumentation
+from . import job_ledger
 from bpy.app.handlers import persistent
 
 
 async def get_user_id():
-    url = "https://cloud.leonardo.ai/api/rest/v1/me"
-    headers = {
-        "accept": "application/json",
-        "authorization": f"Bearer {bpy.context.preferences.addons[__name__].preferences.api_key}"
-    }
-
-    get_id = functools.partial(requests.get, url, headers=headers)
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, get_id)
-    user_id = result.json()['user_details'][0]['user']['id']
-    return user_id
+    return await api_client.get_user_id()
 
 
 async def get_list_of_user_meshes(user_id):
-    url = f"https://cloud.leonardo.ai/api/rest/v1/models-3d/user/{user_id}"
+    return await api_client.list_user_meshes(user_id)
 
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "authorization": f"Bearer {bpy.context.preferences.addons[__name__].preferences.api_key}"
-    }
 
-    partial = functools.partial(requests.get, url, headers=headers)
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, partial)
-    user_meshes = [{'name': mesh['name'], 'id': mesh['id']} for mesh in result.json()['model_assets']]
+# Bumped whenever update_user_meshes() changes a collection, so the memoized enum items are rebuilt.
+_user_meshes_revision = 0
+_user_mesh_items_cache = {}
+
+
+def update_user_meshes(collection, meshes):
+    """Updates collection to match meshes, only touching entries that changed."""
+    global _user_meshes_revision
+
+    changed = False
+    wanted = {mesh['id']: mesh['name'] for mesh in meshes}
+    for index in reversed(range(len(collection))):
+        item = collection[index]
+        if item.id not in wanted:
+            collection.remove(index)
+            changed = True
+        else:
+            if item.name != wanted[item.id]:
+                item.name = wanted[item.id]
+                changed = True
+            del wanted[item.id]
 
-    return user_meshes
+    for mesh_id, name in wanted.items():
+        item = collection.add()
+        item.id = mesh_id
+        item.name = name
+        changed = True
+
+    if changed:
+        _user_meshes_revision += 1
 
 
 async def get_presigned_post_for_mesh_file(context):
 
     filename = bpy.data.filepath.split('/')[-1].split('.')[0] if bpy.data.filepath.split('/')[-1].split('.')[0] != "" else "Untitled"
-    url = "https://cloud.leonardo.ai/api/rest/v1/models-3d/upload"
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "authorization": f"Bearer {bpy.context.preferences.addons[__name__].preferences.api_key}"
-    }
 
     payload = {
         "name": context.scene.leonardo_tools.mesh_name_input if context.scene.leonardo_tools.mesh_name_input else filename,
         "modelExtension": "obj"
     }
-    partial = functools.partial(requests.post, url, json=payload, headers=headers)
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, partial)
+    result = await api_client.get_client().post("models-3d/upload", json=payload)
     return result
 
-async def upload_mesh_file(presigned_post, file_path):
+async def upload_mesh_file(presigned_post, file_path, on_progress=None):
     presigned_post = presigned_post.json()['uploadModelAsset']
     modelId = presigned_post['modelId']
     url = presigned_post['modelUrl']
     fields = json.loads(presigned_post['modelFields'])
-    files = {'file': open(file_path, 'rb')},
+    compress = bpy.context.preferences.addons[__name__].preferences.compress_uploads
 
     #Upload file to S3 using presigned URL
-    partial = functools.partial(requests.post, url, data=fields, files=files[0])
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, partial)
+    result = await mesh_upload.upload_file(url, fields, file_path, compress=compress, on_progress=on_progress)
     if result.status_code == 204:
         print("File uploaded successfully!")
         return modelId
@@ -106,6 +116,7 @@ def register_project_path(context):
 
     if not os.path.exists(path):
         os.makedirs(path)
+    instrumentation.set_trace_directory(path)
 
     export_path = os.path.join(path, "tmp.obj")
     context.scene.leonardo_tools.obj_export_path = export_path
@@ -127,12 +138,28 @@ def export_scene_as_tmp_objs(context):
     export_path = os.path.join(path, "tmp.obj")
     context.scene.leonardo_tools.obj_export_path = export_path
     
-    export_options = {
-        'use_selection': True,
-        'global_scale': 1.0,
+    if bpy.context.preferences.addons[__name__].preferences.mesh_exporter == 'NUMPY':
+        mesh_export.export_objects(export_path, context.selected_objects, context.evaluated_depsgraph_get())
+    else:
+        mesh_export.export_selection_with_operator(export_path)
+
+
+def build_generation_params(context, args={}):
+    params = { 
+        "prompt": context.scene.leonardo_tools.prompt_input,
+        'front_rotation_offset': float(context.scene.leonardo_tools.obj_direction),
+        'sd_version': context.scene.leonardo_tools.model_version,
+        'modelAssetId': context.scene.leonardo_tools.current_mesh_id,
     }
 
-    bpy.ops.export_scene.obj(filepath=export_path, **export_options)
+    if int(context.scene.leonardo_tools.seed_input) > 0:
+        params.update({"seed": int(context.scene.leonardo_tools.seed_input)})
+    
+    if context.scene.leonardo_tools.negative_prompt_input:
+        params["negative_prompt"] = context.scene.leonardo_tools.negative_prompt_input
+
+    params.update(args)
+    return params
 
 
 async def submit_texture_generation(context, args={}):
@@ -146,114 +173,49 @@ async def submit_texture_generation(context, args={}):
     
     scene = context.scene
     scene["selected_objs"] = selected_objs
-        
-    params = { 
-        "prompt": context.scene.leonardo_tools.prompt_input,
-        'front_rotation_offset': float(context.scene.leonardo_tools.obj_direction),
-        'sd_version': context.scene.leonardo_tools.model_version,
-        'modelAssetId': context.scene.leonardo_tools.current_mesh_id,
-    }
-    
-    params.update(args)
 
-    if int(context.scene.leonardo_tools.seed_input) > 0:
-        params.update({"seed": int(context.scene.leonardo_tools.seed_input)})
-    
-    if context.scene.leonardo_tools.negative_prompt_input:
-        params["negative_prompt"] = context.scene.leonardo_tools.negative_prompt_input
+    params = build_generation_params(context, args)
 
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "authorization": f"Bearer {bpy.context.preferences.addons[__name__].preferences.api_key}"
-    }
+    context.scene.job_id = ""
+    context.scene.leonardo_tools.currently_running_prompt_input = ""
+    with instrumentation.span('submit') as submit_span:
+        result = await api_client.post_texture_generation(params)
+        context.scene.job_id = resilience.get_json(result, "Job submission", 'textureGenerationJob', 'id')
+        submit_span.job = context.scene.job_id
+    context.scene.leonardo_tools.currently_running_prompt_input = context.scene.leonardo_tools.prompt_input
+    print(f"Job ID: {context.scene.job_id}")
+    result_folder = os.path.join(context.scene.result_path, context.scene.leonardo_tools.currently_running_prompt_input,
+                                 job_ledger.SEED_PLACEHOLDER)
+    job_ledger.record_submitted(context.scene.job_id, params, result_folder, [obj.name for obj in selected_objs],
+                                preview=params.get('preview', False))
 
-    # TODO make this a real API call with no mockup params
-    partial = functools.partial(requests.post, 'https://cloud.leonardo.ai/api/rest/v1/generations-texture', json=params, headers=headers)
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, partial)
-    print(f"Texture Result: {result.json()}")
-    
-    if result.status_code == 200:
-        context.scene.job_id = result.json()['textureGenerationJob'].get('id')
-        context.scene.leonardo_tools.currently_running_prompt_input = context.scene.leonardo_tools.prompt_input
-        print(f"Job ID: {context.scene.job_id}")
-    else:
-        print("Job submission failed!")
-        context.scene.job_id = ""
-        context.scene.leonardo_tools.currently_running_prompt_input = ""
-
-
-def assign_textures_to_model(context, path):
-    texture_image = None
-    normalmap_image = None
-    displacementmap_image = None
-    roughnessmap_image = None
-
-    for obj in context.scene["selected_objs"]:
-        print(f"Assigning textures to {obj.name}")
-        #create a new material
-        if obj.data.materials:
-            mat = obj.data.materials[0]
-        else:
-            mat = bpy.data.materials.new(name="New Material")
-            obj.data.materials.append(mat)
-
-        # Load the texture image
-        if context.scene.leonardo_tools.albedo_path != "":
-            texture_path = os.path.join(path, context.scene.leonardo_tools.albedo_path)
-            texture_image = bpy.data.images.load(texture_path)
-
-        # Load the normal map image
-        if context.scene.leonardo_tools.normalmap_path != "":
-            normalmap_path = os.path.join(path, context.scene.leonardo_tools.normalmap_path)
-            normalmap_image = bpy.data.images.load(normalmap_path)
-
-        # TODO: add support for displacement and roughness maps
-        # Load the displacement map image
-        if context.scene.leonardo_tools.displacementmap_path != "":
-            displacementmap_path = os.path.join(path,  context.scene.leonardo_tools.displacementmap_path)
-            displacementmap_image = bpy.data.images.load(displacementmap_path)
-
-        # Load the roughness map image
-        if context.scene.leonardo_tools.roughnessmap_path != "":
-            roughnessmap_path = os.path.join(path,  context.scene.leonardo_tools.roughnessmap_path)
-            roughnessmap_image = bpy.data.images.load(roughnessmap_path)
-        
-        # Add a new material to the object
-        mat.use_nodes = True
-        bsdf = mat.node_tree.nodes["Principled BSDF"]
-        
-        if context.scene.leonardo_tools.albedo_path != "":
-            texImage = mat.node_tree.nodes.get('Albedo', None)
-            if texImage is None:
-                texImage = mat.node_tree.nodes.new(type='ShaderNodeTexImage') 
-                texImage.label = "Albedo"
-                texImage.name = "Albedo"
-            texImage.image = texture_image
-            mat.node_tree.links.new(bsdf.inputs['Base Color'], texImage.outputs['Color'])
-        
-        if context.scene.leonardo_tools.normalmap_path != "":
-            normalImage = mat.node_tree.nodes.get('NormalMap', None)
-            if normalImage is None:
-                normalImage = mat.node_tree.nodes.new(type='ShaderNodeTexImage')
-                normalImage.image = normalmap_image
-            normalImage.label = "NormalMap"
-            normalImage.name = "NormalMap"
-            mat.node_tree.links.new(bsdf.inputs['Normal'], normalImage.outputs['Color'])
-        else:
-            # TODO this doesn't work
-            normalImage = mat.node_tree.nodes.get('NormalMap', None)
-            if normalImage is not None:
-                mat.node_tree.nodes.remove(normalImage)
 
-        context.scene.is_running = False
+def get_texture_paths(context):
+    texture_paths = {}
+    for map_type, property_name in downloads.TEXTURE_MAP_PROPERTIES.items():
+        path = getattr(context.scene.leonardo_tools, property_name)
+        if path != "":
+            texture_paths[map_type] = path
+    return texture_paths
 
-async def download_file_wrapper(url, path, context):
-    partial = functools.partial(download_file, url, path, context)
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, partial)
-    return result
+
+def set_texture_paths(context, texture_paths):
+    for map_type, path in texture_paths.items():
+        setattr(context.scene.leonardo_tools, downloads.TEXTURE_MAP_PROPERTIES[map_type], path)
+
+
+def report_error(context, error):
+    """Shows a failed request in the status label and resets the running state."""
+    print(f"Error: {error}")
+    context.scene.leonardo_tools.status_label = str(error)
+    context.scene.is_running = False
+    context.scene.has_returned = True
+
+
+def assign_textures_to_model(context, path, texture_paths=None, viewport_paths=None):
+    materials.apply_texture_maps(context.scene["selected_objs"], texture_paths or get_texture_paths(context), context.scene.job_id,
+                                 viewport_paths=viewport_paths, use_viewport=texture_processing.use_viewport_textures(context.scene))
+    context.scene.is_running = False
 
 def unset_paths(context):
     # TODO use property unset instead:
@@ -263,45 +225,11 @@ def unset_paths(context):
     context.scene.leonardo_tools.displacementmap_path = ""
 
 
-def download_file(url, path, context):      
-    filename = url.split('/')[-1]
-    dl_path = os.path.join(path, filename)
-    context.scene.leonardo_tools.status_label = f"Downloading {filename}"
-    print(f"Downloading {url} to {dl_path}")
-
-    if 'albedo.jpg' in filename:
-        context.scene.leonardo_tools.albedo_path = dl_path
-    elif 'normal.jpg' in filename:
-         context.scene.leonardo_tools.normalmap_path = dl_path
-    elif 'roughness.jpg' in filename:
-         context.scene.leonardo_tools.roughnessmap_path = dl_path
-    elif 'displacement.jpg' in filename:
-         context.scene.leonardo_tools.displacementmap_path = dl_path
-
-    with requests.Session() as session:
-        response = session.get(url, stream=True)
-        if response.status_code == 200:
-            with open(dl_path, 'wb') as writer:
-                response.raw.decode_content = True
-                shutil.copyfileobj(response.raw, writer)
-
-    print("Done downloading file")
-    return response.status_code
-
-
 async def check_texture_generation_job_status(context):
     # TODO make this a real API call with no mockup params
     print(f"Checking job status for {context.scene.job_id}...")
 
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "authorization": f"Bearer {bpy.context.preferences.addons[__name__].preferences.api_key}"
-    }
-
-    partial = functools.partial(requests.get, f'https://cloud.leonardo.ai/api/rest/v1/generations-texture/{context.scene.job_id}', headers=headers)
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(None, partial)
+    response = await api_client.get_texture_generation(context.scene.job_id)
     print(f"Response: {response}")
     return response
 
@@ -322,29 +250,76 @@ async def init_texture_generation_job(context, preview=False):
         context.scene.leonardo_tools.status_label = "Generating"
         
         await submit_texture_generation(context, args={'preview': preview, 'preview_direction': context.scene.leonardo_tools.preview_direction})
-        if context.scene.job_id == "":
-            context.scene.is_running = False
-            context.scene.has_returned = True
-            return
 
+        scheduler = polling.PollScheduler(polling.PREVIEW_PROFILE if preview else polling.FULL_PROFILE)
         generation_is_running = True
         response = None
         while generation_is_running:
-            await asyncio.sleep(10)
-            response = await check_texture_generation_job_status(context)
-            if response.json()['model_asset_texture_generations_by_pk'].get('status') == 'COMPLETE':
+            headers = response.headers if response is not None else None
+            if not await scheduler.wait(headers, should_continue=lambda: context.scene.is_running):
+                print(f"Stopped listening for job {context.scene.job_id}")
+                job_ledger.record_finished(context.scene.job_id, 'CANCELLED')
+                context.scene.has_returned = True
+                context.scene.leonardo_tools.status_label = ""
+                return
+            if scheduler.timed_out():
+                print(f"Job {context.scene.job_id} did not finish after {scheduler.elapsed:.0f}s")
+                job_ledger.record_finished(context.scene.job_id, 'FAILED')
+                context.scene.is_running = False
+                context.scene.has_returned = True
+                context.scene.leonardo_tools.status_label = "Generation timed out"
+                return
+
+            try:
+                instrumentation.count('polls')
+                with instrumentation.span('poll', context.scene.job_id) as poll_span:
+                    response = await check_texture_generation_job_status(context)
+                    generation = api_client.parse_texture_generation(response)
+                    poll_span.fields['status'] = generation.get('status')
+            except resilience.LeonardoError as ex:
+                if not ex.retryable:
+                    raise
+                print(f"{ex}, retrying")
+                context.scene.leonardo_tools.status_label = f"{ex}, retrying"
+                continue
+            context.scene.leonardo_tools.status_label = "Generating"
+            status = generation.get('status')
+            if status == 'COMPLETE':
                 generation_is_running = False
+                instrumentation.record('generation_wait', scheduler.elapsed, context.scene.job_id, polls=scheduler.polls)
+            elif status == 'FAILED':
+                print(f"Job {context.scene.job_id} failed")
+                job_ledger.record_finished(context.scene.job_id, 'FAILED')
+                context.scene.is_running = False
+                context.scene.has_returned = True
+                context.scene.leonardo_tools.status_label = "Generation failed"
+                return
 
         context.scene.leonardo_tools.status_label = "Receiving results"
         unset_paths(context)
-        final_result_path = make_result_dirs(context, str(response.json()['model_asset_texture_generations_by_pk'].get('seed')))
-        for image in response.json()['model_asset_texture_generations_by_pk'].get('model_asset_texture_images'):
-            await download_file_wrapper(image['url'], final_result_path, context)
+        final_result_path = make_result_dirs(context, str(generation.get('seed')))
+        on_map_ready = None
+        if bpy.context.preferences.addons[__name__].preferences.progressive_textures:
+            def on_map_ready(map_type, path):
+                materials.apply_texture_maps(context.scene["selected_objs"], {map_type: path}, context.scene.job_id, partial=True)
+
+        texture_paths = await downloads.download_texture_images(generation.get('model_asset_texture_images'), final_result_path, context.scene.job_id,
+                                                                on_progress=lambda text: setattr(context.scene.leonardo_tools, 'status_label', text),
+                                                                on_map_ready=on_map_ready, placeholders=preview,
+                                                                manifest_path=os.path.join(context.scene.result_path, downloads.MANIFEST_FILENAME))
+        set_texture_paths(context, texture_paths)
 
         print("Done downloading images!")
-        
-        assign_textures_to_model(context, final_result_path)
-        context.scene.last_seed = response.json()['model_asset_texture_generations_by_pk'].get('seed')
+
+        viewport_paths = {}
+        try:
+            with instrumentation.span('post_process', context.scene.job_id):
+                texture_paths, viewport_paths = await texture_processing.prepare_texture_maps(texture_paths)
+        except Exception as ex:
+            print(f"Post-processing the maps of job {context.scene.job_id} failed ({ex}), using them as downloaded")
+        assign_textures_to_model(context, final_result_path, texture_paths, viewport_paths)
+        job_ledger.record_finished(context.scene.job_id, 'COMPLETE', final_result_path)
+        context.scene.last_seed = generation.get('seed')
         context.scene.has_returned = True
 
         context.scene.leonardo_tools.status_label = ""
@@ -363,6 +338,37 @@ class SavePreferences(bpy.types.Operator):
         self.report({'INFO'}, "Preferences saved!")
         return {'FINISHED'}
 
+class TextureCacheStatsButton(bpy.types.Operator):
+    """Show how many texture maps are stored in the local texture cache"""
+    bl_idname = "wm.leonardo_cache_stats"
+    bl_label = "Texture cache statistics"
+
+    def execute(self, context):
+        stats = texture_cache.get_cache().stats()
+        self.report({'INFO'}, f"Texture cache: {stats['entries']} maps, "
+                              f"{stats['size'] / 1e6:.1f} of {stats['size_limit'] / 1e6:.0f} MB used, "
+                              f"{stats['hits']} hits / {stats['misses']} misses this session")
+        return {'FINISHED'}
+
+class ClearTextureCacheButton(bpy.types.Operator):
+    """Delete all texture maps stored in the local texture cache"""
+    bl_idname = "wm.leonardo_clear_cache"
+    bl_label = "Clear texture cache"
+
+    def execute(self, context):
+        texture_cache.get_cache().clear()
+        self.report({'INFO'}, "Texture cache cleared!")
+        return {'FINISHED'}
+
+class ResetStatsButton(bpy.types.Operator):
+    """Clear the timings and counters collected this session"""
+    bl_idname = "wm.leonardo_reset_stats"
+    bl_label = "Reset statistics"
+
+    def execute(self, context):
+        instrumentation.reset()
+        return {'FINISHED'}
+
 class NavigateToPreferencesButton(bpy.types.Operator):
     bl_idname = "wm.navigate_to_preferences_button"
     bl_label = "Go to preferences"
@@ -377,7 +383,10 @@ class TexturizeButton(bpy.types.Operator, async_computation.AsyncModalOperatorMi
     bl_label = "Submit!"
     
     async def async_execute(self, context):
-        await init_texture_generation_job(context, preview=False)
+        try:
+            await init_texture_generation_job(context, preview=False)
+        except resilience.LeonardoError as ex:
+            report_error(context, ex)
         self.quit()
 
 
@@ -387,10 +396,146 @@ class PreviewButton(bpy.types.Operator, async_computation.AsyncModalOperatorMixi
     bl_label = "Submit!"
 
     async def async_execute(self, context):
-        await init_texture_generation_job(context, preview=True)
+        try:
+            await init_texture_generation_job(context, preview=True)
+        except resilience.LeonardoError as ex:
+            report_error(context, ex)
         self.quit()
     
     
+class QueueTexturizeButton(bpy.types.Operator):
+    """Add a generation with the current settings to the job queue. Queued jobs run in parallel"""
+    bl_idname = "wm.leonardo_queue_button"
+    bl_label = "Queue"
+
+    preview: bpy.props.BoolProperty(name="Preview", default=False)
+
+    def execute(self, context):
+        register_project_path(context)
+        params = build_generation_params(context, {'preview': self.preview, 'preview_direction': context.scene.leonardo_tools.preview_direction})
+        job_queue.enqueue_job(context.scene, params, [obj.name for obj in context.selected_objects], preview=self.preview)
+        job_queue.ensure_queue_running()
+        self.report({'INFO'}, "Job queued!")
+        return {'FINISHED'}
+
+
+def split_list_input(text, separator):
+    return [item.strip() for item in text.split(separator) if item.strip()]
+
+
+class SweepTexturizeButton(bpy.types.Operator):
+    """Queue one generation for every combination of the given prompts, seeds, model versions and directions.
+    Each variant is downloaded into its own folder and the material is left untouched
+    """
+    bl_idname = "wm.leonardo_sweep_button"
+    bl_label = "Prompt/Seed Sweep"
+
+    # Submitting more variants at once is most likely a typo.
+    max_variants = 100
+
+    prompts: bpy.props.StringProperty(name="Prompts",
+                                        description="Prompts separated by ';'. Leave blank to use the current prompt",
+                                        default="",
+                                        maxlen=8192)
+
+    seeds: bpy.props.StringProperty(name="Seeds",
+                                        description="Seeds separated by ','. Leave blank to use the current seed",
+                                        default="")
+
+    model_versions: bpy.props.EnumProperty(name="Model Versions",
+                                        items=[('v1_5','v1', ''),('v2','v2', '')],
+                                        options={'ENUM_FLAG'},
+                                        default={'v1_5'})
+
+    obj_directions: bpy.props.EnumProperty(name="Directions",
+                                        items=[('-90','-x', ''),('0','-y', ''), ('90','x', ''), ('180','y', '')],
+                                        options={'ENUM_FLAG'},
+                                        default={'0'})
+
+    preview: bpy.props.BoolProperty(name="Preview", description="Only generate previews of the variants", default=False)
+
+    def invoke(self, context, event):
+        if not self.prompts:
+            self.prompts = context.scene.leonardo_tools.prompt_input
+        return context.window_manager.invoke_props_dialog(self, width=400)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "prompts")
+        layout.prop(self, "seeds")
+        layout.prop(self, "model_versions", expand=True)
+        layout.prop(self, "obj_directions", expand=True)
+        layout.prop(self, "preview")
+
+    def execute(self, context):
+        prompts = split_list_input(self.prompts, ';') or [context.scene.leonardo_tools.prompt_input]
+        try:
+            seeds = [int(seed) for seed in split_list_input(self.seeds, ',')] or [None]
+        except ValueError:
+            self.report({'ERROR'}, "Seeds must be whole numbers separated by ','")
+            return {'CANCELLED'}
+
+        variants = list(itertools.product(prompts, seeds, sorted(self.model_versions), sorted(self.obj_directions, key=float)))
+        if not variants:
+            self.report({'ERROR'}, "Select at least one model version and direction")
+            return {'CANCELLED'}
+        if len(variants) > self.max_variants:
+            self.report({'ERROR'}, f"A sweep can have at most {self.max_variants} variants, got {len(variants)}")
+            return {'CANCELLED'}
+
+        register_project_path(context)
+        sweep_id = time.strftime("%Y%m%d-%H%M%S")
+        object_names = [obj.name for obj in context.selected_objects]
+        for index, (prompt, seed, model_version, obj_direction) in enumerate(variants):
+            params = build_generation_params(context, {
+                'prompt': prompt,
+                'sd_version': model_version,
+                'front_rotation_offset': float(obj_direction),
+                'preview': self.preview,
+                'preview_direction': context.scene.leonardo_tools.preview_direction,
+            })
+            if seed is not None:
+                params['seed'] = seed
+            subfolder = os.path.join(f"sweep_{sweep_id}", f"{index:03d}_{bpy.path.clean_name(prompt)[:48]}_{model_version}_{obj_direction}_{params.get('seed', 'random')}")
+            job_queue.enqueue_job(context.scene, params, object_names, preview=self.preview, apply_textures=False,
+                                  subfolder=subfolder, sweep_id=sweep_id)
+
+        job_queue.write_sweep_summary(context.scene, sweep_id)
+        job_queue.ensure_queue_running()
+        self.report({'INFO'}, f"Queued {len(variants)} variants!")
+        return {'FINISHED'}
+
+
+class CancelJobButton(bpy.types.Operator):
+    """Stop listening for updates of this job. If the generation completes, it will still show up on the web app"""
+    bl_idname = "wm.leonardo_cancel_job"
+    bl_label = "Cancel job"
+
+    key: bpy.props.StringProperty()
+
+    def execute(self, context):
+        job = job_queue.get_job(context.scene.name, self.key)
+        if job is not None and job.status in job_queue.ACTIVE_STATUSES:
+            job.status = 'CANCELLED'
+            job.status_label = "Cancelled"
+            if job.job_id:
+                job_ledger.record_finished(job.job_id, 'CANCELLED')
+        return {'FINISHED'}
+
+
+class ClearFinishedJobsButton(bpy.types.Operator):
+    """Remove all finished, failed and cancelled jobs from the queue"""
+    bl_idname = "wm.leonardo_clear_finished_jobs"
+    bl_label = "Clear finished"
+
+    def execute(self, context):
+        jobs = context.scene.leonardo_jobs
+        for index in reversed(range(len(jobs))):
+            if jobs[index].status not in job_queue.ACTIVE_STATUSES:
+                jobs.remove(index)
+        return {'FINISHED'}
+
+
 class StopButton(bpy.types.Operator):
     """If it seems like your generation is taking too long, you can stop it here. This will make Blender stop listening to the API for updates.
     If the generation completes, it will still show up on the web app.
@@ -408,29 +553,71 @@ class UploadMeshButton(bpy.types.Operator, async_computation.AsyncModalOperatorM
     bl_label = "Upload selected Mesh(es)"
 
     async def async_execute(self, context):
+        try:
+            await self.upload(context)
+        except resilience.LeonardoError as ex:
+            report_error(context, ex)
+        self.quit()
+
+    async def upload(self, context):
         context.scene.leonardo_tools.status_label = "Uploading current mesh!"
         objects = bpy.context.selected_objects
         mesh_name = context.scene.leonardo_tools.mesh_name_input
         context.scene.is_running = True
-        post = await get_presigned_post_for_mesh_file(context)    
+        # Also sets the trace directory, so the spans of an upload before the first generation are traced.
+        register_project_path(context)
+
+        fingerprint = mesh_fingerprint.fingerprint_objects(objects, context.evaluated_depsgraph_get())
+        uploaded_mesh = mesh_fingerprint.find_uploaded_mesh(objects, fingerprint)
+        if uploaded_mesh is not None:
+            mesh_id, uploaded_name = uploaded_mesh
+            print(f"Mesh is unchanged, reusing uploaded mesh {mesh_id}")
+            for obj in objects:
+                obj.data['leonardo_id'] = mesh_id
+                obj.data['leonardo_name'] = uploaded_name
+                obj.data[mesh_fingerprint.FINGERPRINT_KEY] = fingerprint
+            selection_index.mark_dirty()
+            context.scene.leonardo_tools.current_mesh_name = uploaded_name
+            context.scene.leonardo_tools.current_mesh_id = mesh_id
+            context.scene.leonardo_tools.status_label = "Mesh unchanged, reusing upload!"
+            context.scene.is_running = False
+            return
+
+        with instrumentation.span('presign', mesh_name):
+            post = await get_presigned_post_for_mesh_file(context)
         if post.status_code == 200:
-            export_scene_as_tmp_objs(context)
+            context.scene.leonardo_tools.status_label = "Exporting mesh"
+            with instrumentation.span('export', mesh_name, objects=len(objects)) as export_span:
+                export_scene_as_tmp_objs(context)
             path = context.scene.leonardo_tools.obj_export_path
-            mesh_id = await upload_mesh_file(post, path)
+
+            def on_progress(sent, total):
+                context.scene.leonardo_tools.status_label = f"Uploading mesh {sent / 1e6:.1f}/{total / 1e6:.1f} MB"
+
+            with instrumentation.span('upload', mesh_name, bytes=os.path.getsize(path)) as upload_span:
+                mesh_id = await upload_mesh_file(post, path, on_progress=on_progress)
+            instrumentation.count('bytes_uploaded', os.path.getsize(path))
+            print(f"Mesh export took {export_span.duration:.2f}s, upload took {upload_span.duration:.2f}s "
+                  f"({os.path.getsize(path) / 1e6:.1f} MB)")
             if mesh_id:
                 for obj in objects:
                     obj.data['leonardo_id'] = mesh_id
                     obj.data['leonardo_name'] = mesh_name
+                    if fingerprint is not None:
+                        obj.data[mesh_fingerprint.FINGERPRINT_KEY] = fingerprint
+                selection_index.mark_dirty()
                 if bpy.context.selected_objects == objects:
                     context.scene.leonardo_tools.current_mesh_name = mesh_name
                     context.scene.leonardo_tools.current_mesh_id = mesh_id
                 context.scene.leonardo_tools.status_label = "Upload complete!"
+            else:
+                context.scene.leonardo_tools.status_label = "Upload failed!"
         else:
             print("Failed to get presigned post")
             print(post.status_code)
-        
+            context.scene.leonardo_tools.status_label = f"Upload failed: {resilience.describe_response(post)}"
+
         context.scene.is_running = False
-        self.quit()
 
 
 class QueryUserMeshesButton(bpy.types.Operator, async_computation.AsyncModalOperatorMixin):
@@ -439,13 +626,13 @@ class QueryUserMeshesButton(bpy.types.Operator, async_computation.AsyncModalOper
     bl_label = "Get your models!"
 
     async def async_execute(self, context):
-        user_id = await get_user_id()
-        meshes = await get_list_of_user_meshes(user_id)
-        context.scene.leonardo_tools.user_meshes.clear()
-        for user_mesh in meshes:
-            mesh = context.scene.leonardo_tools.user_meshes.add()
-            mesh.id = user_mesh['id']
-            mesh.name = user_mesh['name']
+        try:
+            user_id = await get_user_id()
+            meshes = await get_list_of_user_meshes(user_id)
+        except resilience.LeonardoError as ex:
+            context.scene.leonardo_tools.status_label = str(ex)
+        else:
+            update_user_meshes(context.scene.leonardo_tools.user_meshes, meshes)
         self.quit()
 
 
@@ -464,6 +651,9 @@ class AddModelDataToSelectedMeshButton(bpy.types.Operator):
                 for obj in selected_objects:
                     obj.data['leonardo_id'] = user_mesh.id
                     obj.data['leonardo_name'] = user_mesh.name
+                    # The geometry was not uploaded from here, so it is not known to match.
+                    obj.data.pop(mesh_fingerprint.FINGERPRINT_KEY, None)
+                selection_index.mark_dirty()
                 break
     
         return {'FINISHED'}
@@ -472,17 +662,138 @@ class AddModelDataToSelectedMeshButton(bpy.types.Operator):
 #    Properties
 # ------------------------------------------------------------------------
 
+def reset_client_callback(self, context):
+    # Drop the pooled client so the next call rebuilds it with the new settings.
+    api_client.close_client()
+    return None
+
+
+def gc_generation_update_callback(self, context):
+    async_computation.gc_generation = None if self.gc_generation == 'NONE' else int(self.gc_generation)
+    return None
+
+
+def executor_size_update_callback(self, context):
+    async_computation.configure_executor(async_computation.IO_EXECUTOR, self.io_workers)
+    async_computation.configure_executor(async_computation.CPU_EXECUTOR, self.cpu_workers)
+    return None
+
+
 class LeonardoTexturingToolPreferences(bpy.types.AddonPreferences):
     bl_idname = __name__
     api_key: bpy.props.StringProperty(name="API Key",
                                         description="Enter your Leonardo.ai API key here",
                                         default="",
                                         maxlen=256,
-                                        subtype="PASSWORD")
+                                        subtype="PASSWORD",
+                                        update=reset_client_callback)
+
+    http_transport: bpy.props.EnumProperty(name="HTTP Transport",
+                                        description="How requests to the Leonardo API are sent",
+                                        items=[('ASYNCIO', 'Asyncio', 'Non-blocking requests running on the asyncio loop'),
+                                               ('REQUESTS', 'Requests', 'Blocking requests running in a thread pool (fallback)')],
+                                        default='ASYNCIO',
+                                        update=reset_client_callback)
+
+    max_parallel_downloads: bpy.props.IntProperty(name="Parallel Downloads",
+                                        description="How many texture maps are downloaded at the same time",
+                                        default=4,
+                                        min=1,
+                                        max=16)
+
+    max_jobs_in_flight: bpy.props.IntProperty(name="Parallel Jobs",
+                                        description="How many queued generation jobs may run on the server at the same time",
+                                        default=3,
+                                        min=1,
+                                        max=10)
+
+    progressive_textures: bpy.props.BoolProperty(name="Progressive Textures",
+                                        description="Show each texture map as soon as it is downloaded, starting with the albedo",
+                                        default=True)
+
+    texture_post_processing: bpy.props.BoolProperty(name="Texture Resolution Variants",
+                                        description="Write lower resolution variants of downloaded maps and show them in the viewport",
+                                        default=False)
+
+    viewport_texture_size: bpy.props.EnumProperty(name="Viewport Texture Size",
+                                        description="Resolution of the maps shown in the viewport",
+                                        items=[('1K', '1K', 'At most 1024 pixels'),
+                                               ('2K', '2K', 'At most 2048 pixels')],
+                                        default='2K')
+
+    pack_channels: bpy.props.BoolProperty(name="Pack Roughness and Displacement",
+                                        description="Pack roughness and displacement into the channels of a single image",
+                                        default=False)
+
+    mesh_exporter: bpy.props.EnumProperty(name="Mesh Exporter",
+                                        description="How selected meshes are exported before uploading",
+                                        items=[('NUMPY', 'Built-in', 'Fast exporter writing only positions, UVs and faces'),
+                                               ('OPERATOR', 'OBJ Operator', "Blender's OBJ export operator")],
+                                        default='NUMPY')
+
+    compress_uploads: bpy.props.BoolProperty(name="Compress Mesh Uploads",
+                                        description="Upload meshes gzip compressed when the server accepts it",
+                                        default=True)
+
+    io_workers: bpy.props.IntProperty(name="I/O Threads",
+                                        description="Threads for blocking network and file operations",
+                                        default=async_computation.DEFAULT_IO_WORKERS,
+                                        min=1,
+                                        max=64,
+                                        update=executor_size_update_callback)
+
+    cpu_workers: bpy.props.IntProperty(name="Processing Threads",
+                                        description="Threads for compression, hashing and image processing",
+                                        default=async_computation.DEFAULT_CPU_WORKERS,
+                                        min=1,
+                                        max=32,
+                                        update=executor_size_update_callback)
+
+    gc_generation: bpy.props.EnumProperty(name="Garbage Collection",
+                                        description="Collect garbage once all background tasks finished. Full collections can stall large sessions",
+                                        items=[('NONE', 'Off', 'Leave garbage collection to Python'),
+                                               ('0', 'Young objects', 'Collect only the youngest generation'),
+                                               ('2', 'Full', 'Run a full collection')],
+                                        default='NONE',
+                                        update=gc_generation_update_callback)
+
+    cache_directory: bpy.props.StringProperty(name="Texture Cache Directory",
+                                        description="Where downloaded texture maps are cached. Can be a shared drive. Leave blank for the default location",
+                                        default="",
+                                        maxlen=1024,
+                                        subtype="DIR_PATH")
+
+    cache_size_limit: bpy.props.IntProperty(name="Texture Cache Size (MB)",
+                                        description="Least recently used maps are evicted once the cache grows beyond this size. 0 disables the cache",
+                                        default=2048,
+                                        min=0)
     
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "api_key")
+        layout.prop(self, "http_transport")
+        layout.prop(self, "max_parallel_downloads")
+        layout.prop(self, "max_jobs_in_flight")
+        layout.prop(self, "progressive_textures")
+        layout.prop(self, "texture_post_processing")
+        col = layout.column()
+        col.enabled = self.texture_post_processing
+        col.prop(self, "viewport_texture_size")
+        col.prop(self, "pack_channels")
+        layout.prop(self, "mesh_exporter")
+        layout.prop(self, "compress_uploads")
+        layout.prop(self, "io_workers")
+        layout.prop(self, "cpu_workers")
+        box = layout.box()
+        for name, stats in async_computation.executor_stats().items():
+            box.label(text=f"{name.upper()} pool: {stats['active']}/{stats['workers']} busy "
+                           f"({stats['utilization']:.0%}), {stats['queued']} queued, {stats['completed']} done")
+        layout.prop(self, "gc_generation")
+        layout.prop(self, "cache_directory")
+        layout.prop(self, "cache_size_limit")
+        row = layout.row()
+        row.operator(TextureCacheStatsButton.bl_idname, icon="INFO")
+        row.operator(ClearTextureCacheButton.bl_idname, icon="TRASH")
         layout.operator("wm.leonardo_save_prefs")
 
     def save_preferences(self):
@@ -498,19 +809,86 @@ class LeonardoTexturingToolPreferences(bpy.types.AddonPreferences):
         return len(self.get_api_key()) > 0
     
 
+def update_current_mesh(scene):
+    selected_objects = bpy.context.selected_objects
+    current_mesh_id = ""
+    current_mesh_name = ""
+    if len(selected_objects) > 0:
+        leonardo_id = selection_index.get_leonardo_id(selected_objects[0])
+        if leonardo_id and all(selection_index.get_leonardo_id(obj) == leonardo_id for obj in selected_objects):
+            if len(selection_index.objects_with_id(leonardo_id)) == len(selected_objects):
+                current_mesh_id = leonardo_id
+                current_mesh_name = selected_objects[0].data.get('leonardo_name', "")
+
+    # Only write on change, writing triggers another depsgraph update.
+    if scene.leonardo_tools.current_mesh_id != current_mesh_id:
+        scene.leonardo_tools.current_mesh_id = current_mesh_id
+    if scene.leonardo_tools.current_mesh_name != current_mesh_name:
+        scene.leonardo_tools.current_mesh_name = current_mesh_name
+
+
 @persistent
 def selection_handler(scene):
-    if len(bpy.context.selected_objects) > 0:
-        leonardo_id = bpy.context.selected_objects[0].data.get('leonardo_id', False)
-        all_objects_with_leonardo_id = list(filter(lambda obj: obj.data.get('leonardo_id', False) and obj.data.get('leonardo_id', False) == leonardo_id, bpy.data.objects))
-        if leonardo_id and len(all_objects_with_leonardo_id) == len(bpy.context.selected_objects):
-            if all(obj.data.get('leonardo_id', "") == leonardo_id for obj in bpy.context.selected_objects):
-                scene.leonardo_tools.current_mesh_id = leonardo_id
-                scene.leonardo_tools.current_mesh_name = bpy.context.selected_objects[0].data.get('leonardo_name', "")
-                return
-        
-    scene.leonardo_tools.current_mesh_name = ""
-    scene.leonardo_tools.current_mesh_id = ""
+    # Most depsgraph updates are edits or transforms, which leave the selection untouched.
+    if selection_index.selection_changed(bpy.context):
+        update_current_mesh(scene)
+
+
+def active_object_changed():
+    selection_handler(bpy.context.scene)
+
+
+# Owner of the msgbus subscription to active object changes.
+_msgbus_owner = object()
+
+
+def subscribe_to_active_object():
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    bpy.msgbus.subscribe_rna(key=(bpy.types.LayerObjects, "active"), owner=_msgbus_owner, args=(),
+                             notify=active_object_changed)
+
+
+# Seconds after loading a file until its unfinished jobs are resumed.
+RESUME_DELAY = 1.0
+
+
+def resume_unfinished_jobs():
+    """Puts the jobs of this file that were submitted but never finished back into the job queue."""
+    job_queue.interrupt_orphaned_jobs()
+    if not bpy.context.preferences.addons[__name__].preferences.api_key:
+        return None
+    if not bpy.context.window_manager.windows:
+        # Try again once there is a window to run the asyncio loop in.
+        return RESUME_DELAY
+    entries = job_ledger.get_unfinished_jobs(bpy.data.filepath)
+    if not entries:
+        return None
+
+    register_project_path(bpy.context)
+    for entry in entries:
+        print(f"Resuming job {entry['job_id']} submitted {time.ctime(entry['submitted'])}")
+        job_queue.resume_job(bpy.context.scene, entry)
+    job_queue.ensure_queue_running()
+    return None
+
+
+def schedule_resume_unfinished_jobs():
+    # Batch runs resume their own jobs. Interactive sessions wait until the file is shown and the asyncio loop can run.
+    if not bpy.app.background and not bpy.app.timers.is_registered(resume_unfinished_jobs):
+        bpy.app.timers.register(resume_unfinished_jobs, first_interval=RESUME_DELAY)
+
+
+@persistent
+def load_post_handler(*args):
+    # Loading a file drops all msgbus subscriptions and invalidates the id index.
+    selection_index.mark_dirty()
+    subscribe_to_active_object()
+    schedule_resume_unfinished_jobs()
+
+
+@persistent
+def undo_post_handler(*args):
+    selection_index.mark_dirty()
 
 
 class LeonardoUserModel(bpy.types.PropertyGroup):
@@ -524,6 +902,11 @@ def update_callback(self, context):
             region.tag_redraw()
     return None
 
+def texture_resolution_update_callback(self, context):
+    materials.set_texture_resolution(self.texture_resolution == 'VIEWPORT')
+    return None
+
+
 class LeonardoTexturingToolSettings(bpy.types.PropertyGroup):    
     prompt_input: bpy.props.StringProperty(name="",
                                         description="Enter your prompt here to texture your model",
@@ -601,13 +984,31 @@ class LeonardoTexturingToolSettings(bpy.types.PropertyGroup):
     
     collapse_preview_settings: bpy.props.BoolProperty(name="Collapse Preview Settings", default=True)
 
+    collapse_job_queue: bpy.props.BoolProperty(name="Collapse Job Queue", default=False)
+
+    texture_resolution: bpy.props.EnumProperty(name="Textures",
+                                        description="Which resolution of the generated maps is used",
+                                        items=[('VIEWPORT', 'Viewport', 'Lower resolution variants, to keep the viewport responsive'),
+                                               ('RENDER', 'Render', 'Full resolution maps for final renders')],
+                                        default='VIEWPORT',
+                                        update=texture_resolution_update_callback)
+
+
+    user_mesh_filter: bpy.props.StringProperty(name="",
+                                        description="Only list your meshes whose name contains this text",
+                                        default="",
+                                        options={'TEXTEDIT_UPDATE'})
 
     def get_user_mesh_items(self, context):
-        # Get all the LeonardoUserModel instances in the collection
+        # The items are only rebuilt when the collection or the filter changed. Blender also needs the
+        # returned strings to stay referenced from Python, which the cache takes care of.
         user_meshes = self.user_meshes
-        # Create a list of tuples in the format required by the EnumProperty
-        items = [(um.id, um.name, '') for um in user_meshes]
-        return items
+        key = (self.as_pointer(), len(user_meshes), _user_meshes_revision, self.user_mesh_filter)
+        if _user_mesh_items_cache.get('key') != key:
+            search = self.user_mesh_filter.lower()
+            _user_mesh_items_cache['key'] = key
+            _user_mesh_items_cache['items'] = [(um.id, um.name, '') for um in user_meshes if search in um.name.lower()]
+        return _user_mesh_items_cache['items']
     
 
     uploaded_user_meshes: bpy.props.EnumProperty(
@@ -660,7 +1061,9 @@ class LeonardoPanel(bpy.types.Panel):
                 row = box.row()
                 row.operator(QueryUserMeshesButton.bl_idname, text=QueryUserMeshesButton.bl_label, icon="IMPORT")
                 row.enabled = not context.scene.is_running
-                if len(context.scene.leonardo_tools.uploaded_user_meshes) > 0:
+                if len(context.scene.leonardo_tools.user_meshes) > 0:
+                    row = box.row()
+                    row.prop(context.scene.leonardo_tools, "user_mesh_filter", icon="VIEWZOOM")
                     row = box.row()
                     row.prop(context.scene.leonardo_tools, "uploaded_user_meshes")
                     row = box.row()
@@ -691,6 +1094,10 @@ class LeonardoPanel(bpy.types.Panel):
             row = layout.row()
             row.prop(leonardo_tools, 'model_version', expand=True)
 
+            if bpy.context.preferences.addons[__name__].preferences.texture_post_processing:
+                row = layout.row()
+                row.prop(leonardo_tools, 'texture_resolution', expand=True)
+
             if not bpy.data.is_saved:
                 box = layout.box()
                 box.label(text="File not saved", icon="ERROR")
@@ -723,6 +1130,36 @@ class LeonardoPanel(bpy.types.Panel):
             row.operator(TexturizeButton.bl_idname, text="Texturize!", icon="BRUSH_SMEAR")
             row.enabled = len([obj for obj in bpy.context.selected_objects]) > 0  and leonardo_tools.current_mesh_id != "" and not context.scene.is_running
 
+            row = layout.row(align=True)
+            row.operator(QueueTexturizeButton.bl_idname, text="Queue texture", icon="ADD").preview = False
+            row.operator(QueueTexturizeButton.bl_idname, text="Queue preview", icon="ADD").preview = True
+            row.enabled = objects_are_selected and leonardo_tools.current_mesh_id != ""
+            row = layout.row(align=True)
+            row.operator(SweepTexturizeButton.bl_idname, icon="MOD_ARRAY")
+            row.enabled = objects_are_selected and leonardo_tools.current_mesh_id != ""
+
+            if len(context.scene.leonardo_jobs) > 0:
+                box = layout.box()
+                row = box.row()
+                row.prop(leonardo_tools, "collapse_job_queue", text="", icon="TRIA_DOWN" if not leonardo_tools.collapse_job_queue else "TRIA_RIGHT", emboss=False)
+                active_jobs = len([job for job in context.scene.leonardo_jobs if job.status in job_queue.ACTIVE_STATUSES])
+                row.label(text=f"Job Queue ({active_jobs} active)", icon="SORTTIME")
+                if not leonardo_tools.collapse_job_queue:
+                    sweeps = {}
+                    for job in context.scene.leonardo_jobs:
+                        if job.sweep_id:
+                            done, total = sweeps.get(job.sweep_id, (0, 0))
+                            sweeps[job.sweep_id] = (done + (job.status == 'COMPLETE'), total + 1)
+                    for sweep_id, (done, total) in sweeps.items():
+                        box.label(text=f"Sweep {sweep_id}: {done}/{total} variants done", icon="MOD_ARRAY")
+                    for job in context.scene.leonardo_jobs:
+                        row = box.row(align=True)
+                        row.label(text=job.prompt or "(no prompt)", icon="HIDE_OFF" if job.preview else "BRUSH_SMEAR")
+                        row.label(text=job.status_label)
+                        if job.status in job_queue.ACTIVE_STATUSES:
+                            row.operator(CancelJobButton.bl_idname, text="", icon="X").key = job.key
+                    box.operator(ClearFinishedJobsButton.bl_idname, icon="TRASH")
+
         if context.scene.is_running:
             new_row = layout.row(align=True)
             new_row.alignment = 'CENTER'
@@ -750,17 +1187,62 @@ class LeonardoPanel(bpy.types.Panel):
             row.alignment = 'CENTER'
             row.label(text=leonardo_tools.current_mesh_name)
 
+class LeonardoStatsPanel(bpy.types.Panel):
+    bl_label = "Statistics"
+    bl_idname = "LEONARDO_TOOLS_PT_LeonardoStatsPanel"
+    bl_parent_id = "LEONARDO_TOOLS_PT_LeonardoPanel"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "Leonardo Texturizer"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        rows = instrumentation.stats()
+        if not rows and not instrumentation.counters:
+            layout.label(text="Nothing measured yet")
+            return
+
+        col = layout.column(align=True)
+        for name, number, total, mean in rows:
+            col.label(text=f"{name}: {number}x, {total:.2f}s total, {mean:.2f}s mean")
+        for name, value in sorted(instrumentation.counters.items()):
+            if name.startswith('bytes'):
+                col.label(text=f"{name}: {value / 1e6:.1f} MB")
+            else:
+                col.label(text=f"{name}: {value}")
+
+        job = instrumentation.last_job()
+        if job is not None:
+            box = layout.box()
+            box.label(text=f"Last job {job[:8]}")
+            events = instrumentation.timeline(job)
+            start = min(event['start'] for event in events)
+            for event in events:
+                box.label(text=f"+{event['start'] - start:.2f}s {event['name']} {event['duration']:.2f}s")
+
+        layout.operator(ResetStatsButton.bl_idname, icon="TRASH")
+
 classes = (
     LeonardoUserModel,
+    job_queue.LeonardoJob,
     LeonardoTexturingToolSettings,
     LeonardoTexturingToolPreferences, 
     LeonardoPanel, 
+    LeonardoStatsPanel,
     TexturizeButton, 
     NavigateToPreferencesButton, 
     StopButton,
     SavePreferences,
+    TextureCacheStatsButton,
+    ClearTextureCacheButton,
+    ResetStatsButton,
     async_computation.AsyncLoopModalOperator,
     PreviewButton,
+    QueueTexturizeButton,
+    SweepTexturizeButton,
+    CancelJobButton,
+    ClearFinishedJobsButton,
     UploadMeshButton,
     QueryUserMeshesButton,
     AddModelDataToSelectedMeshButton
@@ -773,19 +1255,26 @@ def reset_properties():
     del bpy.types.Scene.job_id
     del bpy.types.Scene.has_returned
     del bpy.types.Scene.last_seed
+    del bpy.types.Scene.leonardo_jobs
 
 
 def register():
-    async_computation.setup_asyncio_executor()
-
     for cls in classes:    
         bpy.utils.register_class(cls)
 
+    addon = bpy.context.preferences.addons.get(__name__)
+    if addon is not None:
+        async_computation.setup_asyncio_executor(addon.preferences.io_workers, addon.preferences.cpu_workers)
+        gc_generation_update_callback(addon.preferences, bpy.context)
+    else:
+        async_computation.setup_asyncio_executor()
+
     bpy.types.Scene.leonardo_tools = bpy.props.PointerProperty(type=LeonardoTexturingToolSettings)
     bpy.types.Scene.is_running = bpy.props.BoolProperty(name="Script is running", default = False)
     bpy.types.Scene.has_returned = bpy.props.BoolProperty(name="Script has returned", default = False)
     bpy.types.Scene.result_path = bpy.props.StringProperty(name="result_path", default = "")
     bpy.types.Scene.job_id = bpy.props.StringProperty(name="Id of current running job", default = "")
+    bpy.types.Scene.leonardo_jobs = bpy.props.CollectionProperty(type=job_queue.LeonardoJob)
     bpy.types.Scene.last_seed = bpy.props.FloatProperty(name="Seed",
                                         description="Seed of the last generation",
                                         default=0,
@@ -794,17 +1283,34 @@ def register():
                                         step=1,
                                         min=0)
     
-    # TODO this leads to a lot of updates because not only selection triggers the depsgraph update. This can be optimized
-    # according to https://blender.stackexchange.com/questions/150809/how-to-get-an-event-when-an-object-is-selected for example
+    # Changes of the active object are published on the msgbus. Other selection changes (e.g. box select) only show up
+    # as depsgraph updates, so the handler stays registered but bails out early unless the selection changed.
     bpy.app.handlers.depsgraph_update_post.append(selection_handler)
+    bpy.app.handlers.load_post.append(load_post_handler)
+    bpy.app.handlers.undo_post.append(undo_post_handler)
+    bpy.app.handlers.redo_post.append(undo_post_handler)
+    subscribe_to_active_object()
+    # The add-on may be enabled after the file was loaded.
+    schedule_resume_unfinished_jobs()
     
     
 def unregister():
+    job_queue.stop_queue()
+
     for cls in classes:    
         bpy.utils.unregister_class(cls)
 
     reset_properties()
     bpy.app.handlers.depsgraph_update_post.remove(selection_handler)
+    bpy.app.handlers.load_post.remove(load_post_handler)
+    bpy.app.handlers.undo_post.remove(undo_post_handler)
+    bpy.app.handlers.redo_post.remove(undo_post_handler)
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    if bpy.app.timers.is_registered(resume_unfinished_jobs):
+        bpy.app.timers.unregister(resume_unfinished_jobs)
+    api_client.close_client()
+    # Requests that are already running finish in their threads, anything still queued is dropped.
+    async_computation.shutdown_executors(wait=False)
 
 if __name__ == "__main__":
     register()
@@ -0,0 +1,172 @@
+"""Shared, connection-pooled HTTP client for the Leonardo REST API.
+
+All REST helpers go through the single client returned by get_client(), so
+TCP/TLS connections are kept alive and reused between calls instead of being
+re-established for every request. The actual network I/O is delegated to the
+transport selected in the add-on preferences (see transport.py).
+"""
+
+import logging
+import urllib.parse
+
+import bpy
+
+from . import resilience
+from . import transport
+
+log = logging.getLogger(__name__)
+
+API_BASE_URL = "https://cloud.leonardo.ai/api/rest/v1"
+
+# At least the number of worker threads of the I/O executor, so every thread can
+# hold on to its own keep-alive connection.
+POOL_MAXSIZE = 10
+
+# Number of models requested per page when listing the meshes of a user.
+MESH_PAGE_SIZE = 100
+
+_client = None
+
+# User id per API key, so it is only requested once.
+_user_ids = {}
+
+# {(offset, page size): (etag, meshes)} of the pages of the last full listing per user id.
+_mesh_listings = {}
+
+
+class LeonardoClient:
+    """Keeps a pooled HTTP transport and the auth header for one API key."""
+
+    def __init__(self, api_key, transport_name):
+        self.api_key = api_key
+        self.transport_name = transport_name
+        self.auth_headers = {
+            "accept": "application/json",
+            "authorization": f"Bearer {api_key}",
+        }
+        self.transport = transport.create_transport(transport_name, pool_maxsize=POOL_MAXSIZE)
+
+    async def request(self, method, url, authorized=True, headers=None, timeout='api', retry=None, **kwargs):
+        """Runs a request on the pooled transport without blocking the event loop.
+
+        Relative urls are resolved against API_BASE_URL. The Leonardo auth header is
+        only sent when authorized is True, so presigned S3 uploads and CDN downloads
+        can share the same connection pool.
+
+        :param timeout: key of resilience.TIMEOUTS, (connect, read) seconds or None.
+        :param retry: retry failed requests; defaults to True for GET and HEAD only.
+        :raise resilience.LeonardoError: the request could not be sent or no response arrived.
+        """
+        if not url.startswith("http"):
+            url = f"{API_BASE_URL}/{url.lstrip('/')}"
+
+        request_headers = dict(self.auth_headers) if authorized else {}
+        if headers:
+            request_headers.update(headers)
+
+        if retry is None:
+            retry = method in ("GET", "HEAD")
+
+        async def send():
+            return await self.transport.request(method, url, headers=request_headers,
+                                                timeout=resilience.get_timeout(timeout), **kwargs)
+
+        host = urllib.parse.urlsplit(url).netloc
+        return await resilience.call(send, host, retry=retry, action=f"{method} {urllib.parse.urlsplit(url).path}")
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.transport.close()
+
+
+def get_client():
+    """Returns the add-on wide client, rebuilding it when the API key or transport has changed."""
+    global _client
+
+    preferences = bpy.context.preferences.addons[__package__].preferences
+    api_key = preferences.api_key
+    transport_name = preferences.http_transport
+    if _client is None or _client.api_key != api_key or _client.transport_name != transport_name:
+        close_client()
+        log.debug("Creating new Leonardo API client")
+        _client = LeonardoClient(api_key, transport_name)
+    return _client
+
+
+def close_client():
+    global _client
+
+    if _client is not None:
+        log.debug("Closing Leonardo API client")
+        _client.close()
+        _client = None
+
+
+async def post_texture_generation(params):
+    """Starts a texture generation job with the given parameters."""
+    return await get_client().post("generations-texture", json=params)
+
+
+async def get_texture_generation(job_id):
+    """Fetches status and, once complete, the texture images of a generation job."""
+    return await get_client().get(f"generations-texture/{job_id}")
+
+
+def parse_texture_generation(response):
+    """Returns the generation of a get_texture_generation() response.
+
+    :raise resilience.LeonardoError: the response is an error or does not contain the generation.
+    """
+    generation = resilience.get_json(response, "Status check", 'model_asset_texture_generations_by_pk')
+    if not isinstance(generation, dict):
+        raise resilience.LeonardoError("Status check failed: job not found", status_code=response.status_code)
+    return generation
+
+
+async def get_user_id():
+    """Returns the id of the user owning the API key, cached per key."""
+    client = get_client()
+    if client.api_key not in _user_ids:
+        result = await client.get("me")
+        _user_ids[client.api_key] = resilience.get_json(result, "Fetching your account", 'user_details', 0, 'user', 'id')
+    return _user_ids[client.api_key]
+
+
+async def list_user_meshes(user_id, page_size=MESH_PAGE_SIZE):
+    """Returns [{'name': ..., 'id': ...}] of all meshes uploaded by user_id.
+
+    The models are fetched page by page. Every page is requested with the ETag
+    it had in the previous listing, and when the server answers 304 Not Modified
+    the previous content of that page is reused. An ETag only covers its own
+    page, so changes further down the listing are never missed.
+    """
+    client = get_client()
+    cached_pages = _mesh_listings.get(user_id, {})
+    pages = {}
+    meshes = []
+    offset = 0
+    while True:
+        etag, cached_page = cached_pages.get((offset, page_size), (None, None))
+        headers = {'if-none-match': etag} if etag and cached_page is not None else None
+        result = await client.get(f"models-3d/user/{user_id}", headers=headers,
+                                  params={'offset': offset, 'limit': page_size})
+        if result.status_code == 304:
+            log.debug("Meshes %i+ of user %s not modified", offset, user_id)
+            page = cached_page
+        else:
+            page = [{'name': mesh['name'], 'id': mesh['id']}
+                    for mesh in resilience.get_json(result, "Listing your meshes", 'model_assets')]
+            etag = result.headers.get('etag')
+        pages[(offset, page_size)] = (etag, page)
+        meshes.extend(page)
+        if len(page) < page_size:
+            break
+        offset += len(page)
+
+    _mesh_listings[user_id] = pages
+    return meshes
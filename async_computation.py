@@ -23,6 +23,10 @@ import traceback
 import concurrent.futures
 import logging
 import gc
+import os
+import sys
+import threading
+import time
 import typing
 
 import bpy
@@ -32,8 +36,82 @@ log = logging.getLogger(__name__)
 # Keeps track of whether a loop-kicking operator is already running.
 _loop_kicking_operator_running = False
 
+# Bounds of the loop-kicking timer interval in seconds. The loop is kicked at the
+# fastest rate while callbacks or I/O are ready, and backs off towards the idle
+# rate (or the next scheduled timer) otherwise.
+MIN_KICK_INTERVAL = 1 / 120
+IDLE_KICK_INTERVAL = 0.25
 
-def setup_asyncio_executor():
+# Tasks created through create_task() that are not done yet. Tasks remove
+# themselves in a done-callback, so checking whether everything finished is O(1).
+_live_tasks = set()
+
+# Generation passed to gc.collect() once all tasks are done, or None to leave
+# garbage collection to Python. Full collections can stall large sessions.
+gc_generation = None
+
+# While I/O keeps being ready, a single kick runs further loop iterations for up
+# to this many seconds, so transfers are not throttled by the timer rate.
+KICK_TIME_BUDGET = 0.004
+
+
+# Named executors. Blocking network and file calls run in the I/O pool, hashing,
+# compression and image processing in the CPU pool. The I/O pool is also the
+# loop's default executor.
+IO_EXECUTOR = 'io'
+CPU_EXECUTOR = 'cpu'
+
+DEFAULT_IO_WORKERS = 8
+DEFAULT_CPU_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+_executors = {}
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Thread pool that counts queued, running and finished work items."""
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix='leonardo-' + name)
+        self.name = name
+        self.max_workers = max_workers
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self._counter_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._counter_lock:
+            self.queued += 1
+        try:
+            return super().submit(self._run, fn, args, kwargs)
+        except RuntimeError:
+            with self._counter_lock:
+                self.queued -= 1
+            raise
+
+    def _run(self, fn, args, kwargs):
+        with self._counter_lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._counter_lock:
+                self.active -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            return {
+                'workers': self.max_workers,
+                'queued': self.queued,
+                'active': self.active,
+                'completed': self.completed,
+                'utilization': self.active / self.max_workers,
+            }
+
+
+def setup_asyncio_executor(io_workers: int = DEFAULT_IO_WORKERS, cpu_workers: int = DEFAULT_CPU_WORKERS):
     """Sets up AsyncIO to run properly on each platform."""
 
     import sys
@@ -48,11 +126,87 @@ def setup_asyncio_executor():
     else:
         loop = asyncio.get_event_loop()
 
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=10)
-    loop.set_default_executor(executor)
+    configure_executor(IO_EXECUTOR, io_workers)
+    configure_executor(CPU_EXECUTOR, cpu_workers)
     # loop.set_debug(True)
 
 
+def configure_executor(name: str, max_workers: int):
+    """Creates or resizes the named executor.
+
+    Work already submitted to a replaced executor still finishes in its threads.
+    """
+    executor = _executors.get(name)
+    if executor is not None and executor.max_workers == max_workers:
+        return
+
+    _executors[name] = CountingExecutor(name, max_workers)
+    if name == IO_EXECUTOR:
+        asyncio.get_event_loop().set_default_executor(_executors[name])
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def get_executor(name: str) -> CountingExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        executor = CountingExecutor(name, DEFAULT_IO_WORKERS if name == IO_EXECUTOR else DEFAULT_CPU_WORKERS)
+        _executors[name] = executor
+    return executor
+
+
+def run_in_executor(name: str, func, *args) -> asyncio.Future:
+    """Runs func(*args) in the named executor."""
+    return asyncio.get_event_loop().run_in_executor(get_executor(name), func, *args)
+
+
+def executor_stats() -> dict:
+    """Returns the counters of every executor, keyed by name."""
+    return {name: executor.stats() for name, executor in _executors.items()}
+
+
+def shutdown_executors(wait: bool = True):
+    """Shuts all executors down. Queued work that did not start yet is cancelled.
+
+    Python < 3.9 (Blender < 2.93) cannot cancel queued work, which then still
+    runs before the executor stops.
+    """
+    executors = list(_executors.values())
+    _executors.clear()
+    for executor in executors:
+        if sys.version_info >= (3, 9):
+            executor.shutdown(wait=wait, cancel_futures=True)
+        else:
+            executor.shutdown(wait=wait)
+
+
+def create_task(coro: typing.Coroutine) -> asyncio.Task:
+    """Schedules coro as a task that keeps the loop-kicking operator running until it is done."""
+    task = asyncio.ensure_future(coro)
+    track_task(task)
+    return task
+
+
+def track_task(task: asyncio.Future):
+    _live_tasks.add(task)
+    task.add_done_callback(_on_task_done)
+
+
+def _on_task_done(task: asyncio.Future):
+    _live_tasks.discard(task)
+
+    if task.cancelled():
+        log.debug('task %r: cancelled', task)
+        return
+
+    ex = task.exception()
+    if ex is not None:
+        print('{}: resulted in exception'.format(task))
+        traceback.print_exception(type(ex), ex, ex.__traceback__)
+    else:
+        log.debug('task %r: result=%r', task, task.result())
+
+
 def kick_async_loop(*args) -> bool:
     """Performs a single iteration of the asyncio event loop.
 
@@ -69,46 +223,68 @@ def kick_async_loop(*args) -> bool:
         log.warning('loop closed, stopping immediately.')
         return True
 
-    all_tasks = asyncio.all_tasks(loop)
-    if not len(all_tasks):
-        log.debug('no more scheduled tasks, stopping after this kick.')
+    if not _live_tasks:
+        log.debug('no more live tasks, stopping after this kick.')
         stop_after_this_kick = True
 
-    elif all(task.done() for task in all_tasks):
-        log.debug('all %i tasks are done, fetching results and stopping after this kick.',
-                  len(all_tasks))
-        stop_after_this_kick = True
+        if gc_generation is not None:
+            # Clean up circular references between finished tasks.
+            gc.collect(gc_generation)
 
-        # Clean up circular references between tasks.
-        gc.collect()
+    loop.stop()
+    loop.run_forever()
 
-        for task_idx, task in enumerate(all_tasks):
-            if not task.done():
-                continue
+    deadline = time.perf_counter() + KICK_TIME_BUDGET
+    while not stop_after_this_kick and (loop._ready or _has_ready_io(loop)) and time.perf_counter() < deadline:
+        loop.stop()
+        loop.run_forever()
 
-            # noinspection PyBroadException
-            try:
-                res = task.result()
-                log.debug('   task #%i: result=%r', task_idx, res)
-            except asyncio.CancelledError:
-                # No problem, we want to stop anyway.
-                log.debug('   task #%i: cancelled', task_idx)
-            except Exception:
-                print('{}: resulted in exception'.format(task))
-                traceback.print_exc()
+    return stop_after_this_kick
 
-            # for ref in gc.get_referrers(task):
-            #     log.debug('      - referred by %s', ref)
 
-    loop.stop()
-    loop.run_forever()
+def _has_ready_io(loop) -> bool:
+    """Polls the loop's selector without blocking. Selectors are level-triggered,
+    so the events are still reported to the loop on the next kick."""
+    selector = getattr(loop, '_selector', None)
+    if selector is None:
+        return False
+    try:
+        return bool(selector.select(0))
+    except (OSError, ValueError):
+        return False
 
-    return stop_after_this_kick
+
+def next_kick_interval(loop, previous_interval: float) -> float:
+    """Computes how long to wait before kicking the asyncio loop again."""
+
+    if loop.is_closed():
+        return IDLE_KICK_INTERVAL
+
+    if loop._ready or _has_ready_io(loop):
+        return MIN_KICK_INTERVAL
+
+    # Nothing to do right now: back off, but wake up in time for the next timer.
+    interval = min(previous_interval * 2, IDLE_KICK_INTERVAL)
+    if loop._scheduled:
+        interval = min(interval, loop._scheduled[0].when() - loop.time())
+    return max(interval, MIN_KICK_INTERVAL)
 
 
 def ensure_async_loop():
     log.debug('Starting asyncio loop')
-    result = bpy.ops.asyncio.loop()
+    if bpy.context.window is not None:
+        result = bpy.ops.asyncio.loop()
+    else:
+        # Timers run without a window, which the modal operator needs for its event timer.
+        windows = bpy.context.window_manager.windows
+        if not windows:
+            log.debug('No window to run the asyncio loop in')
+            return
+        if hasattr(bpy.context, 'temp_override'):
+            with bpy.context.temp_override(window=windows[0]):
+                result = bpy.ops.asyncio.loop()
+        else:
+            result = bpy.ops.asyncio.loop({'window': windows[0], 'screen': windows[0].screen})
     log.debug('Result of starting modal operator is %r', result)
 
 
@@ -149,11 +325,22 @@ class AsyncLoopModalOperator(bpy.types.Operator):
         context.window_manager.modal_handler_add(self)
         _loop_kicking_operator_running = True
 
-        wm = context.window_manager
-        self.timer = wm.event_timer_add(0.00001, window=context.window)
+        self.interval = MIN_KICK_INTERVAL
+        self.next_kick = time.monotonic()
+        self.timer = context.window_manager.event_timer_add(self.interval, window=context.window)
 
         return {'RUNNING_MODAL'}
 
+    def _reschedule(self, context, interval):
+        """Replaces the timer when the interval changed noticeably."""
+        self.next_kick = time.monotonic() + interval
+        if abs(interval - self.interval) < MIN_KICK_INTERVAL / 2:
+            return
+        self.interval = interval
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        self.timer = wm.event_timer_add(interval, window=context.window)
+
     def modal(self, context, event):
         global _loop_kicking_operator_running
 
@@ -166,6 +353,10 @@ class AsyncLoopModalOperator(bpy.types.Operator):
         if event.type != 'TIMER':
             return {'PASS_THROUGH'}
 
+        # Timers of other modal operators are delivered here as well.
+        if time.monotonic() < self.next_kick - MIN_KICK_INTERVAL / 2:
+            return {'PASS_THROUGH'}
+
         # self.log.debug('KICKING LOOP')
         stop_after_this_kick = kick_async_loop()
         if stop_after_this_kick:
@@ -175,6 +366,7 @@ class AsyncLoopModalOperator(bpy.types.Operator):
             self.log.debug('Stopped asyncio loop kicking')
             return {'FINISHED'}
 
+        self._reschedule(context, next_kick_interval(asyncio.get_event_loop(), self.interval))
         return {'RUNNING_MODAL'}
 
 
@@ -243,7 +435,7 @@ class AsyncModalOperatorMixin:
 
         # Download the previews asynchronously.
         self.signalling_future = future or asyncio.Future()
-        self.async_task = asyncio.ensure_future(async_task)
+        self.async_task = create_task(async_task)
         self.log.debug('Created new task %r', self.async_task)
 
         # Start the async manager so everything happens.
@@ -0,0 +1,400 @@
+"""Headless batch texturing, e.g. on render farm nodes.
+
+Runs the upload, submit, poll, download and assign pipeline for every asset of a
+JSON manifest on a plain asyncio.run() loop, so neither the UI nor the modal
+operator kicking the loop in interactive sessions is needed, and writes a
+machine-readable report of the results:
+
+    blender -b scene.blend --python-expr "import leonardo_texturing.batch; leonardo_texturing.batch.main()" -- assets.json --save
+
+leonardo_texturing stands for the module name of the add-on, the name of its
+folder in the add-ons directory. The API key is taken from the add-on
+preferences or the LEONARDO_API_KEY environment variable. A manifest looks like:
+
+    {
+        "output": "//leonardo_batch",
+        "defaults": {"prompt": "weathered oak", "model_version": "v2"},
+        "assets": [
+            {"name": "chair", "objects": ["Chair", "Chair.001"], "seeds": [1, 2]},
+            {"objects": ["Table"], "prompt": "polished marble", "direction": "90"}
+        ]
+    }
+
+Every asset needs objects, the names of the objects textured as one mesh. The
+other keys fall back to "defaults": name, prompt, negative_prompt, seed or seeds
+(0 for a random seed), model_version, direction (front rotation offset in
+degrees), mesh_id (an uploaded mesh to use instead of uploading the objects),
+preview, preview_direction and apply (assign the maps of the first seed to the
+objects, true by default). Relative output paths are resolved against the blend
+file, or the manifest when the file was never saved.
+
+Jobs are recorded in the job ledger. Running the manifest again after a crash
+polls the jobs the interrupted run left unfinished instead of paying for them
+again.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+import bpy
+
+from . import api_client
+from . import downloads
+from . import instrumentation
+from . import job_ledger
+from . import materials
+from . import mesh_export
+from . import mesh_fingerprint
+from . import mesh_upload
+from . import polling
+from . import resilience
+from . import selection_index
+from . import texture_processing
+
+log = logging.getLogger(__name__)
+
+API_KEY_ENVIRONMENT_VARIABLE = 'LEONARDO_API_KEY'
+DEFAULT_OUTPUT = "//leonardo_batch"
+REPORT_SUFFIX = "_report.json"
+
+
+def get_preferences():
+    return bpy.context.preferences.addons[__package__].preferences
+
+
+def load_manifest(path):
+    """Reads the manifest at path.
+
+    :return: (manifest, assets), with the defaults filled into every asset.
+    :raise ValueError: the manifest is malformed.
+    """
+    with open(path, 'r') as reader:
+        manifest = json.load(reader)
+
+    defaults = manifest.get('defaults', {})
+    assets = []
+    for index, asset in enumerate(manifest.get('assets', [])):
+        asset = dict(defaults, **asset)
+        if not isinstance(asset.get('objects'), list) or not asset['objects']:
+            raise ValueError(f"Asset {index} of {path} does not list its objects")
+        if 'seeds' not in asset:
+            asset['seeds'] = [asset.get('seed', 0)]
+        if not asset['seeds']:
+            raise ValueError(f"Asset {index} of {path} has an empty list of seeds")
+        asset.setdefault('name', asset['objects'][0])
+        assets.append(asset)
+
+    if not assets:
+        raise ValueError(f"{path} does not list any assets")
+    return manifest, assets
+
+
+def get_output_directory(manifest, manifest_path):
+    output = manifest.get('output', DEFAULT_OUTPUT)
+    if output.startswith("//"):
+        if bpy.data.filepath:
+            return bpy.path.abspath(output)
+        output = output[2:]
+    return os.path.join(os.path.dirname(os.path.abspath(manifest_path)), output)
+
+
+def build_params(asset, mesh_id, seed):
+    """Returns the generation parameters of asset, like build_generation_params() does for the UI settings."""
+    params = {
+        'prompt': asset.get('prompt', ""),
+        'front_rotation_offset': float(asset.get('direction', 0)),
+        'sd_version': asset.get('model_version', 'v1_5'),
+        'modelAssetId': mesh_id,
+        'preview': bool(asset.get('preview', False)),
+    }
+    if int(seed) > 0:
+        params['seed'] = int(seed)
+    if asset.get('negative_prompt'):
+        params['negative_prompt'] = asset['negative_prompt']
+    if params['preview']:
+        params['preview_direction'] = asset.get('preview_direction', 'front')
+    return params
+
+
+async def upload_objects(objects, name, directory):
+    """Uploads objects as one mesh, unless the same geometry was uploaded before.
+
+    The built-in exporter is always used, as the export operator works on the
+    selection, which means nothing in background mode.
+
+    :return: (mesh id, whether an earlier upload was reused)
+    """
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    fingerprint = mesh_fingerprint.fingerprint_objects(objects, depsgraph)
+    uploaded_mesh = mesh_fingerprint.find_uploaded_mesh(objects, fingerprint)
+    if uploaded_mesh is not None:
+        mesh_id, mesh_name = uploaded_mesh
+        print(f"{name}: mesh is unchanged, reusing uploaded mesh {mesh_id}")
+        reused = True
+    else:
+        with instrumentation.span('presign', name):
+            response = await api_client.get_client().post("models-3d/upload", json={'name': name, 'modelExtension': "obj"})
+            presigned_post = resilience.get_json(response, "Requesting the mesh upload", 'uploadModelAsset')
+            try:
+                url, fields, mesh_id = (presigned_post['modelUrl'], json.loads(presigned_post['modelFields']),
+                                        presigned_post['modelId'])
+            except (KeyError, TypeError, ValueError) as ex:
+                raise resilience.LeonardoError("Requesting the mesh upload failed: unexpected response") from ex
+
+        export_path = os.path.join(directory, f"{bpy.path.clean_name(name)}.obj")
+        with instrumentation.span('export', name, objects=len(objects)):
+            mesh_export.export_objects(export_path, objects, depsgraph)
+
+        size = os.path.getsize(export_path)
+        with instrumentation.span('upload', name, bytes=size):
+            response = await mesh_upload.upload_file(url, fields, export_path, compress=get_preferences().compress_uploads)
+        instrumentation.count('bytes_uploaded', size)
+        resilience.raise_for_status(response, "Mesh upload")
+        print(f"{name}: uploaded {size / 1e6:.1f} MB as mesh {mesh_id}")
+        mesh_name = name
+        reused = False
+
+    tag_objects(objects, mesh_id, mesh_name, fingerprint)
+    return mesh_id, reused
+
+
+def tag_objects(objects, mesh_id, mesh_name, fingerprint=None):
+    """Stores the uploaded mesh on the objects, which also gives each asset its own template material.
+
+    :param fingerprint: fingerprint of the uploaded geometry; a stale one is removed when None.
+    """
+    for obj in objects:
+        obj.data['leonardo_id'] = mesh_id
+        obj.data['leonardo_name'] = mesh_name
+        if fingerprint is not None:
+            obj.data[mesh_fingerprint.FINGERPRINT_KEY] = fingerprint
+        elif mesh_fingerprint.FINGERPRINT_KEY in obj.data:
+            del obj.data[mesh_fingerprint.FINGERPRINT_KEY]
+    selection_index.mark_dirty()
+
+
+async def wait_for_generation(job_id, preview=False):
+    """Polls the job until it completes and returns the generation.
+
+    :raise resilience.LeonardoError: the job failed, timed out or could not be polled.
+    """
+    scheduler = polling.PollScheduler(polling.PREVIEW_PROFILE if preview else polling.FULL_PROFILE)
+    response = None
+    while True:
+        await scheduler.wait(response.headers if response is not None else None)
+        if scheduler.timed_out():
+            raise resilience.LeonardoError(f"Generation did not finish after {scheduler.elapsed:.0f}s")
+
+        instrumentation.count('polls')
+        try:
+            with instrumentation.span('poll', job_id) as poll_span:
+                response = await api_client.get_texture_generation(job_id)
+                generation = api_client.parse_texture_generation(response)
+                poll_span.fields['status'] = generation.get('status')
+        except resilience.LeonardoError as ex:
+            if not ex.retryable:
+                raise
+            log.warning("Polling job %s failed (%s), retrying", job_id, ex)
+            continue
+
+        status = generation.get('status')
+        if status == 'COMPLETE':
+            instrumentation.record('generation_wait', scheduler.elapsed, job_id, polls=scheduler.polls)
+            return generation
+        if status == 'FAILED':
+            raise resilience.LeonardoError("Generation failed")
+
+
+def get_timings(job_id):
+    """Returns the seconds spent on each step of the job, summed over repeated steps like polls."""
+    timings = {}
+    for event in instrumentation.timeline(job_id):
+        timings[event['name']] = round(timings.get(event['name'], 0) + event['duration'], 3)
+    return timings
+
+
+async def run_job(asset, objects, mesh_id, seed, directory, apply_textures):
+    """Generates, downloads and optionally assigns the maps of one seed of asset, returning its report entry."""
+    result = {'seed_requested': seed, 'status': 'FAILED', 'error': None, 'job_id': None, 'resumed': False,
+              'seed': None, 'texture_paths': {}}
+    started = time.monotonic()
+    params = build_params(asset, mesh_id, seed)
+    try:
+        # A run that was interrupted mid-generation already paid for the job, so it is polled instead of submitted again.
+        entry = job_ledger.find_unfinished_job(params, bpy.data.filepath)
+        if entry is not None:
+            result['job_id'], result['resumed'] = entry['job_id'], True
+            job_ledger.attach(result['job_id'])
+            print(f"{asset['name']}: resuming job {result['job_id']}")
+        else:
+            with instrumentation.span('submit') as submit_span:
+                response = await api_client.post_texture_generation(params)
+                result['job_id'] = submit_span.job = resilience.get_json(response, "Submission", 'textureGenerationJob', 'id')
+            print(f"{asset['name']}: submitted job {result['job_id']}")
+            job_ledger.record_submitted(result['job_id'], params, os.path.join(directory, job_ledger.SEED_PLACEHOLDER),
+                                        asset['objects'] if apply_textures else [], preview=asset.get('preview', False),
+                                        apply_textures=apply_textures)
+
+        generation = await wait_for_generation(result['job_id'], asset.get('preview', False))
+        result['seed'] = generation.get('seed')
+        images = generation.get('model_asset_texture_images') or []
+        result_path = os.path.join(directory, str(result['seed']))
+        os.makedirs(result_path, exist_ok=True)
+        with instrumentation.span('download_all', result['job_id']):
+            texture_paths = await downloads.download_texture_images(
+                images, result_path, result['job_id'],
+                manifest_path=os.path.join(directory, downloads.MANIFEST_FILENAME))
+        result['texture_paths'] = texture_paths
+        if len(texture_paths) < len(images):
+            raise resilience.LeonardoError(f"Downloaded {len(texture_paths)} of {len(images)} texture maps")
+
+        if apply_textures:
+            viewport_paths = {}
+            try:
+                with instrumentation.span('post_process', result['job_id']):
+                    texture_paths, viewport_paths = await texture_processing.prepare_texture_maps(texture_paths)
+            except Exception:
+                log.exception("Post-processing the maps of job %s failed, using them as downloaded", result['job_id'])
+            materials.apply_texture_maps(objects, texture_paths, result['job_id'], viewport_paths=viewport_paths)
+        result['status'] = 'COMPLETE'
+        job_ledger.record_finished(result['job_id'], 'COMPLETE', result_path)
+    except (resilience.LeonardoError, OSError) as ex:
+        result['error'] = str(ex)
+        print(f"{asset['name']}: seed {seed} failed: {ex}")
+        # Jobs that completed on the server stay in the ledger, the next run downloads their maps.
+        if result['job_id'] and result['seed'] is None:
+            job_ledger.record_finished(result['job_id'], 'FAILED')
+
+    result['duration'] = round(time.monotonic() - started, 3)
+    result['timings'] = get_timings(result['job_id']) if result['job_id'] else {}
+    return result
+
+
+async def run_asset(asset, output, semaphore, upload_lock):
+    """Uploads the objects of asset once and runs a job per seed, returning the report entry of the asset."""
+    report = {'name': asset['name'], 'objects': asset['objects'], 'prompt': asset.get('prompt', ""),
+              'status': 'FAILED', 'error': None, 'mesh_id': asset.get('mesh_id'), 'mesh_reused': False, 'jobs': []}
+
+    missing = [name for name in asset['objects'] if bpy.data.objects.get(name) is None]
+    if missing:
+        report['error'] = f"Objects not found: {', '.join(missing)}"
+        print(f"{asset['name']}: {report['error']}")
+        return report
+    objects = [bpy.data.objects[name] for name in asset['objects']]
+
+    directory = os.path.join(output, bpy.path.clean_name(asset['name']))
+    os.makedirs(directory, exist_ok=True)
+
+    if report['mesh_id']:
+        tag_objects(objects, report['mesh_id'], asset['name'])
+    else:
+        try:
+            # One upload at a time, so assets sharing geometry find the upload of the first one.
+            async with upload_lock:
+                report['mesh_id'], report['mesh_reused'] = await upload_objects(objects, asset['name'], directory)
+        except (resilience.LeonardoError, OSError) as ex:
+            report['error'] = f"Upload failed: {ex}"
+            print(f"{asset['name']}: {report['error']}")
+            return report
+
+    async def run(index, seed):
+        async with semaphore:
+            return await run_job(asset, objects, report['mesh_id'], seed, directory,
+                                 asset.get('apply', True) and index == 0)
+
+    report['jobs'] = await asyncio.gather(*(run(index, seed) for index, seed in enumerate(asset['seeds'])))
+    if all(job['status'] == 'COMPLETE' for job in report['jobs']):
+        report['status'] = 'COMPLETE'
+    else:
+        report['error'] = next(job['error'] for job in report['jobs'] if job['error'])
+    return report
+
+
+def write_report(path, report):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as writer:
+        json.dump(report, writer, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def run_batch(manifest_path, report_path=None):
+    """Runs every asset of the manifest, at most max_jobs_in_flight generations at a time, and writes the report.
+
+    :return: the report.
+    """
+    manifest, assets = load_manifest(manifest_path)
+    report_path = report_path or os.path.splitext(manifest_path)[0] + REPORT_SUFFIX
+    output = get_output_directory(manifest, manifest_path)
+    os.makedirs(output, exist_ok=True)
+    instrumentation.set_trace_directory(output)
+
+    # Pooled connections belong to the loop that opened them.
+    api_client.close_client()
+    semaphore = asyncio.Semaphore(get_preferences().max_jobs_in_flight)
+    upload_lock = asyncio.Lock()
+    started = time.time()
+    try:
+        results = await asyncio.gather(*(run_asset(asset, output, semaphore, upload_lock) for asset in assets))
+    finally:
+        api_client.close_client()
+
+    report = {
+        'manifest': os.path.abspath(manifest_path),
+        'blend_file': bpy.data.filepath,
+        'output': output,
+        'started': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        'duration': round(time.time() - started, 3),
+        'succeeded': sum(result['status'] == 'COMPLETE' for result in results),
+        'failed': sum(result['status'] != 'COMPLETE' for result in results),
+        'assets': results,
+    }
+    write_report(report_path, report)
+    print(f"Textured {report['succeeded']} of {len(results)} assets in {report['duration']:.0f}s, report written to {report_path}")
+    return report
+
+
+def run(manifest_path, report_path=None, save=False):
+    """Runs the batch on its own asyncio loop and optionally saves the blend file with the assigned materials."""
+    report = asyncio.run(run_batch(manifest_path, report_path))
+    # asyncio.run() leaves no current loop behind, which the rest of the add-on expects.
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    if save and report['succeeded']:
+        bpy.ops.wm.save_mainfile()
+    return report
+
+
+def main(argv=None):
+    """Command line entry point. Arguments are taken from after -- on Blender's command line.
+
+    Exits with status 0 when every asset was textured, 1 when some failed and 2
+    when the batch could not run at all.
+    """
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="leonardo batch", description="Texture the assets of a manifest with Leonardo.ai")
+    parser.add_argument("manifest", help="JSON manifest of the assets to texture")
+    parser.add_argument("--report", help=f"where the report is written, defaults to <manifest>{REPORT_SUFFIX}")
+    parser.add_argument("--save", action="store_true", help="save the blend file once the maps are assigned")
+    args = parser.parse_args(argv)
+
+    if __package__ not in bpy.context.preferences.addons:
+        import addon_utils
+        addon_utils.enable(__package__, default_set=True)
+    if os.environ.get(API_KEY_ENVIRONMENT_VARIABLE):
+        get_preferences().api_key = os.environ[API_KEY_ENVIRONMENT_VARIABLE]
+    if not get_preferences().api_key:
+        print(f"No API key, set it in the add-on preferences or {API_KEY_ENVIRONMENT_VARIABLE}")
+        sys.exit(2)
+
+    try:
+        report = run(args.manifest, args.report, args.save)
+    except (OSError, ValueError) as ex:
+        print(f"Could not run batch: {ex}")
+        sys.exit(2)
+    sys.exit(0 if not report['failed'] else 1)
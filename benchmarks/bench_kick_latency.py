@@ -0,0 +1,79 @@
+"""Latency of a single loop kick with many pending tasks.
+
+The legacy kick scanned asyncio.all_tasks() on every kick. The current kick
+checks the set of tracked live tasks instead. Outside Blender the add-on runs
+on the fake bpy:
+
+    blender -b --factory-startup --python benchmarks/bench_kick_latency.py
+    python benchmarks/bench_kick_latency.py
+"""
+
+import asyncio
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+import fake_bpy
+
+TASK_COUNTS = (1, 100, 1000)
+KICKS = 200
+
+
+def legacy_kick_async_loop():
+    loop = asyncio.get_event_loop()
+    stop_after_this_kick = False
+    all_tasks = asyncio.all_tasks(loop)
+    if not len(all_tasks):
+        stop_after_this_kick = True
+    elif all(task.done() for task in all_tasks):
+        stop_after_this_kick = True
+        gc.collect()
+    loop.stop()
+    loop.run_forever()
+    return stop_after_this_kick
+
+
+async def idle_task():
+    await asyncio.sleep(3600)
+
+
+def measure(async_computation, kick, task_count):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    tasks = [async_computation.create_task(idle_task()) for _ in range(task_count)]
+    kick()
+
+    latencies = []
+    for _ in range(KICKS):
+        started = time.perf_counter()
+        kick()
+        latencies.append(time.perf_counter() - started)
+
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.close()
+
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    fake_bpy.install()
+    addon = common.load_addon()
+    async_computation = addon.async_computation
+
+    rows = []
+    kicks = [("legacy", legacy_kick_async_loop), ("tracked tasks", async_computation.kick_async_loop)]
+    for task_count in TASK_COUNTS:
+        for name, kick in kicks:
+            median, p99 = measure(async_computation, kick, task_count)
+            rows.append((name, task_count, f"{median * 1e3:.3f}", f"{p99 * 1e3:.3f}"))
+    common.print_table(("kick", "tasks", "median ms", "p99 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
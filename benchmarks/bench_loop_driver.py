@@ -0,0 +1,97 @@
+"""Kicks per second and CPU time of the asyncio loop driver under a simulated workload.
+
+Blender's modal timer is simulated by sleeping for the timer interval between
+kicks (no less than the ~5 ms Blender's event loop sleeps when idle). The
+workload is a status poll sleeping in short slices, plus a download streaming
+from a local server for the first part of the run. Outside Blender the add-on
+runs on the fake bpy:
+
+    blender -b --factory-startup --python benchmarks/bench_loop_driver.py
+    python benchmarks/bench_loop_driver.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+import fake_bpy
+
+DURATION = 6.0
+DOWNLOAD_DURATION = 2.0
+BLENDER_TIMER_RESOLUTION = 0.005
+LEGACY_INTERVAL = 0.00001
+
+
+async def poll_workload():
+    deadline = time.monotonic() + DURATION
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+
+
+async def download_workload():
+    async def serve(reader, writer):
+        deadline = time.monotonic() + DOWNLOAD_DURATION
+        while time.monotonic() < deadline:
+            writer.write(b"x" * 65536)
+            await writer.drain()
+            await asyncio.sleep(0.02)
+        writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    received = 0
+    while True:
+        chunk = await reader.read(65536)
+        if not chunk:
+            break
+        received += len(chunk)
+    writer.close()
+    server.close()
+    return received
+
+
+def drive(async_computation, next_interval):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    tasks = [async_computation.create_task(poll_workload()), async_computation.create_task(download_workload())]
+
+    kicks = 0
+    interval = async_computation.MIN_KICK_INTERVAL
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    while True:
+        time.sleep(max(interval, BLENDER_TIMER_RESOLUTION))
+        kicks += 1
+        if async_computation.kick_async_loop():
+            break
+        interval = next_interval(loop, interval)
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    received = tasks[1].result()
+    loop.close()
+    return kicks, wall, cpu, received
+
+
+def main():
+    fake_bpy.install()
+    addon = common.load_addon()
+    async_computation = addon.async_computation
+
+    rows = []
+    drivers = [
+        ("legacy fixed timer", lambda loop, interval: LEGACY_INTERVAL),
+        ("adaptive", async_computation.next_kick_interval),
+    ]
+    for name, next_interval in drivers:
+        kicks, wall, cpu, received = drive(async_computation, next_interval)
+        rows.append((name, kicks, f"{kicks / wall:.0f}", f"{wall:.2f}", f"{cpu:.3f}", f"{received / 1e6:.1f}"))
+    common.print_table(("driver", "kicks", "kicks/s", "wall s", "cpu s", "MB received"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmarks the built-in NumPy OBJ writer against Blender's OBJ export operator.
+
+Inside Blender a subdivided grid of increasing density is exported with both
+paths. Without Blender only the writer is timed on synthetic arrays:
+
+    blender -b --factory-startup --python benchmarks/bench_obj_export.py
+    python benchmarks/bench_obj_export.py
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+SIZES = [100, 300, 1000]
+
+
+def synthetic_grid(size):
+    """Returns the arrays of a size x size quad grid with per-corner UVs."""
+    xs, ys = np.meshgrid(np.arange(size + 1, dtype=np.float32), np.arange(size + 1, dtype=np.float32))
+    positions = np.stack((xs.ravel(), ys.ravel(), np.zeros(xs.size, dtype=np.float32)), axis=-1)
+    corners = np.arange(size)[None, :] + (size + 1) * np.arange(size)[:, None]
+    corners = corners.ravel()
+    loop_vertex_indices = np.stack((corners, corners + 1, corners + size + 2, corners + size + 1), axis=-1).ravel()
+    loop_totals = np.full(size * size, 4)
+    loop_uvs = positions[loop_vertex_indices, :2] / size
+    return positions, loop_totals, loop_vertex_indices, loop_uvs
+
+
+def bench_synthetic(path):
+    obj_writer = common.load_module("obj_writer")
+    rows = []
+    for size in SIZES:
+        mesh = obj_writer.ObjMesh("grid", *synthetic_grid(size))
+        seconds = common.timed(obj_writer.write_obj, path, [mesh])
+        rows.append((size * size, f"{seconds:.3f}", f"{os.path.getsize(path) / 1e6:.1f}"))
+    common.print_table(("faces", "writer s", "MB"), rows)
+
+
+def bench_blender(path):
+    import bpy
+
+    addon = common.load_addon()
+    rows = []
+    for size in SIZES:
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+        bpy.ops.mesh.primitive_grid_add(x_subdivisions=size, y_subdivisions=size)
+        obj = bpy.context.active_object
+        obj.select_set(True)
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+
+        writer_seconds = common.timed(addon.mesh_export.export_objects, path, [obj], depsgraph)
+        writer_size = os.path.getsize(path)
+        operator_seconds = common.timed(addon.mesh_export.export_selection_with_operator, path, repeat=1)
+        rows.append((len(obj.data.polygons), f"{writer_seconds:.3f}", f"{operator_seconds:.3f}",
+                     f"{operator_seconds / writer_seconds:.1f}x", f"{writer_size / 1e6:.1f}"))
+    common.print_table(("faces", "writer s", "operator s", "speedup", "MB"), rows)
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "bench.obj")
+    try:
+        import bpy  # noqa: F401
+    except ImportError:
+        bench_synthetic(path)
+    else:
+        bench_blender(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""End-to-end benchmarks of the add-on against a fake bpy and a local mock Leonardo API.
+
+Runs with plain Python, without Blender or network access. The mock server
+(see mock_server.py) runs in its own process, so the CPU time and peak RSS
+reported are those of the add-on alone:
+
+    python benchmarks/bench_offline.py
+    python benchmarks/bench_offline.py --latency 0.1 --bandwidth 5 --failure-rate 0.1
+
+Scenarios, each at increasing sizes:
+
+- generation: init_texture_generation_job, from submitting to the maps being
+  assigned, for maps of increasing size
+- upload: UploadMeshButton for grids of increasing density
+- selection: selection_handler in scenes with an increasing number of objects
+
+Poll intervals are scaled down, so a generation is not dominated by the wait
+before its first status poll. Peak RSS is the high-water mark of the process,
+which is why every scenario runs from its smallest size up.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+import common
+import fake_bpy
+import mock_server
+
+GENERATION_SIZES_MB = [1, 4, 16]
+UPLOAD_GRID_SIZES = [100, 300, 1000]
+SELECTION_SIZES = [100, 1000, 10000]
+
+# Objects sharing the textured mesh in every scene.
+TEXTURED_OBJECTS = 10
+SELECTION_UPDATES = 200
+
+# Replaces the production poll profiles, which wait seconds before the first poll.
+BENCHMARK_POLL_INTERVALS = dict(initial_interval=0.05, max_interval=0.25, multiplier=1.5, jitter=0.2, timeout=120)
+
+
+class MockServerProcess:
+    """Runs mock_server.py in a child process."""
+
+    def __init__(self, **settings):
+        args = [sys.executable, os.path.join(BENCHMARK_DIR, "mock_server.py")]
+        for key, value in settings.items():
+            option = "--" + key.replace("_", "-")
+            if isinstance(value, bool):
+                args += [option] if value else []
+            else:
+                args += [option, str(value)]
+        self.process = subprocess.Popen(args, stdout=subprocess.PIPE, text=True)
+        # The server announces its API url once it is listening.
+        self.api_url = self.process.stdout.readline().split()[-1]
+        self.url = self.api_url[:-len(mock_server.API_PREFIX)]
+
+    def control(self, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        with urllib.request.urlopen(urllib.request.Request(self.url + path, data=body)) as response:
+            return json.load(response)
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+def peak_rss_mb():
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def measure(server, function):
+    """Runs function, returning (wall s, CPU s, peak RSS MB, requests, failed requests)."""
+    server.control("/_reset", {})
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    function()
+    wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+    stats = server.control("/_stats")
+    return wall, cpu, peak_rss_mb(), sum(stats['requests'].values()), stats['failures']
+
+
+def setup_addon(server, directory):
+    """Imports and registers the add-on on the fake bpy, talking to the mock server."""
+    bpy = fake_bpy.install()
+    fake_bpy.reset_data(os.path.join(directory, "benchmark.blend"))
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    addon = common.load_addon()
+    addon.register()
+    preferences = bpy.context.preferences.addons[common.ADDON_MODULE].preferences
+    preferences.api_key = "offline-benchmark"
+    preferences.cache_directory = os.path.join(directory, "texture_cache")
+
+    addon.api_client.API_BASE_URL = server.api_url
+    profile = addon.polling.PollProfile(**BENCHMARK_POLL_INTERVALS)
+    addon.polling.PREVIEW_PROFILE = addon.polling.FULL_PROFILE = profile
+    return addon
+
+
+def build_scene(directory, object_count, grid_size=10, selected=TEXTURED_OBJECTS):
+    """Empties the file and adds object_count objects, of which the first ones are selected."""
+    data = fake_bpy.reset_data(os.path.join(directory, "benchmark.blend"))
+    textured = data.meshes.new("textured")
+    textured.set_geometry(*fake_bpy.grid_arrays(grid_size))
+    plain = data.meshes.new("plain")
+    for index in range(object_count):
+        obj = data.objects.new(f"object_{index}", textured if index < TEXTURED_OBJECTS else plain)
+        obj.select_set(index < selected)
+    fake_bpy.context.view_layer.objects.active = data.objects[0]
+    return fake_bpy.context.scene
+
+
+def run_generation(addon, directory, preview):
+    scene = build_scene(directory, TEXTURED_OBJECTS)
+    scene.leonardo_tools.prompt_input = "benchmark"
+    scene.leonardo_tools.current_mesh_id = "mock-mesh"
+    asyncio.get_event_loop().run_until_complete(addon.init_texture_generation_job(fake_bpy.context, preview))
+    assert scene.leonardo_tools.albedo_path, scene.leonardo_tools.status_label
+    assert fake_bpy.data.meshes["textured"].materials, "No material was assigned"
+
+
+def run_upload(addon, directory, grid_size):
+    scene = build_scene(directory, 1, grid_size=grid_size, selected=1)
+    scene.leonardo_tools.mesh_name_input = f"grid_{grid_size}"
+    asyncio.get_event_loop().run_until_complete(addon.UploadMeshButton().upload(fake_bpy.context))
+    assert scene.leonardo_tools.status_label == "Upload complete!", scene.leonardo_tools.status_label
+
+
+def run_selection(addon, scene):
+    # Every other update changes the selection, the others are edits leaving it untouched.
+    toggled = fake_bpy.data.objects[TEXTURED_OBJECTS - 1]
+    for index in range(SELECTION_UPDATES):
+        if index % 2:
+            toggled.select_set(not toggled.select_get())
+        addon.selection_handler(scene)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="MB/s per connection, 0 for unlimited")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability that a GET request fails")
+    parser.add_argument("--generation-time", type=float, default=0.2, help="seconds until a generation completes")
+    parser.add_argument("--scenario", choices=("all", "generation", "upload", "selection"), default="all")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        server = MockServerProcess(latency=args.latency, bandwidth=args.bandwidth, failure_rate=args.failure_rate,
+                                   generation_time=args.generation_time)
+        addon = setup_addon(server, directory)
+        try:
+            if args.scenario in ("all", "selection"):
+                for size in SELECTION_SIZES:
+                    scene = build_scene(directory, size)
+                    addon.selection_index.mark_dirty()
+                    rows.append(("selection", f"{size} objects",
+                                 *measure(server, lambda: run_selection(addon, scene))))
+
+            if args.scenario in ("all", "upload"):
+                for size in UPLOAD_GRID_SIZES:
+                    rows.append(("upload", f"{size}x{size} grid",
+                                 *measure(server, lambda: run_upload(addon, directory, size))))
+
+            if args.scenario in ("all", "generation"):
+                for preview, sizes in ((True, GENERATION_SIZES_MB[:1]), (False, GENERATION_SIZES_MB)):
+                    for size in sizes:
+                        server.control("/_config", {'texture_size': size * 1000 * 1000})
+                        rows.append(("preview" if preview else "generation", f"{size} MB maps",
+                                     *measure(server, lambda: run_generation(addon, directory, preview))))
+        finally:
+            addon.unregister()
+            server.close()
+
+    common.print_table(("scenario", "size", "wall s", "cpu s", "peak RSS MB", "requests", "failed"),
+                       [(scenario, size, f"{wall:.3f}", f"{cpu:.3f}", f"{rss:.0f}", requests, failed)
+                        for scenario, size, wall, cpu, rss, requests, failed in rows])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Per-update cost of the selection handler against scene size.
+
+Compares the previous handler, which filtered all of bpy.data.objects on every
+depsgraph update, with the indexed handler, both for updates that leave the
+selection untouched (transform drags, edits) and for real selection changes:
+
+    blender -b --factory-startup --python benchmarks/bench_selection_handler.py
+"""
+
+import os
+import sys
+import time
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+SIZES = [100, 1000, 10000]
+UPDATES = 200
+
+
+def legacy_selection_handler(scene):
+    if len(bpy.context.selected_objects) > 0:
+        leonardo_id = bpy.context.selected_objects[0].data.get('leonardo_id', False)
+        all_objects_with_leonardo_id = list(filter(lambda obj: obj.data.get('leonardo_id', False) and obj.data.get('leonardo_id', False) == leonardo_id, bpy.data.objects))
+        if leonardo_id and len(all_objects_with_leonardo_id) == len(bpy.context.selected_objects):
+            if all(obj.data.get('leonardo_id', "") == leonardo_id for obj in bpy.context.selected_objects):
+                scene.leonardo_tools.current_mesh_id = leonardo_id
+                scene.leonardo_tools.current_mesh_name = bpy.context.selected_objects[0].data.get('leonardo_name', "")
+                return
+
+    scene.leonardo_tools.current_mesh_name = ""
+    scene.leonardo_tools.current_mesh_id = ""
+
+
+def build_scene(size):
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    textured = bpy.data.meshes.new("textured")
+    textured['leonardo_id'] = "mesh-id"
+    textured['leonardo_name'] = "textured"
+    plain = bpy.data.meshes.new("plain")
+    for index in range(size):
+        obj = bpy.data.objects.new(f"object_{index}", textured if index < 10 else plain)
+        scene.collection.objects.link(obj)
+    for index in range(10):
+        bpy.data.objects[f"object_{index}"].select_set(True)
+    bpy.context.view_layer.objects.active = bpy.data.objects["object_0"]
+    return scene
+
+
+def per_update_us(handler, scene, before_each=None):
+    started = time.perf_counter()
+    for _ in range(UPDATES):
+        if before_each is not None:
+            before_each()
+        handler(scene)
+    return (time.perf_counter() - started) / UPDATES * 1e6
+
+
+def main():
+    addon = common.load_addon()
+    addon.register()
+    try:
+        rows = []
+        for size in SIZES:
+            scene = build_scene(size)
+            addon.selection_index.mark_dirty()
+            legacy = per_update_us(legacy_selection_handler, scene)
+            unchanged = per_update_us(addon.selection_handler, scene)
+            changed = per_update_us(addon.selection_handler, scene,
+                                    before_each=lambda: setattr(addon.selection_index, '_last_signature', None))
+            assert scene.leonardo_tools.current_mesh_id == "mesh-id"
+            rows.append((size, f"{legacy:.1f}", f"{unchanged:.1f}", f"{changed:.1f}"))
+        common.print_table(("objects", "legacy us", "indexed us (no change)", "indexed us (selection change)"), rows)
+    finally:
+        addon.unregister()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Helpers shared by the benchmark scripts.
+
+The benchmarks import the add-on straight from this repository, so they can be run
+without installing it, e.g.:
+
+    blender -b --factory-startup --python benchmarks/bench_obj_export.py
+"""
+
+import importlib.util
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_MODULE = "leonardo_texturing"
+
+
+def load_addon():
+    """Imports the repository as the add-on package (without registering it)."""
+    if ADDON_MODULE in sys.modules:
+        return sys.modules[ADDON_MODULE]
+    spec = importlib.util.spec_from_file_location(ADDON_MODULE, os.path.join(REPO_ROOT, "__init__.py"),
+                                                  submodule_search_locations=[REPO_ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[ADDON_MODULE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_module(name):
+    """Imports a single add-on module that does not depend on bpy or its siblings."""
+    spec = importlib.util.spec_from_file_location(f"{ADDON_MODULE}_{name}", os.path.join(REPO_ROOT, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    """Returns the best wall time in seconds of repeat calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args, **kwargs)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def print_table(header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print("  ".join(str(value).rjust(width) for value, width in zip(row, widths)))
@@ -0,0 +1,568 @@
+"""Minimal stand-in for the bpy module, so the add-on can be imported and driven without Blender.
+
+Only the parts of the API the add-on touches are covered: property
+declarations and PropertyGroups, the registration of classes and add-on
+preferences, ID custom properties, objects and meshes readable with
+foreach_get, images, materials with node trees, the selection and the
+application handlers. Anything drawing UI or running operators is a no-op.
+install() has to run before the add-on is imported:
+
+    import fake_bpy
+    bpy = fake_bpy.install()
+    addon = common.load_addon()
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import types
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+IDENTITY = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+
+
+# ------------------------------------------------------------------------
+#    Properties
+# ------------------------------------------------------------------------
+
+class _Property:
+    """Declared property. Stored per instance on first access, calling its update callback on every write."""
+
+    def __init__(self, kind, **options):
+        self.kind = kind
+        self.options = options
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def default_value(self):
+        if self.kind == 'PointerProperty':
+            return self.options['type']()
+        if self.kind == 'CollectionProperty':
+            return Collection(self.options['type'])
+        items = self.options.get('items')
+        static_items = items if isinstance(items, (list, tuple)) else ()
+        if 'default' in self.options:
+            default = self.options['default']
+            # An integer default of an enum is the number of an item.
+            if self.kind == 'EnumProperty' and isinstance(default, int) and static_items:
+                return static_items[default][0]
+            return default
+        if self.kind == 'EnumProperty':
+            return static_items[0][0] if static_items else ""
+        return {'StringProperty': "", 'BoolProperty': False, 'IntProperty': 0, 'FloatProperty': 0.0}[self.kind]
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if self.name not in instance.__dict__:
+            instance.__dict__[self.name] = self.default_value()
+        return instance.__dict__[self.name]
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+        update = self.options.get('update')
+        if update is not None:
+            # Like Blender, errors in update callbacks are reported but never propagated.
+            try:
+                update(instance, context)
+            except Exception:
+                log.debug("Update callback of %s failed", self.name, exc_info=True)
+
+
+def _property_factory(kind):
+    def factory(**options):
+        return _Property(kind, **options)
+    factory.__name__ = kind
+    return factory
+
+
+class _StructMeta(type):
+    """Lets properties be added to registered classes later, e.g. bpy.types.Scene.leonardo_tools = ..."""
+
+    def __setattr__(cls, name, value):
+        if isinstance(value, _Property):
+            value.name = name
+        super().__setattr__(name, value)
+
+
+class bpy_struct(metaclass=_StructMeta):
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Properties are declared as annotations, turn them into descriptors.
+        for name, value in cls.__dict__.get('__annotations__', {}).items():
+            if isinstance(value, _Property):
+                setattr(cls, name, value)
+
+
+class Collection:
+    """CollectionProperty value, and the type of the bpy.data collections."""
+
+    def __init__(self, item_type=None):
+        self.item_type = item_type
+        self._items = []
+
+    def add(self):
+        item = self.item_type()
+        self._items.append(item)
+        return item
+
+    def remove(self, item):
+        if isinstance(item, int):
+            del self._items[item]
+        else:
+            self._items.remove(item)
+
+    def clear(self):
+        self._items.clear()
+
+    def get(self, name, default=None):
+        for item in self._items:
+            if getattr(item, 'name', None) == name:
+                return item
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            item = self.get(key)
+            if item is None:
+                raise KeyError(key)
+            return item
+        return self._items[key]
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(list(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+
+# ------------------------------------------------------------------------
+#    Types
+# ------------------------------------------------------------------------
+
+class ID(bpy_struct):
+    """Data-block with custom properties."""
+
+    def __init__(self, name=""):
+        self.name = name
+        self._custom = {}
+
+    def __getitem__(self, key):
+        return self._custom[key]
+
+    def __setitem__(self, key, value):
+        self._custom[key] = value
+
+    def __delitem__(self, key):
+        del self._custom[key]
+
+    def __contains__(self, key):
+        return key in self._custom
+
+    def get(self, key, default=None):
+        return self._custom.get(key, default)
+
+    def pop(self, key, *default):
+        return self._custom.pop(key, *default)
+
+
+class PropertyGroup(bpy_struct):
+    pass
+
+
+class Operator(bpy_struct):
+
+    def report(self, level, message):
+        print(f"{'/'.join(sorted(level))}: {message}")
+
+
+class Panel(bpy_struct):
+    pass
+
+
+class AddonPreferences(bpy_struct):
+    pass
+
+
+class LayerObjects:
+
+    def __init__(self):
+        self.active = None
+
+
+class _ForeachCollection:
+    """Mesh element collection (vertices, loops, polygons, uv data) backed by NumPy arrays."""
+
+    def __init__(self, length, **attributes):
+        self._length = length
+        self._attributes = attributes
+
+    def __len__(self):
+        return self._length
+
+    def foreach_get(self, attribute, buffer):
+        buffer[:] = self._attributes[attribute].ravel()
+
+
+class _UVLayers:
+
+    def __init__(self, loop_uvs):
+        self.active = types.SimpleNamespace(data=_ForeachCollection(len(loop_uvs), uv=loop_uvs)) \
+            if loop_uvs is not None else None
+
+
+class Mesh(ID):
+
+    def __init__(self, name=""):
+        super().__init__(name)
+        self.materials = []
+        self.set_geometry(np.empty((0, 3), dtype=np.float32), np.empty(0, dtype=np.int32),
+                          np.empty(0, dtype=np.int32))
+
+    def set_geometry(self, positions, loop_totals, loop_vertex_indices, loop_uvs=None):
+        self.vertices = _ForeachCollection(len(positions), co=positions)
+        self.polygons = _ForeachCollection(len(loop_totals), loop_total=loop_totals)
+        self.loops = _ForeachCollection(len(loop_vertex_indices), vertex_index=loop_vertex_indices)
+        self.uv_layers = _UVLayers(loop_uvs)
+
+
+def grid_arrays(size):
+    """Returns the arguments of Mesh.set_geometry() for a size x size quad grid with UVs."""
+    xs, ys = np.meshgrid(np.arange(size + 1, dtype=np.float32), np.arange(size + 1, dtype=np.float32))
+    positions = np.stack((xs.ravel(), ys.ravel(), np.zeros(xs.size, dtype=np.float32)), axis=-1) / size
+    corners = (np.arange(size)[None, :] + (size + 1) * np.arange(size)[:, None]).ravel()
+    loop_vertex_indices = np.stack((corners, corners + 1, corners + size + 2, corners + size + 1),
+                                   axis=-1).ravel().astype(np.int32)
+    return positions, np.full(size * size, 4, dtype=np.int32), loop_vertex_indices, positions[loop_vertex_indices, :2]
+
+
+class Object(ID):
+
+    def __init__(self, name="", data=None):
+        super().__init__(name)
+        self.data = data
+        self.type = 'MESH' if isinstance(data, Mesh) else 'EMPTY'
+        self.matrix_world = [list(row) for row in IDENTITY]
+        self._selected = False
+
+    def select_set(self, state):
+        self._selected = bool(state)
+
+    def select_get(self):
+        return self._selected
+
+    def evaluated_get(self, depsgraph):
+        return self
+
+    def to_mesh(self):
+        return self.data if isinstance(self.data, Mesh) else None
+
+    def to_mesh_clear(self):
+        pass
+
+
+class Image(ID):
+
+    def __init__(self, name="", filepath=""):
+        super().__init__(name)
+        self.filepath = filepath
+        self.filepath_raw = filepath
+        self.size = (0, 0)
+        self.use_fake_user = False
+        self.file_format = 'PNG'
+        self.colorspace_settings = types.SimpleNamespace(name='sRGB')
+
+    @property
+    def users(self):
+        return self.use_fake_user + sum(getattr(node, 'image', None) is self
+                                        for mat in data.materials for node in mat.node_tree.nodes)
+
+    def reload(self):
+        pass
+
+    def save(self):
+        pass
+
+
+class _Sockets:
+    """Node inputs or outputs; sockets are created on first access by name or index."""
+
+    def __init__(self):
+        self._sockets = {}
+
+    def __getitem__(self, key):
+        return self._sockets.setdefault(key, types.SimpleNamespace(name=key, default_value=None))
+
+
+class Node:
+
+    def __init__(self, bl_idname):
+        self.bl_idname = bl_idname
+        self.name = bl_idname
+        self.label = ""
+        self.location = (0, 0)
+        self.image = None
+        self.inputs = _Sockets()
+        self.outputs = _Sockets()
+
+
+class _Nodes(Collection):
+
+    def new(self, type):
+        node = Node(type)
+        self._items.append(node)
+        return node
+
+
+class _Links(Collection):
+
+    def new(self, to_socket, from_socket):
+        link = (from_socket, to_socket)
+        self._items.append(link)
+        return link
+
+
+class Material(ID):
+
+    def __init__(self, name=""):
+        super().__init__(name)
+        self.use_nodes = False
+        self.node_tree = types.SimpleNamespace(nodes=_Nodes(), links=_Links())
+
+
+# Only checked for with hasattr() by the add-on.
+class ShaderNodeSeparateColor:
+    pass
+
+
+class Scene(ID):
+    pass
+
+
+# ------------------------------------------------------------------------
+#    bpy.data
+# ------------------------------------------------------------------------
+
+class _IDCollection(Collection):
+
+    def __init__(self, item_type):
+        super().__init__(item_type)
+
+    def new(self, name, *args, **kwargs):
+        item = self.item_type(name, *args)
+        self._items.append(item)
+        return item
+
+    def remove(self, item, **kwargs):
+        self._items.remove(item)
+
+
+class _Images(_IDCollection):
+
+    def load(self, filepath, check_existing=False):
+        if check_existing:
+            for image in self._items:
+                if os.path.abspath(image.filepath) == os.path.abspath(filepath):
+                    return image
+        if not os.path.exists(filepath):
+            raise RuntimeError(f"Error: Cannot read image file \"{filepath}\"")
+        image = Image(os.path.basename(filepath), filepath)
+        self._items.append(image)
+        return image
+
+    def new(self, name, width=0, height=0, **kwargs):
+        image = Image(name)
+        image.size = (width, height)
+        self._items.append(image)
+        return image
+
+
+class BlendData:
+
+    def __init__(self):
+        self.filepath = ""
+        self.objects = _IDCollection(Object)
+        self.meshes = _IDCollection(Mesh)
+        self.images = _Images(Image)
+        self.materials = _IDCollection(Material)
+        self.scenes = _IDCollection(Scene)
+
+    @property
+    def is_saved(self):
+        return bool(self.filepath)
+
+
+# ------------------------------------------------------------------------
+#    bpy.context
+# ------------------------------------------------------------------------
+
+class _Addons(dict):
+    pass
+
+
+class ViewLayer:
+
+    def __init__(self):
+        self.objects = LayerObjects()
+
+
+class Context:
+
+    def __init__(self):
+        self.view_layer = ViewLayer()
+        self.preferences = types.SimpleNamespace(addons=_Addons())
+        self.area = None
+        self.window = types.SimpleNamespace(screen=None)
+        self.window_manager = types.SimpleNamespace(windows=[self.window])
+
+    @property
+    def scene(self):
+        return data.scenes[0]
+
+    @property
+    def selected_objects(self):
+        return [obj for obj in data.objects if obj.select_get()]
+
+    @property
+    def active_object(self):
+        return self.view_layer.objects.active
+
+    @property
+    def object(self):
+        return self.view_layer.objects.active
+
+    def evaluated_depsgraph_get(self):
+        return types.SimpleNamespace(scene=self.scene)
+
+
+# ------------------------------------------------------------------------
+#    bpy.utils, bpy.app, bpy.ops, bpy.path, bpy.msgbus
+# ------------------------------------------------------------------------
+
+_resource_directory = None
+
+
+def register_class(cls):
+    if issubclass(cls, AddonPreferences):
+        context.preferences.addons[cls.bl_idname] = types.SimpleNamespace(module=cls.bl_idname, preferences=cls())
+
+
+def unregister_class(cls):
+    if issubclass(cls, AddonPreferences):
+        context.preferences.addons.pop(cls.bl_idname, None)
+
+
+def user_resource(resource_type, path=""):
+    global _resource_directory
+
+    if _resource_directory is None:
+        _resource_directory = tempfile.mkdtemp(prefix="fake_bpy_")
+    return os.path.join(_resource_directory, resource_type.lower(), path)
+
+
+def persistent(function):
+    return function
+
+
+class _Operators:
+    """bpy.ops and its submodules; every operator does nothing and finishes."""
+
+    def __init__(self, path="bpy.ops"):
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return _Operators(f"{self._path}.{name}")
+
+    def __dir__(self):
+        return []
+
+    def __call__(self, *args, **kwargs):
+        log.debug("Ignoring %s()", self._path)
+        return {'FINISHED'}
+
+
+def abspath(path):
+    if path.startswith("//"):
+        path = os.path.join(os.path.dirname(data.filepath), path[2:])
+    return os.path.abspath(path)
+
+
+def clean_name(name, replace="_"):
+    return "".join(char if char.isalnum() or char in "-." else replace for char in name)
+
+
+data = BlendData()
+context = Context()
+
+
+def reset_data(filepath=""):
+    """Empties bpy.data, like loading an empty file saved at filepath, keeping one scene."""
+    global data
+
+    data = BlendData()
+    data.filepath = filepath
+    data.scenes.new("Scene")
+    context.view_layer.objects.active = None
+    sys.modules['bpy'].data = data
+    return data
+
+
+def install():
+    """Puts the fake bpy into sys.modules and returns it."""
+    if 'bpy' in sys.modules:
+        return sys.modules['bpy']
+
+    bpy = types.ModuleType('bpy')
+    bpy.__file__ = __file__
+    bpy.data = data
+    bpy.context = context
+
+    bpy.props = types.ModuleType('bpy.props')
+    for kind in ('StringProperty', 'BoolProperty', 'IntProperty', 'FloatProperty', 'EnumProperty',
+                 'PointerProperty', 'CollectionProperty'):
+        setattr(bpy.props, kind, _property_factory(kind))
+
+    bpy.types = types.ModuleType('bpy.types')
+    for cls in (bpy_struct, ID, PropertyGroup, Operator, Panel, AddonPreferences, LayerObjects, Mesh, Object,
+                Image, Material, Scene, ShaderNodeSeparateColor):
+        setattr(bpy.types, cls.__name__, cls)
+
+    bpy.utils = types.ModuleType('bpy.utils')
+    bpy.utils.register_class = register_class
+    bpy.utils.unregister_class = unregister_class
+    bpy.utils.user_resource = user_resource
+
+    bpy.app = types.ModuleType('bpy.app')
+    bpy.app.version = (3, 6, 0)
+    bpy.app.background = True
+    bpy.app.handlers = types.ModuleType('bpy.app.handlers')
+    bpy.app.handlers.persistent = persistent
+    for name in ('depsgraph_update_post', 'load_post', 'undo_post', 'redo_post', 'save_pre', 'save_post'):
+        setattr(bpy.app.handlers, name, [])
+
+    # Timers never fire, nothing runs Blender's event loop.
+    timers = set()
+    bpy.app.timers = types.SimpleNamespace(register=lambda function, **kwargs: timers.add(function),
+                                           unregister=timers.remove, is_registered=timers.__contains__)
+
+    bpy.msgbus = types.SimpleNamespace(subscribe_rna=lambda **kwargs: None,
+                                       clear_by_owner=lambda owner: None)
+    bpy.ops = _Operators()
+    bpy.path = types.SimpleNamespace(abspath=abspath, clean_name=clean_name)
+
+    sys.modules.update({'bpy': bpy, 'bpy.props': bpy.props, 'bpy.types': bpy.types, 'bpy.utils': bpy.utils,
+                        'bpy.app': bpy.app, 'bpy.app.handlers': bpy.app.handlers})
+    reset_data()
+    return bpy
@@ -0,0 +1,335 @@
+"""Local HTTP server mimicking the parts of the Leonardo API the add-on uses.
+
+Serves /me, /models-3d/upload, /models-3d/user/<id>, /generations-texture,
+presigned S3 uploads and the CDN the generated maps are downloaded from, with
+configurable latency, bandwidth and failure rate. Generations complete after a
+fixed time and their maps are random bytes of a configurable size, served with
+MD5 ETags and Range support like S3. Failures are only injected into GET
+requests, which the add-on retries: API calls answer 503, downloads drop the
+connection halfway through the body.
+
+Runs standalone, e.g. to point a real Blender session at it:
+
+    python benchmarks/mock_server.py --port 8765 --latency 0.05 --bandwidth 10 --failure-rate 0.05
+
+The API lives under /api/rest/v1. GET /_stats returns the number of requests
+per route, POST /_config changes the settings and POST /_reset clears the stats.
+"""
+
+import argparse
+import hashlib
+import http.server
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+
+API_PREFIX = "/api/rest/v1"
+MAP_TYPES = ('albedo', 'normal', 'roughness', 'displacement')
+CHUNK_SIZE = 64 * 1024
+
+DEFAULT_SETTINGS = {
+    # Seconds added to every response.
+    'latency': 0.0,
+    # Megabytes per second per connection for uploads and downloads, 0 for unlimited.
+    'bandwidth': 0.0,
+    # Probability that a GET request fails.
+    'failure_rate': 0.0,
+    # Seconds until a submitted generation is complete.
+    'generation_time': 0.5,
+    # Size of every generated map and of its placeholder in bytes.
+    'texture_size': 1024 * 1024,
+    'placeholder_size': 16 * 1024,
+    # Number of meshes listed for the user.
+    'user_meshes': 10,
+    # Whether presigned uploads accept gzip compressed meshes.
+    'accept_gzip': False,
+}
+
+
+class MockLeonardo:
+    """State shared by all request handlers."""
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.textures = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': {}, 'failures': 0, 'bytes_received': 0, 'bytes_sent': 0}
+
+    def count(self, route, **values):
+        with self.lock:
+            self.stats['requests'][route] = self.stats['requests'].get(route, 0) + 1
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def texture(self, size):
+        """Returns (content, etag) of a map of size bytes; all maps of the same size are identical."""
+        with self.lock:
+            if size not in self.textures:
+                content = random.Random(size).randbytes(size)
+                self.textures[size] = content, f'"{hashlib.md5(content).hexdigest()}"'
+            return self.textures[size]
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockLeonardo/1.0"
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def log_message(self, format, *args):
+        pass
+
+    # --------------------------------------------------------------------
+    #    Helpers
+    # --------------------------------------------------------------------
+
+    def base_url(self):
+        return f"http://{self.headers.get('host', '%s:%i' % self.server.server_address[:2])}"
+
+    def read_body(self):
+        """Reads the request body at the configured bandwidth, returns (body, content length)."""
+        length = int(self.headers.get('content-length', 0))
+        chunks = []
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            chunks.append(chunk)
+            self.throttle(len(chunk))
+        return b"".join(chunks), length
+
+    def throttle(self, size):
+        bandwidth = self.mock.settings['bandwidth']
+        if bandwidth > 0:
+            time.sleep(size / (bandwidth * 1e6))
+
+    def send(self, status, body=b"", headers=None, content_type="application/json"):
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_json(self, payload, status=200, headers=None):
+        self.send(status, json.dumps(payload).encode(), headers)
+
+    def should_fail(self):
+        return self.command == 'GET' and random.random() < self.mock.settings['failure_rate']
+
+    # --------------------------------------------------------------------
+    #    Routing
+    # --------------------------------------------------------------------
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_HEAD(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        path, _, query = self.path.partition("?")
+        if path.startswith("/_"):
+            return self.handle_control(path)
+
+        time.sleep(self.mock.settings['latency'])
+        if path.startswith("/cdn/"):
+            return self.handle_download(path)
+        if path == "/s3/upload" and self.command == 'POST':
+            return self.handle_upload()
+
+        if not path.startswith(API_PREFIX):
+            return self.send_json({'error': "Not found"}, 404)
+        path = path[len(API_PREFIX):]
+        body, length = self.read_body() if self.command == 'POST' else (b"", 0)
+
+        routes = [
+            ('GET', r"/me", self.get_me),
+            ('POST', r"/models-3d/upload", self.post_model_upload),
+            ('GET', r"/models-3d/user/(?P<user_id>[^/]+)", self.get_user_models),
+            ('POST', r"/generations-texture", self.post_generation),
+            ('GET', r"/generations-texture/(?P<job_id>[^/]+)", self.get_generation),
+        ]
+        for method, pattern, handler in routes:
+            match = re.fullmatch(pattern, path)
+            if match and method == self.command:
+                route = f"{method} {pattern.split('/(')[0]}"
+                if self.should_fail():
+                    self.mock.count(route, failures=1)
+                    return self.send_json({'error': "Service unavailable"}, 503)
+                self.mock.count(route, bytes_received=length)
+                return handler(body=body, query=query, **match.groupdict())
+        self.send_json({'error': "Not found"}, 404)
+
+    def handle_control(self, path):
+        if path == "/_stats":
+            with self.mock.lock:
+                body = json.dumps(self.mock.stats).encode()
+            return self.send(200, body)
+        if path == "/_config" and self.command == 'POST':
+            body, _ = self.read_body()
+            self.mock.settings.update(json.loads(body or b"{}"))
+            return self.send_json(self.mock.settings)
+        if path == "/_reset" and self.command == 'POST':
+            self.read_body()
+            self.mock.reset_stats()
+            return self.send_json({})
+        self.send_json({'error': "Not found"}, 404)
+
+    # --------------------------------------------------------------------
+    #    API
+    # --------------------------------------------------------------------
+
+    def get_me(self, **kwargs):
+        self.send_json({'user_details': [{'user': {'id': "mock-user", 'username': "mock"}}]})
+
+    def post_model_upload(self, body, **kwargs):
+        payload = json.loads(body or b"{}")
+        fields = {'key': f"models/{uuid.uuid4()}.{payload.get('modelExtension', 'obj')}", 'policy': "mock"}
+        if self.mock.settings['accept_gzip']:
+            fields['Content-Encoding'] = "gzip"
+        self.send_json({'uploadModelAsset': {'modelId': str(uuid.uuid4()), 'modelUrl': f"{self.base_url()}/s3/upload",
+                                             'modelFields': json.dumps(fields)}})
+
+    def get_user_models(self, user_id, query, **kwargs):
+        params = dict(parameter.partition("=")[::2] for parameter in query.split("&") if parameter)
+        offset, limit = int(params.get('offset', 0)), int(params.get('limit', 100))
+        count = self.mock.settings['user_meshes']
+        meshes = [{'id': f"mesh-{index}", 'name': f"Mesh {index}"} for index in range(offset, min(offset + limit, count))]
+        # Like a real server, the ETag only covers the page it was sent with.
+        etag = '"' + hashlib.md5(json.dumps(meshes).encode()).hexdigest() + '"'
+        if self.headers.get('if-none-match') == etag:
+            return self.send(304, headers={'etag': etag})
+        self.send_json({'model_assets': meshes}, headers={'etag': etag})
+
+    def post_generation(self, body, **kwargs):
+        params = json.loads(body or b"{}")
+        job_id = str(uuid.uuid4())
+        with self.mock.lock:
+            self.mock.jobs[job_id] = {'ready_at': time.monotonic() + self.mock.settings['generation_time'],
+                                      'preview': bool(params.get('preview')),
+                                      'seed': params.get('seed') or random.randint(1, 2 ** 31)}
+        self.send_json({'textureGenerationJob': {'id': job_id}})
+
+    def get_generation(self, job_id, **kwargs):
+        job = self.mock.jobs.get(job_id)
+        if job is None:
+            return self.send_json({'model_asset_texture_generations_by_pk': None})
+        if time.monotonic() < job['ready_at']:
+            return self.send_json({'model_asset_texture_generations_by_pk': {'id': job_id, 'status': 'PENDING'}})
+
+        images = []
+        for map_type in MAP_TYPES:
+            image = {'url': f"{self.base_url()}/cdn/{job_id}/{map_type}.jpg"}
+            if job['preview']:
+                image['thumbnail_url'] = f"{self.base_url()}/cdn/{job_id}/placeholder_{map_type}.jpg"
+            images.append(image)
+        self.send_json({'model_asset_texture_generations_by_pk': {
+            'id': job_id, 'status': 'COMPLETE', 'seed': job['seed'], 'model_asset_texture_images': images}})
+
+    # --------------------------------------------------------------------
+    #    S3
+    # --------------------------------------------------------------------
+
+    def handle_upload(self):
+        _, length = self.read_body()
+        self.mock.count("POST /s3/upload", bytes_received=length)
+        self.send(204, content_type="text/plain")
+
+    def handle_download(self, path):
+        size = self.mock.settings['placeholder_size' if "/placeholder_" in path else 'texture_size']
+        content, etag = self.mock.texture(size)
+
+        start = 0
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get('range', ""))
+        if_range = self.headers.get('if-range')
+        if match and (if_range is None or if_range == etag):
+            start = int(match.group(1))
+            if start >= size:
+                self.mock.count("GET /cdn")
+                return self.send(416, headers={'content-range': f"bytes */{size}"}, content_type="image/jpeg")
+
+        fail = self.should_fail()
+        self.mock.count("GET /cdn", failures=int(fail))
+        self.send_response(206 if start else 200)
+        self.send_header('content-type', "image/jpeg")
+        self.send_header('content-length', str(size - start))
+        self.send_header('etag', etag)
+        self.send_header('accept-ranges', "bytes")
+        if start:
+            self.send_header('content-range', f"bytes {start}-{size - 1}/{size}")
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+
+        # A failing download breaks off halfway through the body.
+        end = start + (size - start) // 2 if fail else size
+        for offset in range(start, end, CHUNK_SIZE):
+            chunk = content[offset:min(offset + CHUNK_SIZE, end)]
+            self.wfile.write(chunk)
+            with self.mock.lock:
+                self.mock.stats['bytes_sent'] += len(chunk)
+            self.throttle(len(chunk))
+        if fail:
+            self.close_connection = True
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+
+
+class MockServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), **settings):
+        super().__init__(address, Handler)
+        self.mock = MockLeonardo(**settings)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    for key, value in DEFAULT_SETTINGS.items():
+        option = "--" + key.replace("_", "-")
+        if isinstance(value, bool):
+            parser.add_argument(option, action="store_true", default=value)
+        else:
+            parser.add_argument(option, type=type(value), default=value)
+    args = vars(parser.parse_args())
+
+    server = MockServer((args.pop('host'), args.pop('port')), **args)
+    print(f"Serving mock Leonardo API on {server.url}{API_PREFIX}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
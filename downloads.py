@@ -0,0 +1,367 @@
+"""Concurrent, streaming downloads of generated texture maps."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+import bpy
+
+from . import api_client
+from . import async_computation
+from . import instrumentation
+from . import resilience
+from . import texture_cache
+
+log = logging.getLogger(__name__)
+
+# Maps the texture type found in a downloaded file name to the setting storing its path.
+TEXTURE_MAP_PROPERTIES = {
+    'albedo': 'albedo_path',
+    'normal': 'normalmap_path',
+    'roughness': 'roughnessmap_path',
+    'displacement': 'displacementmap_path',
+}
+
+# Order in which texture maps are downloaded, so the albedo shows up first when
+# maps are applied progressively.
+MAP_PRIORITY = ('albedo', 'normal', 'roughness', 'displacement')
+
+# Optional field of a texture image pointing to a low resolution version, which
+# is shown as a placeholder until the full map has landed.
+PLACEHOLDER_URL_KEY = 'thumbnail_url'
+PLACEHOLDER_DIRECTORY = 'placeholders'
+
+# Incomplete downloads are tracked in this file, by default in the download directory.
+MANIFEST_FILENAME = 'downloads.json'
+
+# Attempts to resume an interrupted download before giving up.
+MAX_DOWNLOAD_ATTEMPTS = 5
+# Minimum seconds to wait before trying again while the circuit breaker of the host is open.
+# Waiting does not use up an attempt.
+CIRCUIT_OPEN_WAIT = 1.0
+# Seconds a download waits in total for an open circuit breaker before giving up.
+CIRCUIT_OPEN_MAX_WAIT = 3 * resilience.BREAKER_RESET_TIMEOUT
+
+_manifests = {}
+
+# Minimum time in seconds between two download progress updates of the status label.
+PROGRESS_UPDATE_INTERVAL = 0.1
+
+
+def get_texture_map_type(filename):
+    for map_type in TEXTURE_MAP_PROPERTIES:
+        if f'{map_type}.jpg' in filename:
+            return map_type
+    return None
+
+
+def get_map_priority(image):
+    map_type = get_texture_map_type(image['url'].split('/')[-1])
+    return MAP_PRIORITY.index(map_type) if map_type in MAP_PRIORITY else len(MAP_PRIORITY)
+
+
+def format_download_progress(progress):
+    parts = []
+    for name, (received, total) in progress.items():
+        if total:
+            parts.append(f"{name} {received / 1e6:.1f}/{total / 1e6:.1f} MB")
+        else:
+            parts.append(f"{name} {received / 1e6:.1f} MB")
+    return "Downloading " + " | ".join(parts)
+
+
+class DownloadManifest:
+    """Incomplete downloads by target path, saved as JSON next to the .part files.
+
+    Each entry remembers the url, ETag and expected size of a download, so its
+    .part file can be resumed with a Range request, also after a restart.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as reader:
+                    self.entries = json.load(reader)
+            except (OSError, ValueError):
+                log.warning("Ignoring unreadable download manifest %s", path)
+
+    def get(self, dl_path):
+        return self.entries.get(os.path.abspath(dl_path))
+
+    def set(self, dl_path, entry):
+        self.entries[os.path.abspath(dl_path)] = entry
+        self.save()
+
+    def remove(self, dl_path):
+        if self.entries.pop(os.path.abspath(dl_path), None) is not None:
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as writer:
+            json.dump(self.entries, writer, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def get_manifest(path):
+    path = os.path.abspath(path)
+    if path not in _manifests:
+        _manifests[path] = DownloadManifest(path)
+    return _manifests[path]
+
+
+def parse_content_range(value):
+    """Returns (first byte, complete length or None) of a Content-Range header, or None."""
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", value or "")
+    if match is None:
+        return None
+    return int(match.group(1)), None if match.group(2) == '*' else int(match.group(2))
+
+
+def verify_etag(path, etag):
+    """Checks the file against an ETag holding the MD5 of the content, as S3 sends for plain uploads.
+
+    Other ETags (multipart uploads, weak ETags) cannot be verified and are accepted.
+    """
+    digest = (etag or "").strip('"')
+    if not re.fullmatch(r"[0-9a-f]{32}", digest):
+        return True
+    md5 = hashlib.md5()
+    with open(path, 'rb') as reader:
+        for block in iter(lambda: reader.read(1024 * 1024), b""):
+            md5.update(block)
+    return md5.hexdigest() == digest
+
+
+async def fetch_part(url, part_path, entry, on_received):
+    """Downloads url into part_path, resuming from its current size when entry allows it.
+
+    :return: 'complete', 'restart' when the part file had to be discarded, or
+        'failed' for an error response.
+    :raise OSError: the connection broke; the part file can be resumed.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'accept-encoding': 'identity'}
+    if offset:
+        headers['range'] = f"bytes={offset}-"
+        if entry.get('etag'):
+            headers['if-range'] = entry['etag']
+
+    response = await api_client.get_client().get(url, authorized=False, stream=True, timeout='download',
+                                                 headers=headers)
+    try:
+        if response.status_code == 416 and offset and offset == entry.get('total'):
+            return 'complete'
+
+        if response.status_code == 206:
+            content_range = parse_content_range(response.headers.get('content-range'))
+            etag = response.headers.get('etag')
+            if content_range is None or content_range[0] != offset or (etag and entry.get('etag') not in (None, etag)):
+                os.remove(part_path)
+                return 'restart'
+            total = content_range[1] or entry.get('total', 0)
+            mode = 'ab'
+        elif response.status_code == 200:
+            # The server ignored the range or the file changed since: start over.
+            offset = 0
+            total = int(response.headers.get('content-length', 0))
+            mode = 'wb'
+        else:
+            print(f"Download of {url} failed with status {response.status_code}")
+            if response.status_code == 416 and offset:
+                os.remove(part_path)
+                return 'restart'
+            return 'failed'
+
+        entry.update(etag=response.headers.get('etag') or entry.get('etag'), total=total)
+        received = offset
+        on_received(received, total, entry)
+        with open(part_path, mode) as writer:
+            async for chunk in response.iter_chunks():
+                writer.write(chunk)
+                received += len(chunk)
+                on_received(received, total, None)
+        if total and received != total:
+            raise ConnectionError(f"Download ended after {received} of {total} bytes")
+        return 'complete'
+    finally:
+        await response.aclose()
+
+
+async def download_file(url, path, progress=None, generation_id=None, on_progress=None, manifest_path=None):
+    """Streams url into path, reporting bytes received into progress.
+
+    The file is written to a temporary .part file that is only renamed to its final
+    name once complete and verified against its Content-Length and (MD5) ETag, so
+    a broken download never leaves a truncated image behind. Interrupted downloads
+    are resumed with Range requests. While the circuit breaker of the host is open
+    the download waits for it instead of using up its attempts, for at most
+    CIRCUIT_OPEN_MAX_WAIT seconds. The .part file and an entry in the manifest
+    at manifest_path are kept when all attempts fail or the task is cancelled, so
+    the download continues where it stopped next time, even after a restart.
+    Maps already in the texture cache are copied from disk without any network request.
+
+    :return: the downloaded file path, or None when the server refused the download.
+    :raise resilience.LeonardoError: all attempts failed or the download is corrupted.
+    """
+    filename = url.split('/')[-1]
+    dl_path = os.path.join(path, filename)
+    part_path = dl_path + ".part"
+    map_type = get_texture_map_type(filename)
+    label = map_type or filename
+    progress = progress if progress is not None else {}
+
+    def report():
+        if on_progress is not None:
+            on_progress(format_download_progress(progress))
+
+    cache = texture_cache.get_cache()
+    cached_path = await async_computation.run_in_executor(async_computation.IO_EXECUTOR, cache.lookup, generation_id,
+                                                          map_type, url)
+    if cached_path is not None:
+        print(f"Using cached {filename} from {cached_path}")
+        with instrumentation.span('download', generation_id, map=label, cached=True):
+            await async_computation.run_in_executor(async_computation.IO_EXECUTOR, shutil.copyfile, cached_path, dl_path)
+        size = os.path.getsize(dl_path)
+        progress[label] = (size, size)
+        report()
+        return dl_path
+
+    manifest = get_manifest(manifest_path or os.path.join(path, MANIFEST_FILENAME))
+    entry = manifest.get(dl_path)
+    if entry is None or entry.get('file') != filename:
+        entry = {'file': filename, 'url': url}
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    entry['url'] = url
+
+    last_update = 0
+
+    def on_received(received, total, changed_entry):
+        nonlocal last_update
+        progress[label] = (received, total)
+        if changed_entry is not None:
+            manifest.set(dl_path, changed_entry)
+        if time.monotonic() - last_update > PROGRESS_UPDATE_INTERVAL:
+            last_update = time.monotonic()
+            report()
+
+    if os.path.exists(part_path):
+        print(f"Resuming {url} at {os.path.getsize(part_path) / 1e6:.1f} MB")
+    else:
+        print(f"Downloading {url} to {dl_path}")
+
+    with instrumentation.span('download', generation_id, map=label) as download_span:
+        attempt = 0
+        circuit_waited = 0
+        while attempt < MAX_DOWNLOAD_ATTEMPTS:
+            size_before = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            try:
+                result = await fetch_part(url, part_path, entry, on_received)
+            except resilience.CircuitOpenError as ex:
+                # The host is paused for longer than the attempts would last: wait for it to take requests again.
+                delay = max(ex.retry_after, CIRCUIT_OPEN_WAIT)
+                if circuit_waited + delay > CIRCUIT_OPEN_MAX_WAIT:
+                    raise resilience.LeonardoError(f"Download of {filename} failed: the server stayed unavailable",
+                                                   retryable=True) from ex
+                circuit_waited += delay
+                print(f"Download of {filename} waiting, {ex}")
+                await asyncio.sleep(delay)
+                continue
+            except (OSError, resilience.LeonardoError) as ex:
+                if attempt == MAX_DOWNLOAD_ATTEMPTS - 1:
+                    raise resilience.LeonardoError(f"Download of {filename} failed: {ex}", retryable=True) from ex
+                delay = resilience.backoff_delay(attempt)
+                print(f"Download of {filename} interrupted ({ex}), resuming in {delay:.1f}s")
+                instrumentation.count('download_resumes')
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                received = (os.path.getsize(part_path) if os.path.exists(part_path) else 0) - size_before
+                instrumentation.count('bytes_downloaded', max(received, 0))
+                download_span.fields['bytes'] = download_span.fields.get('bytes', 0) + max(received, 0)
+            if result == 'failed':
+                return None
+            if result == 'complete':
+                break
+            attempt += 1
+        else:
+            print(f"Download of {filename} kept restarting, giving up")
+            return None
+
+    valid = await async_computation.run_in_executor(async_computation.CPU_EXECUTOR, verify_etag, part_path,
+                                                    entry.get('etag'))
+    if not valid:
+        os.remove(part_path)
+        manifest.remove(dl_path)
+        raise resilience.LeonardoError(f"Download of {filename} is corrupted")
+
+    os.replace(part_path, dl_path)
+    manifest.remove(dl_path)
+    await async_computation.run_in_executor(async_computation.IO_EXECUTOR, cache.store, generation_id, map_type, url,
+                                            dl_path, entry.get('etag'))
+
+    report()
+    print(f"Done downloading {filename}")
+    return dl_path
+
+
+async def download_placeholders(images, path, on_map_ready, manifest_path=None):
+    """Downloads the low resolution placeholders the server provides, calling on_map_ready for each."""
+    placeholder_path = os.path.join(path, PLACEHOLDER_DIRECTORY)
+
+    async def download(image):
+        dl_path = await download_file(image[PLACEHOLDER_URL_KEY], placeholder_path, manifest_path=manifest_path)
+        map_type = get_texture_map_type(os.path.basename(image['url']))
+        if dl_path is not None and map_type is not None:
+            on_map_ready(map_type, dl_path)
+
+    images = [image for image in images if image.get(PLACEHOLDER_URL_KEY)]
+    if images:
+        os.makedirs(placeholder_path, exist_ok=True)
+        await asyncio.gather(*(download(image) for image in images))
+
+
+async def download_texture_images(images, path, generation_id=None, on_progress=None, on_map_ready=None,
+                                  placeholders=False, manifest_path=None):
+    """Downloads all texture maps of a generation concurrently, the albedo first.
+
+    :param on_map_ready: called with (map type, file path) as soon as each map has landed.
+    :param placeholders: first download the low resolution placeholders of the maps
+        that have one and pass them to on_map_ready.
+    :param manifest_path: where incomplete downloads are tracked, see download_file().
+    :return: dict mapping the texture map type to the downloaded file path.
+    """
+    max_parallel_downloads = bpy.context.preferences.addons[__package__].preferences.max_parallel_downloads
+    semaphore = asyncio.Semaphore(max_parallel_downloads)
+    progress = {}
+    images = sorted(images, key=get_map_priority)
+
+    if placeholders and on_map_ready is not None:
+        await download_placeholders(images, path, on_map_ready, manifest_path)
+
+    async def download(image):
+        async with semaphore:
+            dl_path = await download_file(image['url'], path, progress, generation_id, on_progress, manifest_path)
+        map_type = get_texture_map_type(os.path.basename(dl_path)) if dl_path else None
+        if map_type is not None and on_map_ready is not None:
+            on_map_ready(map_type, dl_path)
+        return dl_path
+
+    dl_paths = await asyncio.gather(*(download(image) for image in images))
+
+    texture_paths = {}
+    for dl_path in dl_paths:
+        map_type = get_texture_map_type(os.path.basename(dl_path)) if dl_path else None
+        if map_type is not None:
+            texture_paths[map_type] = dl_path
+    return texture_paths
@@ -0,0 +1,122 @@
+"""Timing spans and counters of the generation pipeline.
+
+Spans time one step (export, presign, upload, submit, poll, download,
+material assignment) and are attributed to a job, so a per-job timeline shows
+how much time is spent on the client and how much waiting for the server. That
+wait is recorded as 'generation_wait': the time from submitting (or resuming)
+a job until a poll sees it complete. The server does not report its own
+timings, so this is its queue and generation time plus up to one poll interval.
+Every span is logged, added to per-step totals for the stats panel and, once a
+trace directory is set, appended to a JSON lines trace file. This module does
+not depend on bpy.
+"""
+
+import collections
+import contextlib
+import json
+import logging
+import os
+import time
+
+log = logging.getLogger(__name__)
+
+TRACE_FILENAME = 'trace.jsonl'
+
+# Number of jobs whose timelines are kept in memory.
+MAX_TIMELINES = 20
+
+counters = collections.Counter()
+
+# Step name -> [number of spans, total seconds].
+_totals = {}
+_timelines = collections.OrderedDict()
+_trace_path = None
+
+
+class Span:
+
+    def __init__(self, name, job=None, **fields):
+        self.name = name
+        self.job = job
+        self.fields = fields
+        self.started = time.time()
+        self.duration = 0.0
+
+
+def set_trace_directory(path):
+    """Appends spans to the trace file in path from now on; None stops tracing."""
+    global _trace_path
+    _trace_path = os.path.join(path, TRACE_FILENAME) if path else None
+
+
+def _write_trace(event):
+    if _trace_path is None:
+        return
+    try:
+        with open(_trace_path, 'a') as writer:
+            writer.write(json.dumps(event, default=str) + "\n")
+    except OSError as ex:
+        log.warning("Could not write to trace file %s: %s", _trace_path, ex)
+
+
+def record(name, duration, job=None, started=None, **fields):
+    """Records a step that took duration seconds."""
+    started = time.time() - duration if started is None else started
+    event = {'name': name, 'start': round(started, 3), 'duration': round(duration, 4)}
+    if job:
+        event['job'] = job
+    event.update(fields)
+
+    totals = _totals.setdefault(name, [0, 0.0])
+    totals[0] += 1
+    totals[1] += duration
+
+    if job:
+        timeline = _timelines.pop(job, [])
+        timeline.append(event)
+        _timelines[job] = timeline
+        while len(_timelines) > MAX_TIMELINES:
+            _timelines.popitem(last=False)
+
+    log.debug("%s%s took %.3fs %s", name, f" [{job}]" if job else "", duration, fields or "")
+    _write_trace(event)
+
+
+@contextlib.contextmanager
+def span(name, job=None, **fields):
+    """Times the body of the with statement. The yielded Span's job and fields can still be changed inside."""
+    current = Span(name, job, **fields)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as ex:
+        current.fields['error'] = type(ex).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        record(name, current.duration, current.job, current.started, **current.fields)
+
+
+def count(name, value=1):
+    counters[name] += value
+
+
+def timeline(job):
+    """Returns the events of job in the order they finished."""
+    return list(_timelines.get(job, ()))
+
+
+def last_job():
+    return next(reversed(_timelines), None)
+
+
+def stats():
+    """Returns [(step name, count, total seconds, mean seconds)], slowest total first."""
+    rows = [(name, number, total, total / number) for name, (number, total) in _totals.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def reset():
+    counters.clear()
+    _totals.clear()
+    _timelines.clear()
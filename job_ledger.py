@@ -0,0 +1,169 @@
+"""Local ledger of submitted texture generations.
+
+Generations are paid for when they are submitted, but what keeps track of them
+(Scene.job_id, the job queue) lives in the blend file and in memory. When
+Blender crashes or the file is closed mid-generation, the result would only be
+available on the web app. Every submission is therefore appended to a JSON lines
+file in the user config directory, with what is needed to pick the job up again:
+its parameters, the blend file and objects it belongs to and the folder
+its maps go to. Finishing a job appends another line for it; the lines of a job
+are merged in order. Jobs that never finished are handed back to the job queue
+when their blend file is loaded again, which polls them without submitting them
+again. Jobs of files that were never saved are not resumed.
+
+Several Blender instances may append to the ledger at the same time. It is only
+rewritten to drop old finished jobs once it has grown long, keeping the lines
+other instances appended while it was being rewritten.
+"""
+
+import json
+import logging
+import os
+import time
+
+import bpy
+
+log = logging.getLogger(__name__)
+
+LEDGER_FILENAME = "jobs.jsonl"
+
+FINISHED_STATUSES = {'COMPLETE', 'FAILED', 'CANCELLED'}
+
+# Result folders may contain this placeholder, the seed is only known once the job completes.
+SEED_PLACEHOLDER = "{seed}"
+
+# Number of lines after which the ledger is compacted.
+COMPACT_LINES = 1000
+# Seconds finished jobs are kept in the ledger when it is compacted.
+FINISHED_RETENTION = 30 * 24 * 3600
+
+# Ids of the jobs this session submitted or resumed, which must not be resumed again.
+_attached = set()
+
+
+def get_ledger_path():
+    return os.path.join(bpy.utils.user_resource('CONFIG', path="leonardo"), LEDGER_FILENAME)
+
+
+def resolve_result_dir(result_dir, seed):
+    return result_dir.replace(SEED_PLACEHOLDER, str(seed))
+
+
+def _append(entry):
+    entry['time'] = round(time.time(), 3)
+    path = get_ledger_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as writer:
+            writer.write(json.dumps(entry) + "\n")
+    except OSError as ex:
+        log.warning("Could not write to job ledger %s: %s", path, ex)
+
+
+def record_submitted(job_id, params, result_dir, object_names=(), preview=False, apply_textures=True):
+    """Records a submitted job.
+
+    :param result_dir: absolute folder the maps are downloaded to, may contain SEED_PLACEHOLDER.
+    """
+    _attached.add(job_id)
+    _append({
+        'job_id': job_id,
+        'status': 'RUNNING',
+        'submitted': round(time.time(), 3),
+        'params': params,
+        'blend_file': bpy.data.filepath,
+        'object_names': list(object_names),
+        'result_dir': result_dir,
+        'preview': preview,
+        'apply_textures': apply_textures,
+    })
+
+
+def record_finished(job_id, status, result_path=None):
+    """Records that a job completed, failed or was cancelled, so it is not resumed anymore."""
+    _append({'job_id': job_id, 'status': status, 'result_path': result_path})
+
+
+def load():
+    """Returns {job id: merged entry} of every job in the ledger, oldest first."""
+    path = get_ledger_path()
+    jobs = {}
+    lines = 0
+    # Bytes up to the end of the last complete line read.
+    end = 0
+    try:
+        with open(path, 'rb') as reader:
+            for line in reader:
+                if not line.endswith(b"\n"):
+                    # Another instance is still writing this line.
+                    break
+                lines += 1
+                end += len(line)
+                try:
+                    entry = json.loads(line)
+                    jobs.setdefault(entry['job_id'], {}).update(entry)
+                except (ValueError, KeyError, TypeError):
+                    # A line may have been cut off by a crash while it was written.
+                    log.warning("Skipping unreadable line %i of job ledger %s", lines, path)
+    except FileNotFoundError:
+        return jobs
+    except OSError as ex:
+        log.warning("Could not read job ledger %s: %s", path, ex)
+        return jobs
+
+    if lines > COMPACT_LINES:
+        jobs = compact(jobs, end)
+    return jobs
+
+
+def compact(jobs, end):
+    """Rewrites the ledger with one line per job, dropping jobs that finished long ago.
+
+    :param jobs: the jobs read from the first end bytes of the ledger. Lines
+        appended after them are copied over as they are.
+    """
+    expired = time.time() - FINISHED_RETENTION
+    jobs = {job_id: entry for job_id, entry in jobs.items()
+            if entry.get('status') not in FINISHED_STATUSES or entry.get('time', 0) > expired}
+    path = get_ledger_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as writer:
+            for entry in jobs.values():
+                writer.write((json.dumps(entry) + "\n").encode())
+            # Right before replacing the ledger, so jobs other instances submitted in the meantime are kept.
+            with open(path, 'rb') as reader:
+                reader.seek(end)
+                writer.write(reader.read())
+        os.replace(tmp_path, path)
+    except OSError as ex:
+        log.warning("Could not compact job ledger %s: %s", path, ex)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return jobs
+
+
+def get_unfinished_jobs(blend_file):
+    """Returns the entries of the jobs of blend_file that never finished and no job of this session tracks."""
+    if not blend_file:
+        # Jobs of unsaved files cannot be told apart from those of other sessions, e.g. another running
+        # Blender instance, and their objects from the same-named ones of the startup file.
+        return []
+    return [entry for job_id, entry in load().items()
+            if entry.get('status') not in FINISHED_STATUSES and entry.get('blend_file') == blend_file
+            and job_id not in _attached]
+
+
+def find_unfinished_job(params, blend_file):
+    """Returns the entry of an unfinished job of blend_file submitted with params, or None."""
+    for entry in get_unfinished_jobs(blend_file):
+        if entry.get('params') == params:
+            return entry
+    return None
+
+
+def attach(job_id):
+    """Marks a job from the ledger as tracked by this session."""
+    _attached.add(job_id)
@@ -0,0 +1,378 @@
+"""Queue of texture generation jobs running concurrently on the server.
+
+Jobs are stored in Scene.leonardo_jobs. A single poller task walks the jobs of
+all scenes, submits queued jobs while fewer than the configured number are in
+flight, checks the status of all running jobs that are due on each tick, and downloads and applies each result as
+soon as its job completes. Submitted jobs are recorded in the job ledger, jobs
+it still lists as unfinished after a crash are put back into the queue with
+resume_job().
+
+Collection items can be reallocated whenever jobs are added or removed, so no
+LeonardoJob reference is held across an await; jobs are looked up again by key.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+import bpy
+
+from . import api_client
+from . import async_computation
+from . import downloads
+from . import instrumentation
+from . import job_ledger
+from . import materials
+from . import polling
+from . import resilience
+from . import texture_processing
+
+log = logging.getLogger(__name__)
+
+JOB_STATUS_ITEMS = [
+    ('QUEUED', 'Queued', 'Waiting for a free slot to be submitted'),
+    ('RUNNING', 'Running', 'Generating on the server'),
+    ('DOWNLOADING', 'Downloading', 'Downloading the texture maps'),
+    ('COMPLETE', 'Complete', 'Texture maps downloaded'),
+    ('FAILED', 'Failed', 'Submission or generation failed'),
+    ('CANCELLED', 'Cancelled', 'No longer listening for updates'),
+]
+
+IN_FLIGHT_STATUSES = {'RUNNING', 'DOWNLOADING'}
+ACTIVE_STATUSES = {'QUEUED'} | IN_FLIGHT_STATUSES
+
+_queue_task = None
+_schedulers = {}
+_next_poll = {}
+# Tasks downloading the results of completed jobs, by job key.
+_finishing_tasks = {}
+
+
+class LeonardoJob(bpy.types.PropertyGroup):
+    key: bpy.props.StringProperty(name="Key", description="Local identifier of the job")
+    job_id: bpy.props.StringProperty(name="Job Id", description="Id of the generation job on the server")
+    mesh_id: bpy.props.StringProperty(name="Mesh Id")
+    params: bpy.props.StringProperty(name="Parameters", description="Generation parameters as json")
+    object_names: bpy.props.StringProperty(name="Objects", description="Names of the objects to texture as json")
+    status: bpy.props.EnumProperty(name="Status", items=JOB_STATUS_ITEMS, default='QUEUED')
+    status_label: bpy.props.StringProperty(name="Status Label")
+    preview: bpy.props.BoolProperty(name="Preview", default=False)
+    apply_textures: bpy.props.BoolProperty(name="Apply Textures", default=True)
+    subfolder: bpy.props.StringProperty(name="Subfolder", description="Result folder relative to the result path, {seed} is replaced by the seed. Defaults to <prompt>/{seed}")
+    result_path: bpy.props.StringProperty(name="Result Path")
+    seed: bpy.props.StringProperty(name="Seed")
+    sweep_id: bpy.props.StringProperty(name="Sweep Id", description="Id of the sweep this job is a variant of")
+
+    @property
+    def prompt(self):
+        return json.loads(self.params).get('prompt', "")
+
+
+def get_job(scene_name, key):
+    scene = bpy.data.scenes.get(scene_name)
+    if scene is None:
+        return None
+    for job in scene.leonardo_jobs:
+        if job.key == key:
+            return job
+    return None
+
+
+def enqueue_job(scene, params, object_names, preview=False, apply_textures=True, subfolder="", sweep_id=""):
+    job = scene.leonardo_jobs.add()
+    job.key = uuid.uuid4().hex
+    job.params = json.dumps(params)
+    job.mesh_id = params.get('modelAssetId', "")
+    job.object_names = json.dumps(list(object_names))
+    job.preview = preview
+    job.apply_textures = apply_textures
+    job.subfolder = subfolder
+    job.sweep_id = sweep_id
+    job.status_label = "Queued"
+    return job
+
+
+def ensure_queue_running():
+    global _queue_task
+
+    if _queue_task is None or _queue_task.done():
+        _queue_task = async_computation.create_task(process_queue())
+    async_computation.ensure_async_loop()
+
+
+def stop_queue():
+    global _queue_task
+
+    for task in list(_finishing_tasks.values()):
+        task.cancel()
+    if _queue_task is not None:
+        _queue_task.cancel()
+        _queue_task = None
+
+
+def get_max_jobs_in_flight():
+    return bpy.context.preferences.addons[__package__].preferences.max_jobs_in_flight
+
+
+def get_job_objects(job):
+    objects = [bpy.data.objects.get(name) for name in json.loads(job.object_names)]
+    return [obj for obj in objects if obj is not None]
+
+
+async def submit_job(scene_name, key):
+    job = get_job(scene_name, key)
+    params = json.loads(job.params)
+    job.status = 'RUNNING'
+    job.status_label = "Submitting"
+
+    try:
+        with instrumentation.span('submit', queue_key=key) as submit_span:
+            response = await api_client.post_texture_generation(params)
+            job_id = resilience.get_json(response, "Submission", 'textureGenerationJob', 'id')
+            submit_span.job = job_id
+    except resilience.LeonardoError as ex:
+        print(f"Job {key}: {ex}")
+        job = get_job(scene_name, key)
+        if job is not None:
+            set_job_finished(scene_name, job, 'FAILED', str(ex))
+        return
+    except Exception as ex:
+        log.exception("Submitting job %s failed", key)
+        job = get_job(scene_name, key)
+        if job is not None:
+            set_job_finished(scene_name, job, 'FAILED', f"Submission failed: {ex}")
+        return
+
+    job = get_job(scene_name, key)
+    if job is None:
+        return
+
+    job.job_id = job_id
+    job.status_label = "Generating"
+    print(f"Job ID: {job.job_id}")
+    job_ledger.record_submitted(job_id, params, get_result_folder(bpy.data.scenes[scene_name], job),
+                                json.loads(job.object_names), preview=job.preview, apply_textures=job.apply_textures)
+
+    _schedulers[key] = polling.PollScheduler(polling.PREVIEW_PROFILE if job.preview else polling.FULL_PROFILE)
+    _next_poll[key] = time.monotonic() + _schedulers[key].next_interval()
+
+
+async def poll_job(scene_name, key):
+    job = get_job(scene_name, key)
+    scheduler = _schedulers[key]
+    if scheduler.timed_out():
+        set_job_finished(scene_name, job, 'FAILED', "Timed out")
+        return
+
+    scheduler.polls += 1
+    instrumentation.count('polls')
+    response = None
+    try:
+        with instrumentation.span('poll', job.job_id) as poll_span:
+            response = await api_client.get_texture_generation(job.job_id)
+            generation = api_client.parse_texture_generation(response)
+            poll_span.fields['status'] = generation.get('status')
+    except resilience.LeonardoError as ex:
+        job = get_job(scene_name, key)
+        if job is None or job.status != 'RUNNING':
+            return
+        if not ex.retryable:
+            set_job_finished(scene_name, job, 'FAILED', str(ex))
+            return
+        print(f"Job {job.job_id}: {ex}, retrying")
+        job.status_label = f"{ex}, retrying"
+        _next_poll[key] = time.monotonic() + scheduler.next_interval(response.headers if response else None)
+        return
+    except Exception:
+        log.exception("Checking status of job %s failed, retrying", key)
+        _next_poll[key] = time.monotonic() + scheduler.next_interval()
+        return
+
+    job = get_job(scene_name, key)
+    if job is None or job.status != 'RUNNING':
+        return
+
+    _next_poll[key] = time.monotonic() + scheduler.next_interval(response.headers)
+    job.status_label = "Generating"
+    status = generation.get('status')
+    if status == 'COMPLETE':
+        instrumentation.record('generation_wait', scheduler.elapsed, job.job_id, polls=scheduler.polls)
+        job.status = 'DOWNLOADING'
+        task = async_computation.create_task(finish_job(scene_name, key, generation))
+        _finishing_tasks[key] = task
+        task.add_done_callback(lambda _: _finishing_tasks.pop(key, None))
+    elif status == 'FAILED':
+        set_job_finished(scene_name, job, 'FAILED', "Generation failed")
+
+
+def get_sweep_dir(scene, sweep_id):
+    return os.path.join(scene.result_path, f"sweep_{sweep_id}")
+
+
+def write_sweep_summary(scene, sweep_id):
+    """Writes the state of every variant of a sweep to summary.json in its folder."""
+    variants = []
+    for job in scene.leonardo_jobs:
+        if job.sweep_id != sweep_id:
+            continue
+        params = json.loads(job.params)
+        variants.append({
+            'prompt': params.get('prompt'),
+            'seed': job.seed or params.get('seed'),
+            'sd_version': params.get('sd_version'),
+            'front_rotation_offset': params.get('front_rotation_offset'),
+            'job_id': job.job_id,
+            'status': job.status,
+            'result_path': job.result_path,
+        })
+
+    path = get_sweep_dir(scene, sweep_id)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "summary.json"), 'w') as writer:
+        json.dump({'sweep_id': sweep_id, 'variants': variants}, writer, indent=2)
+
+
+def set_job_finished(scene_name, job, status, status_label, keep_in_ledger=False):
+    """Finishes job. Jobs kept in the ledger are resumed the next time the file is loaded."""
+    job.status = status
+    job.status_label = status_label
+    if job.job_id and not keep_in_ledger:
+        job_ledger.record_finished(job.job_id, status, job.result_path or None)
+    if job.sweep_id:
+        write_sweep_summary(bpy.data.scenes[scene_name], job.sweep_id)
+
+
+def get_result_folder(scene, job):
+    """Returns the result folder of job, which contains the seed placeholder unless the job has a subfolder."""
+    return os.path.join(scene.result_path, job.subfolder or os.path.join(job.prompt, job_ledger.SEED_PLACEHOLDER))
+
+
+def get_result_dir(scene, job, seed):
+    path = job_ledger.resolve_result_dir(get_result_folder(scene, job), seed)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def interrupt_orphaned_jobs():
+    """Marks in-flight jobs nothing polls or downloads anymore, e.g. jobs of a file saved mid-generation, as cancelled.
+
+    Otherwise they would take up in-flight slots forever. The unfinished ones among
+    them are resumed from the job ledger afterwards.
+    """
+    for scene in bpy.data.scenes:
+        for job in scene.leonardo_jobs:
+            if job.status in IN_FLIGHT_STATUSES and job.key not in _schedulers and job.key not in _finishing_tasks:
+                job.status = 'CANCELLED'
+                job.status_label = "Interrupted"
+
+
+def resume_job(scene, entry):
+    """Puts an unfinished job of the job ledger back into the queue of scene, to be polled without submitting it again."""
+    job = next((job for job in scene.leonardo_jobs if job.job_id == entry['job_id']), None)
+    if job is None:
+        # The ledger keeps absolute result folders, which os.path.join() leaves as they are.
+        job = enqueue_job(scene, entry['params'], entry['object_names'], preview=entry['preview'],
+                          apply_textures=entry['apply_textures'], subfolder=entry['result_dir'])
+        job.job_id = entry['job_id']
+    job.status = 'RUNNING'
+    job.status_label = "Resumed"
+    job_ledger.attach(job.job_id)
+
+    # The job may have completed long ago, so it is polled right away.
+    _schedulers[job.key] = polling.PollScheduler(polling.PREVIEW_PROFILE if job.preview else polling.FULL_PROFILE)
+    _next_poll[job.key] = time.monotonic()
+    return job
+
+
+async def finish_job(scene_name, key, generation):
+    """Downloads the results of a completed job and applies them to its objects."""
+    scene = bpy.data.scenes.get(scene_name)
+    job = get_job(scene_name, key)
+    seed = generation.get('seed')
+    result_path = get_result_dir(scene, job, seed)
+    job_id = job.job_id
+
+    def on_progress(text):
+        progress_job = get_job(scene_name, key)
+        if progress_job is not None:
+            progress_job.status_label = text
+
+    def on_map_ready(map_type, path):
+        ready_job = get_job(scene_name, key)
+        if ready_job is not None and ready_job.status != 'CANCELLED':
+            materials.apply_texture_maps(get_job_objects(ready_job), {map_type: path}, job_id, partial=True)
+
+    progressive = job.apply_textures and bpy.context.preferences.addons[__package__].preferences.progressive_textures
+    try:
+        with instrumentation.span('download_all', job_id):
+            texture_paths = await downloads.download_texture_images(generation.get('model_asset_texture_images'),
+                                                                    result_path, job_id, on_progress=on_progress,
+                                                                    on_map_ready=on_map_ready if progressive else None,
+                                                                    placeholders=job.preview,
+                                                                    manifest_path=os.path.join(scene.result_path, downloads.MANIFEST_FILENAME))
+    except Exception as ex:
+        log.exception("Downloading results of job %s failed", job_id)
+        job = get_job(scene_name, key)
+        if job is not None:
+            # The generation is paid for, so its download is retried the next time the file is loaded.
+            set_job_finished(scene_name, job, 'FAILED', f"Download failed: {ex}", keep_in_ledger=True)
+        return
+
+    job = get_job(scene_name, key)
+    if job is None or job.status == 'CANCELLED':
+        return
+    job.result_path = result_path
+    job.seed = str(seed)
+
+    if job.apply_textures:
+        viewport_paths = {}
+        try:
+            with instrumentation.span('post_process', job_id):
+                texture_paths, viewport_paths = await texture_processing.prepare_texture_maps(texture_paths)
+        except Exception:
+            log.exception("Post-processing the maps of job %s failed, using them as downloaded", job_id)
+        job = get_job(scene_name, key)
+        if job is None or job.status == 'CANCELLED':
+            return
+        materials.apply_texture_maps(get_job_objects(job), texture_paths, job_id, viewport_paths=viewport_paths,
+                                     use_viewport=texture_processing.use_viewport_textures(bpy.data.scenes[scene_name]))
+
+    set_job_finished(scene_name, job, 'COMPLETE', "Done")
+
+
+def get_all_jobs():
+    """Returns (scene name, key, status) of the jobs of every scene."""
+    return [(scene.name, job.key, job.status) for scene in bpy.data.scenes for job in scene.leonardo_jobs]
+
+
+async def process_queue():
+    """Shared poller driving the jobs of all scenes until none is active anymore."""
+    log.debug("Starting job queue")
+    while True:
+        jobs = get_all_jobs()
+        if not any(status in ACTIVE_STATUSES for _, _, status in jobs):
+            log.debug("No more active jobs, stopping job queue")
+            return
+
+        in_flight = sum(1 for _, _, status in jobs if status in IN_FLIGHT_STATUSES)
+        queued = [(scene_name, key) for scene_name, key, status in jobs if status == 'QUEUED']
+        free_slots = max(0, get_max_jobs_in_flight() - in_flight)
+        await asyncio.gather(*(submit_job(scene_name, key) for scene_name, key in queued[:free_slots]))
+
+        now = time.monotonic()
+        due = [(scene_name, key) for scene_name, key, status in get_all_jobs()
+               if status == 'RUNNING' and key in _next_poll and _next_poll[key] <= now]
+        await asyncio.gather(*(poll_job(scene_name, key) for scene_name, key in due))
+
+        # Forget scheduling state of jobs that finished, were cancelled or removed.
+        running = {key for _, key, status in get_all_jobs() if status == 'RUNNING'}
+        for key in list(_next_poll):
+            if key not in running:
+                _next_poll.pop(key, None)
+                _schedulers.pop(key, None)
+
+        next_due = min(_next_poll.values(), default=now + polling.STOP_CHECK_INTERVAL)
+        await asyncio.sleep(max(0.0, min(next_due - time.monotonic(), polling.STOP_CHECK_INTERVAL)))
@@ -0,0 +1,239 @@
+"""Assigns downloaded texture maps to the materials of textured objects."""
+
+import os
+
+import bpy
+
+from . import instrumentation
+from . import selection_index
+from . import texture_processing
+
+# Custom property marking images created by the add-on. Its value is the texture map type.
+LEONARDO_IMAGE_KEY = 'leonardo_map'
+
+# Custom properties of the template materials: the Leonardo mesh id they belong
+# to, and the generation whose maps they currently show.
+LEONARDO_MATERIAL_KEY = 'leonardo_material'
+LEONARDO_GENERATION_KEY = 'leonardo_generation'
+
+# Custom properties of images with a lower resolution viewport variant: the full
+# resolution file and the variant file. The image is loaded from one of them.
+FULL_PATH_KEY = 'leonardo_full_path'
+VIEWPORT_PATH_KEY = 'leonardo_viewport_path'
+
+# Name of the image texture node of every texture map type in the template material.
+MAP_NODES = {
+    'albedo': 'Albedo',
+    'normal': 'NormalMap',
+    'roughness': 'Roughness',
+    'displacement': 'Displacement',
+    texture_processing.PACKED_MAP: 'RoughnessDisplacement',
+}
+
+# Maps that hold data rather than colors.
+NON_COLOR_MAPS = {'normal', 'roughness', 'displacement', texture_processing.PACKED_MAP}
+
+NODE_SPACING = 300
+
+
+def find_loaded_image(path):
+    """Returns the Leonardo image already loaded from path, or None."""
+    path = os.path.normpath(os.path.abspath(path))
+    for image in bpy.data.images:
+        if LEONARDO_IMAGE_KEY not in image:
+            continue
+        if os.path.normpath(bpy.path.abspath(image.get(FULL_PATH_KEY, image.filepath))) == path:
+            return image
+    return None
+
+
+def get_replaceable_image(mat, node_name):
+    """Returns the Leonardo image shown by node_name in mat, if nothing else uses it.
+
+    Such an image can be reloaded in place with the maps of a newer generation
+    instead of creating another datablock.
+    """
+    node = mat.node_tree.nodes.get(node_name) if mat.node_tree else None
+    image = getattr(node, 'image', None)
+    if image is None or LEONARDO_IMAGE_KEY not in image:
+        return None
+    return image if image.users - int(image.use_fake_user) == 1 else None
+
+
+def load_texture_image(path, map_type, replaceable=None, viewport_path=None, use_viewport=False):
+    """Returns an image for path, loading the file at most once.
+
+    :param viewport_path: lower resolution variant of path, loaded instead when use_viewport is set.
+    """
+    load_path = viewport_path if use_viewport and viewport_path else path
+    image = find_loaded_image(path)
+    if image is None and replaceable is not None:
+        print(f"Reloading {replaceable.name} from {load_path}")
+        image = replaceable
+        image.name = os.path.basename(path)
+    elif image is None:
+        image_count = len(bpy.data.images)
+        image = bpy.data.images.load(load_path, check_existing=True)
+        if len(bpy.data.images) == image_count:
+            return image
+        # Only images the add-on created are reloaded and cleaned up later, never ones the user loaded.
+        image[LEONARDO_IMAGE_KEY] = map_type
+        if map_type in NON_COLOR_MAPS:
+            image.colorspace_settings.name = 'Non-Color'
+
+    image[FULL_PATH_KEY] = path
+    if viewport_path:
+        image[VIEWPORT_PATH_KEY] = viewport_path
+    elif VIEWPORT_PATH_KEY in image:
+        del image[VIEWPORT_PATH_KEY]
+    if os.path.normpath(bpy.path.abspath(image.filepath)) != os.path.normpath(load_path):
+        image.filepath = load_path
+        image.reload()
+    return image
+
+
+def set_texture_resolution(use_viewport):
+    """Switches every Leonardo image between its viewport variant and the full resolution map."""
+    for image in bpy.data.images:
+        if LEONARDO_IMAGE_KEY not in image or VIEWPORT_PATH_KEY not in image:
+            continue
+        path = image[VIEWPORT_PATH_KEY] if use_viewport else image.get(FULL_PATH_KEY, image.filepath)
+        if os.path.normpath(bpy.path.abspath(image.filepath)) != os.path.normpath(path):
+            image.filepath = path
+            image.reload()
+
+
+def remove_orphan_images():
+    """Removes Leonardo images that are not used anymore, so memory stays flat across generations."""
+    orphans = [image for image in bpy.data.images
+               if LEONARDO_IMAGE_KEY in image and image.users == 0]
+    for image in orphans:
+        bpy.data.images.remove(image)
+    return len(orphans)
+
+
+def get_template_material(leonardo_id):
+    """Returns the Leonardo material of leonardo_id, creating it if needed."""
+    for mat in bpy.data.materials:
+        if mat.get(LEONARDO_MATERIAL_KEY) == leonardo_id:
+            return mat
+
+    mat = bpy.data.materials.new(name=f"Leonardo {leonardo_id[:8]}" if leonardo_id else "Leonardo")
+    mat[LEONARDO_MATERIAL_KEY] = leonardo_id
+    mat.use_nodes = True
+    return mat
+
+
+def get_node(nodes, name, node_type, location):
+    node = nodes.get(name)
+    if node is None or node.bl_idname != node_type:
+        if node is not None:
+            nodes.remove(node)
+        node = nodes.new(type=node_type)
+        node.name = name
+        node.label = name
+        node.location = location
+    return node
+
+
+def update_template_material(mat, images, partial=False):
+    """Builds the node tree of mat for the given {map_type: image}, reusing existing nodes.
+
+    Albedo feeds the base color, the normal map goes through a Normal Map node,
+    roughness feeds the roughness and displacement a Displacement node on the output.
+    Nodes of maps that are not part of images are removed, unless partial is set.
+    """
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
+
+    output = get_node(nodes, "Material Output", 'ShaderNodeOutputMaterial', (NODE_SPACING, 0))
+    bsdf = get_node(nodes, "Principled BSDF", 'ShaderNodeBsdfPrincipled', (0, 0))
+    links.new(output.inputs['Surface'], bsdf.outputs['BSDF'])
+
+    for row, (map_type, node_name) in enumerate(MAP_NODES.items()):
+        converter_name = node_name + " Converter"
+        if map_type not in images:
+            if partial:
+                continue
+            for name in (node_name, converter_name, node_name + " Height"):
+                if nodes.get(name) is not None:
+                    nodes.remove(nodes[name])
+            continue
+
+        location = (-2 * NODE_SPACING, -row * NODE_SPACING)
+        texture = get_node(nodes, node_name, 'ShaderNodeTexImage', location)
+        texture.image = images[map_type]
+        if map_type == 'albedo':
+            links.new(bsdf.inputs['Base Color'], texture.outputs['Color'])
+        elif map_type == 'roughness':
+            links.new(bsdf.inputs['Roughness'], texture.outputs['Color'])
+        elif map_type == 'normal':
+            converter = get_node(nodes, converter_name, 'ShaderNodeNormalMap', (-NODE_SPACING, location[1]))
+            links.new(converter.inputs['Color'], texture.outputs['Color'])
+            links.new(bsdf.inputs['Normal'], converter.outputs['Normal'])
+        elif map_type == 'displacement':
+            converter = get_node(nodes, converter_name, 'ShaderNodeDisplacement', (0, location[1]))
+            links.new(converter.inputs['Height'], texture.outputs['Color'])
+            links.new(output.inputs['Displacement'], converter.outputs['Displacement'])
+        elif map_type == texture_processing.PACKED_MAP:
+            # Roughness is packed into the red and displacement into the green channel.
+            separate_type = 'ShaderNodeSeparateColor' if hasattr(bpy.types, 'ShaderNodeSeparateColor') else 'ShaderNodeSeparateRGB'
+            separate = get_node(nodes, converter_name, separate_type, (-NODE_SPACING, location[1]))
+            displacement = get_node(nodes, node_name + " Height", 'ShaderNodeDisplacement', (0, location[1]))
+            links.new(separate.inputs[0], texture.outputs['Color'])
+            links.new(bsdf.inputs['Roughness'], separate.outputs[0])
+            links.new(displacement.inputs['Height'], separate.outputs[1])
+            links.new(output.inputs['Displacement'], displacement.outputs['Displacement'])
+
+
+def assign_material(mesh, mat):
+    """Puts mat into the first material slot of mesh."""
+    if not mesh.materials:
+        mesh.materials.append(mat)
+    elif mesh.materials[0] != mat:
+        mesh.materials[0] = mat
+
+
+def apply_texture_maps(objects, texture_paths, generation_id=None, partial=False, viewport_paths=None,
+                       use_viewport=False):
+    """Assigns the texture maps to objects through one shared material per Leonardo mesh id.
+
+    The material of an id is built or updated once, then assigned by reference to
+    the meshes of all objects sharing the id. Each map is loaded once, no matter
+    how many objects it is applied to.
+
+    :param texture_paths: dict mapping the texture map type (albedo, normal,
+        roughness, displacement) to an image file path.
+    :param partial: only texture_paths arrived so far; keep the other maps of the material.
+    :param viewport_paths: lower resolution variants of texture_paths, shown instead when use_viewport is set.
+    """
+    with instrumentation.span('assign_materials', generation_id, maps=sorted(texture_paths), partial=partial):
+        meshes_by_id = {}
+        for obj in objects:
+            if obj.type == 'MESH':
+                meshes = meshes_by_id.setdefault(selection_index.get_leonardo_id(obj) or "", [])
+                if obj.data not in meshes:
+                    meshes.append(obj.data)
+
+        for leonardo_id, meshes in meshes_by_id.items():
+            mat = get_template_material(leonardo_id)
+            print(f"Assigning {', '.join(texture_paths)} to {mat.name} ({len(meshes)} meshes)")
+
+            images = {}
+            for map_type, node_name in MAP_NODES.items():
+                if map_type in texture_paths:
+                    replaceable = get_replaceable_image(mat, node_name)
+                    images[map_type] = load_texture_image(texture_paths[map_type], map_type, replaceable,
+                                                          (viewport_paths or {}).get(map_type), use_viewport)
+
+            update_template_material(mat, images, partial)
+            if generation_id:
+                mat[LEONARDO_GENERATION_KEY] = generation_id
+
+            for mesh in meshes:
+                assign_material(mesh, mat)
+
+        removed = remove_orphan_images()
+        if removed:
+            print(f"Removed {removed} unused texture images")
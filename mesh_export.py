@@ -0,0 +1,79 @@
+"""Reads evaluated mesh data into NumPy arrays and exports the selection as OBJ."""
+
+import bpy
+import numpy as np
+
+from . import obj_writer
+
+# Blender is Z-up, while the OBJ files sent to Leonardo are Y-up (the defaults of
+# Blender's OBJ exporter: forward -Z, up Y).
+AXIS_CONVERSION = np.array([
+    [1, 0, 0, 0],
+    [0, 0, 1, 0],
+    [0, -1, 0, 0],
+    [0, 0, 0, 1],
+], dtype=np.float64)
+
+EXPORTABLE_TYPES = {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}
+
+
+def read_mesh_arrays(mesh):
+    """Reads positions, face corners and active UVs of mesh with foreach_get.
+
+    :return: (positions (V, 3), loop_totals (P,), loop_vertex_indices (L,), loop_uvs (L, 2) or None)
+    """
+    positions = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', positions)
+
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+
+    loop_vertex_indices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_vertex_indices)
+
+    loop_uvs = None
+    if mesh.uv_layers.active is not None:
+        loop_uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+        mesh.uv_layers.active.data.foreach_get('uv', loop_uvs)
+        loop_uvs = loop_uvs.reshape(-1, 2)
+
+    return positions.reshape(-1, 3), loop_totals, loop_vertex_indices, loop_uvs
+
+
+def read_evaluated_mesh_arrays(obj, depsgraph):
+    """Like read_mesh_arrays, for the object with its modifiers applied. Returns None for objects without geometry."""
+    evaluated = obj.evaluated_get(depsgraph)
+    mesh = evaluated.to_mesh()
+    if mesh is None:
+        return None
+    try:
+        return read_mesh_arrays(mesh)
+    finally:
+        evaluated.to_mesh_clear()
+
+
+def object_to_obj_mesh(obj, depsgraph, global_scale=1.0):
+    arrays = read_evaluated_mesh_arrays(obj, depsgraph)
+    if arrays is None:
+        return None
+    positions, loop_totals, loop_vertex_indices, loop_uvs = arrays
+
+    matrix = AXIS_CONVERSION @ np.array(obj.matrix_world, dtype=np.float64)
+    matrix[:3] *= global_scale
+    world_positions = positions @ matrix[:3, :3].T.astype(np.float32) + matrix[:3, 3].astype(np.float32)
+    return obj_writer.ObjMesh(obj.name, world_positions, loop_totals, loop_vertex_indices, loop_uvs)
+
+
+def export_objects(path, objects, depsgraph, global_scale=1.0):
+    """Writes objects with world transforms applied into a single OBJ file."""
+    meshes = (object_to_obj_mesh(obj, depsgraph, global_scale) for obj in objects if obj.type in EXPORTABLE_TYPES)
+    obj_writer.write_obj(path, (mesh for mesh in meshes if mesh is not None))
+
+
+def export_selection_with_operator(path, global_scale=1.0):
+    """Exports the selection with Blender's OBJ export operator."""
+    if 'obj_export' in dir(bpy.ops.wm):
+        bpy.ops.wm.obj_export(filepath=path, export_selected_objects=True, global_scale=global_scale,
+                              export_materials=False)
+    else:
+        bpy.ops.export_scene.obj(filepath=path, use_selection=True, global_scale=global_scale)
@@ -0,0 +1,153 @@
+"""Streaming upload of exported meshes to presigned S3 POST urls.
+
+The exported file is never loaded into memory as a whole: MultipartFileStream
+presents the multipart/form-data body as a file-like object that reads the
+mesh file in chunks, and always closes its file handle. When the presigned
+policy allows a gzip Content-Encoding the mesh is compressed first.
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import time
+import uuid
+
+from . import api_client
+from . import async_computation
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+# Interval in seconds at which upload progress is reported.
+PROGRESS_INTERVAL = 0.25
+
+
+class MultipartFileStream:
+    """File-like multipart/form-data body streaming a single file after the form fields.
+
+    Its length is known up front, so it is sent with a Content-Length header, which
+    S3 requires for POST uploads.
+    """
+
+    def __init__(self, fields, file_field, file_path, filename=None):
+        self.boundary = uuid.uuid4().hex
+        self.file_path = file_path
+        filename = filename or os.path.basename(file_path)
+
+        preamble = []
+        for name, value in fields.items():
+            preamble.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n')
+        preamble.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                        f'Content-Type: application/octet-stream\r\n\r\n')
+        self._preamble = "".join(preamble).encode()
+        self._epilogue = f"\r\n--{self.boundary}--\r\n".encode()
+        self._file_size = os.path.getsize(file_path)
+        self._file = None
+        self.bytes_read = 0
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self._preamble) + self._file_size + len(self._epilogue)
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise ValueError("MultipartFileStream can only be rewound to the start")
+        self.close()
+        self.bytes_read = 0
+
+    def tell(self):
+        return self.bytes_read
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self)
+
+        chunks = []
+        while size > 0 and self.bytes_read < len(self):
+            chunk = self._read_part(size)
+            chunks.append(chunk)
+            size -= len(chunk)
+            self.bytes_read += len(chunk)
+        return b"".join(chunks)
+
+    def _read_part(self, size):
+        position = self.bytes_read
+        if position < len(self._preamble):
+            return self._preamble[position:position + size]
+
+        position -= len(self._preamble)
+        if position < self._file_size:
+            if self._file is None:
+                self._file = open(self.file_path, 'rb')
+            chunk = self._file.read(min(size, self._file_size - position))
+            if not chunk:
+                raise IOError(f"{self.file_path} shrank while being uploaded")
+            if position + len(chunk) >= self._file_size:
+                self.close()
+            return chunk
+
+        position -= self._file_size
+        return self._epilogue[position:position + size]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def accepts_gzip(fields):
+    """Whether the presigned POST policy allows uploading a gzip encoded file."""
+    return any(key.lower() == 'content-encoding' and str(value).lower() == 'gzip' for key, value in fields.items())
+
+
+def compress_file(source_path, target_path):
+    with open(source_path, 'rb') as reader, gzip.open(target_path, 'wb', compresslevel=6) as writer:
+        shutil.copyfileobj(reader, writer, CHUNK_SIZE)
+
+
+async def upload_file(url, fields, file_path, compress=False, on_progress=None):
+    """Uploads file_path to a presigned POST url.
+
+    :param compress: gzip the file first when the presigned policy accepts it.
+    :param on_progress: called on the event loop with (bytes sent, total bytes).
+    :return: the response of the upload request.
+    """
+    upload_path = file_path
+    if compress and accepts_gzip(fields):
+        started = time.perf_counter()
+        upload_path = file_path + ".gz"
+        await async_computation.run_in_executor(async_computation.CPU_EXECUTOR, compress_file, file_path, upload_path)
+        log.info("Compressed %s from %.1f to %.1f MB in %.2fs", file_path, os.path.getsize(file_path) / 1e6,
+                 os.path.getsize(upload_path) / 1e6, time.perf_counter() - started)
+
+    try:
+        with MultipartFileStream(fields, 'file', upload_path, filename=os.path.basename(file_path)) as body:
+
+            async def report_progress():
+                while True:
+                    on_progress(body.bytes_read, len(body))
+                    await asyncio.sleep(PROGRESS_INTERVAL)
+
+            progress_task = asyncio.ensure_future(report_progress()) if on_progress is not None else None
+            try:
+                return await api_client.get_client().post(url, authorized=False, data=body, timeout='upload',
+                                                          headers={'content-type': body.content_type})
+            finally:
+                if progress_task is not None:
+                    progress_task.cancel()
+                    on_progress(body.bytes_read, len(body))
+    finally:
+        if upload_path != file_path and os.path.exists(upload_path):
+            os.remove(upload_path)
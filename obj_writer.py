@@ -0,0 +1,105 @@
+"""Minimal, fast Wavefront OBJ writer working on NumPy arrays.
+
+Only what the texturing backend needs is written: positions, UVs and faces.
+Lines are formatted in large vectorised chunks and written through a big
+buffer, so dense meshes are exported in a fraction of the time the Python
+OBJ operator takes. This module does not depend on bpy.
+"""
+
+import numpy as np
+
+# Number of vertices, UVs or faces formatted per write.
+CHUNK_SIZE = 65536
+
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+class ObjMesh:
+    """Arrays of one object, already in the coordinate system of the OBJ file.
+
+    :param positions: (V, 3) float array.
+    :param loop_totals: (P,) int array with the number of corners of each face.
+    :param loop_vertex_indices: (L,) int array with the vertex index of each face corner.
+    :param loop_uvs: (L, 2) float array with the UV of each face corner, or None.
+    """
+
+    def __init__(self, name, positions, loop_totals, loop_vertex_indices, loop_uvs=None):
+        self.name = name
+        self.positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.loop_totals = np.asarray(loop_totals, dtype=np.int64)
+        self.loop_vertex_indices = np.asarray(loop_vertex_indices, dtype=np.int64)
+        self.loop_uvs = None if loop_uvs is None else np.asarray(loop_uvs, dtype=np.float32).reshape(-1, 2)
+
+
+def _write_rows(writer, row_format, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        writer.write((row_format * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def _write_faces(writer, loop_totals, vertex_indices, uv_indices):
+    """Writes faces in chunks, formatting all faces with the same corner count at once.
+
+    Faces keep their order in the mesh, as with Blender's OBJ exporter. Chunks
+    mixing corner counts are formatted per corner count and the lines are put
+    back in place before writing.
+    """
+    loop_starts = np.zeros(len(loop_totals), dtype=np.int64)
+    np.cumsum(loop_totals[:-1], out=loop_starts[1:])
+
+    for start in range(0, len(loop_totals), CHUNK_SIZE):
+        totals = loop_totals[start:start + CHUNK_SIZE]
+        starts = loop_starts[start:start + CHUNK_SIZE]
+        corner_counts = np.unique(totals)
+        lines = np.empty(len(totals), dtype=object) if len(corner_counts) > 1 else None
+        for corner_count in corner_counts:
+            mask = totals == corner_count
+            face_starts = starts[mask]
+            loops = face_starts[:, None] + np.arange(corner_count)
+            if uv_indices is None:
+                corner_format = "%d"
+                values = vertex_indices[loops]
+            else:
+                corner_format = "%d/%d"
+                values = np.stack((vertex_indices[loops], uv_indices[loops]), axis=-1)
+            face_format = "f " + " ".join([corner_format] * int(corner_count)) + "\n"
+            text = (face_format * len(face_starts)) % tuple(values.ravel().tolist())
+            if lines is None:
+                writer.write(text)
+            else:
+                lines[mask] = text.splitlines(keepends=True)
+        if lines is not None:
+            writer.write("".join(lines.tolist()))
+
+
+def write_obj(path, meshes, deduplicate_uvs=True):
+    """Writes meshes into a single OBJ file at path.
+
+    :param meshes: iterable of ObjMesh.
+    :param deduplicate_uvs: write each distinct UV coordinate only once per object.
+    """
+    vertex_offset = 1
+    uv_offset = 1
+    with open(path, 'w', buffering=WRITE_BUFFER_SIZE, newline='\n') as writer:
+        writer.write("# Leonardo Blender Plugin\n")
+        for mesh in meshes:
+            writer.write(f"o {mesh.name}\n")
+            _write_rows(writer, "v %.6f %.6f %.6f\n", mesh.positions)
+
+            uv_indices = None
+            if mesh.loop_uvs is not None and len(mesh.loop_uvs):
+                if deduplicate_uvs:
+                    # Viewing each (u, v) float32 pair as one uint64 makes np.unique several times
+                    # faster than comparing rows with axis=0.
+                    packed = np.ascontiguousarray(mesh.loop_uvs).view(np.uint64).ravel()
+                    unique_packed, uv_indices = np.unique(packed, return_inverse=True)
+                    uvs = unique_packed.view(np.float32).reshape(-1, 2)
+                    uv_indices = uv_indices.reshape(-1)
+                else:
+                    uvs, uv_indices = mesh.loop_uvs, np.arange(len(mesh.loop_uvs))
+                _write_rows(writer, "vt %.6f %.6f\n", uvs)
+                uv_indices = uv_indices + uv_offset
+                uv_offset += len(uvs)
+
+            _write_faces(writer, mesh.loop_totals, mesh.loop_vertex_indices + vertex_offset, uv_indices)
+            vertex_offset += len(mesh.positions)
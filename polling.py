@@ -0,0 +1,107 @@
+"""Adaptive scheduling of texture generation job status polls.
+
+Polls start with a short interval and back off exponentially (with jitter) up to
+a ceiling. Retry-After and rate-limit headers sent by the server take precedence
+over the computed interval, and every schedule has a hard timeout.
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+
+# Granularity in seconds at which a waiting poll checks whether it was stopped.
+STOP_CHECK_INTERVAL = 0.5
+
+# X-RateLimit-Reset values above this are epoch timestamps (2001-09-09), smaller ones delays in seconds.
+EPOCH_THRESHOLD = 1e9
+
+
+class PollProfile:
+
+    def __init__(self, initial_interval, max_interval, multiplier, jitter, timeout):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.timeout = timeout
+
+
+# Previews only render a single direction and usually finish within seconds.
+PREVIEW_PROFILE = PollProfile(initial_interval=2, max_interval=10, multiplier=1.5, jitter=0.2, timeout=15 * 60)
+FULL_PROFILE = PollProfile(initial_interval=5, max_interval=30, multiplier=1.5, jitter=0.2, timeout=60 * 60)
+
+
+def get_server_delay(headers, now=None):
+    """Returns the delay in seconds the server asked for, or None.
+
+    Understands Retry-After (seconds or HTTP date) and exhausted rate limits
+    announced through X-RateLimit-Remaining/X-RateLimit-Reset.
+    """
+    if not headers:
+        return None
+    now = time.time() if now is None else now
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - now)
+            except (TypeError, ValueError):
+                pass
+
+    if headers.get('x-ratelimit-remaining') == '0' and headers.get('x-ratelimit-reset'):
+        try:
+            reset = float(headers['x-ratelimit-reset'])
+        except ValueError:
+            return None
+        # The reset is either an epoch timestamp or a number of seconds from now. Decided by size
+        # rather than against now, so an epoch that already passed (e.g. clock skew) is not taken
+        # for a delay of decades.
+        return max(0.0, reset - now) if reset > EPOCH_THRESHOLD else max(0.0, reset)
+
+    return None
+
+
+class PollScheduler:
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.started = time.monotonic()
+        self.polls = 0
+        self._interval = profile.initial_interval
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def timed_out(self):
+        return self.elapsed >= self.profile.timeout
+
+    def next_interval(self, headers=None):
+        """Returns how long to wait before the next poll and advances the backoff."""
+        interval = self._interval * random.uniform(1 - self.profile.jitter, 1 + self.profile.jitter)
+        self._interval = min(self._interval * self.profile.multiplier, self.profile.max_interval)
+
+        server_delay = get_server_delay(headers)
+        if server_delay is not None:
+            interval = max(interval, server_delay)
+
+        return min(interval, max(0.0, self.profile.timeout - self.elapsed))
+
+    async def wait(self, headers=None, should_continue=None):
+        """Sleeps until the next poll is due.
+
+        :return: False when should_continue() turned falsy while waiting.
+        """
+        deadline = time.monotonic() + self.next_interval(headers)
+        self.polls += 1
+        while True:
+            if should_continue is not None and not should_continue():
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(min(remaining, STOP_CHECK_INTERVAL))
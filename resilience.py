@@ -0,0 +1,204 @@
+"""Timeouts, retries and a circuit breaker for requests to the Leonardo API and CDN.
+
+Every request gets a connect and a read timeout depending on the kind of
+endpoint. Idempotent requests (GET, status polls, downloads) are retried with
+exponential backoff on connection errors, timeouts and 429/5xx responses,
+honouring Retry-After. A circuit breaker per host stops sending requests for a
+while after repeated failures, so an outage is not hammered by every queued job.
+Failures are raised as LeonardoError, whose message is short enough for the
+status label. This module does not depend on bpy.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from . import instrumentation
+from . import polling
+
+log = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds per kind of endpoint. The read timeout
+# applies to every single read, not to the whole transfer.
+TIMEOUTS = {
+    'api': (10, 30),
+    'download': (10, 60),
+    'upload': (10, 120),
+}
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 15
+
+# Consecutive failures after which a host is considered down, and how long no
+# requests are sent to it before a single trial request is let through.
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30
+
+_breakers = {}
+
+
+class LeonardoError(Exception):
+    """A request failed. str() of the error is meant to be shown to the user."""
+
+    def __init__(self, message, status_code=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+class CircuitOpenError(LeonardoError):
+    """Requests to a host are suspended after repeated failures.
+
+    retry_after is the number of seconds until a trial request will be let through.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message, retryable=True)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'CLOSED'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'OPEN'
+        return 'HALF_OPEN'
+
+    def check(self):
+        """Raises CircuitOpenError unless a request may be sent now."""
+        state = self.state
+        if state == 'CLOSED':
+            return
+        if state == 'HALF_OPEN' and not self._trial_running:
+            self._trial_running = True
+            return
+        remaining = max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f"{self.name} is unavailable, retrying in {remaining:.0f}s", remaining)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_running:
+                log.warning("%s failed %i times in a row, pausing requests for %is", self.name, self.failures,
+                            self.reset_timeout)
+                instrumentation.count('circuit_breaker_trips')
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release_trial(self):
+        """Lets another trial request through after one ended without a response or connection error."""
+        self._trial_running = False
+
+
+def get_breaker(host):
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker(host)
+    return _breakers[host]
+
+
+def reset_breakers():
+    _breakers.clear()
+
+
+def get_timeout(timeout):
+    """Resolves a TIMEOUTS key into (connect, read); numbers, pairs and None are returned as they are."""
+    if isinstance(timeout, str):
+        return TIMEOUTS[timeout]
+    return timeout
+
+
+def backoff_delay(attempt, headers=None):
+    """Seconds to wait before retry number attempt (0-based)."""
+    server_delay = polling.get_server_delay(headers)
+    if server_delay is not None:
+        return min(server_delay, BACKOFF_MAX)
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def describe_response(response):
+    """Returns the error message of an API response, falling back to its status code."""
+    try:
+        body = response.json()
+    except Exception:
+        body = None
+    if isinstance(body, dict):
+        message = body.get('error') or body.get('message')
+        if isinstance(message, str) and message:
+            return f"{message} ({response.status_code})"
+    return f"HTTP {response.status_code}"
+
+
+def raise_for_status(response, action):
+    """Raises a LeonardoError describing a non-2xx response."""
+    if not 200 <= response.status_code < 300:
+        raise LeonardoError(f"{action} failed: {describe_response(response)}", status_code=response.status_code,
+                            retryable=response.status_code in RETRY_STATUSES)
+
+
+def get_json(response, action, *keys):
+    """Returns response.json()[keys[0]][keys[1]]..., raising a LeonardoError when the response does not have them."""
+    raise_for_status(response, action)
+    try:
+        value = response.json()
+        for key in keys:
+            value = value[key]
+    except (ValueError, KeyError, IndexError, TypeError) as ex:
+        raise LeonardoError(f"{action} failed: unexpected response") from ex
+    return value
+
+
+async def call(send, host, retry=True, action="Request"):
+    """Runs send() through the circuit breaker of host, retrying if retry is set.
+
+    :param send: coroutine function sending the request and returning the response.
+    :return: the response. Non-retryable error responses are returned as well,
+        and so is the last response once all attempts were used up.
+    """
+    breaker = get_breaker(host)
+    attempts = MAX_ATTEMPTS if retry else 1
+    for attempt in range(attempts):
+        breaker.check()
+        try:
+            response = await send()
+        except OSError as ex:
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                raise LeonardoError(f"{action} failed: {ex or type(ex).__name__}", retryable=True) from ex
+            delay = backoff_delay(attempt)
+            log.info("%s to %s failed (%s), retrying in %.1fs", action, host, ex, delay)
+        except BaseException:
+            # Cancelled or failed for another reason: says nothing about the host, but must not
+            # leave a half-open breaker waiting forever for the outcome of its trial request.
+            breaker.release_trial()
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                return response
+            delay = backoff_delay(attempt, response.headers)
+            log.info("%s to %s returned %i, retrying in %.1fs", action, host, response.status_code, delay)
+            await response.aclose()
+        instrumentation.count('retries')
+        await asyncio.sleep(delay)
@@ -0,0 +1,74 @@
+"""Index from Leonardo mesh ids to the objects using them.
+
+The selection handler needs to know how many objects share the id of the
+selection. Instead of filtering bpy.data.objects on every depsgraph update, the
+index is built once and rebuilt lazily: after file loads, undo, whenever ids are
+assigned, and when the number of objects in the file changes. Lookups validate
+the indexed objects, so renames are picked up as well.
+"""
+
+import logging
+
+import bpy
+
+log = logging.getLogger(__name__)
+
+_index = {}
+_dirty = True
+_object_count = -1
+_last_signature = None
+
+
+def get_leonardo_id(obj):
+    data = obj.data
+    if data is None or not isinstance(data, bpy.types.ID):
+        return None
+    return data.get('leonardo_id') or None
+
+
+def mark_dirty():
+    global _dirty, _last_signature
+
+    _dirty = True
+    _last_signature = None
+
+
+def rebuild():
+    global _index, _dirty, _object_count
+
+    index = {}
+    for obj in bpy.data.objects:
+        leonardo_id = get_leonardo_id(obj)
+        if leonardo_id:
+            index.setdefault(leonardo_id, set()).add(obj.name)
+
+    _index = index
+    _object_count = len(bpy.data.objects)
+    _dirty = False
+    log.debug("Rebuilt Leonardo id index with %i ids", len(index))
+
+
+def objects_with_id(leonardo_id):
+    """Returns the names of all objects whose mesh has leonardo_id."""
+    if _dirty or len(bpy.data.objects) != _object_count:
+        rebuild()
+
+    names = _index.get(leonardo_id, set())
+    for name in names:
+        obj = bpy.data.objects.get(name)
+        if obj is None or get_leonardo_id(obj) != leonardo_id:
+            rebuild()
+            return _index.get(leonardo_id, set())
+    return names
+
+
+def selection_changed(context):
+    """Whether the selection or active object changed since the last call."""
+    global _last_signature
+
+    active = context.view_layer.objects.active
+    signature = (active.name if active else None, tuple(obj.name for obj in context.selected_objects))
+    if signature == _last_signature:
+        return False
+    _last_signature = signature
+    return True
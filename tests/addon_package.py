@@ -0,0 +1,28 @@
+"""pytest plugin making the add-on modules importable without Blender.
+
+The repository root is the add-on package, whose __init__.py imports bpy. The
+plugin registers the package as leonardo_texturing without running
+__init__.py, so the modules that do not depend on bpy can be imported, and
+keeps pytest from importing __init__.py while collecting the root directory.
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_MODULE = "leonardo_texturing"
+
+if ADDON_MODULE not in sys.modules:
+    package = types.ModuleType(ADDON_MODULE)
+    package.__path__ = [REPO_ROOT]
+    sys.modules[ADDON_MODULE] = package
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collect_directory(path, parent):
+    if str(path) == REPO_ROOT:
+        return pytest.Dir.from_parent(parent, path=path)
+    return None
@@ -0,0 +1,103 @@
+"""Fixtures shared by the tests.
+
+The tests cover the add-on modules that do not depend on bpy and run without
+Blender, from the repository root:
+
+    python -m pytest
+"""
+
+import http.server
+import threading
+
+import pytest
+
+
+def send(handler, status, body=b"", headers=None):
+    """Sends a response with a Content-Length unless headers set another framing."""
+    headers = dict(headers or {})
+    handler.send_response(status)
+    if 'Transfer-Encoding' not in headers and 'Content-Length' not in headers:
+        headers['Content-Length'] = str(len(body))
+    for key, value in headers.items():
+        handler.send_header(key, value)
+    handler.end_headers()
+    if handler.command != 'HEAD':
+        handler.wfile.write(body)
+        handler.wfile.flush()
+
+
+def read_body(handler):
+    return handler.rfile.read(int(handler.headers.get('content-length', 0)))
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.dispatch(self)
+
+    def do_HEAD(self):
+        self.server.dispatch(self)
+
+    def do_POST(self):
+        self.server.dispatch(self)
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    """Local HTTP server answering every path with the handler function registered for it."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.routes = {}
+        self.lock = threading.Lock()
+        # (method, path, client port) of every request received.
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def route(self, path, handler):
+        """Answers requests to path by calling handler with the request handler."""
+        self.routes[path] = handler
+
+    def dispatch(self, handler):
+        path = handler.path.partition("?")[0]
+        with self.lock:
+            self.requests.append((handler.command, handler.path, handler.client_address[1]))
+        route = self.routes.get(path)
+        if route is None:
+            send(handler, 404, b'{"error": "Not found"}')
+        else:
+            route(handler)
+
+    def paths(self):
+        with self.lock:
+            return [path for _, path, _ in self.requests]
+
+
+def serve():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def stub_server():
+    yield from serve()
+
+
+@pytest.fixture
+def other_stub_server():
+    """A second server, on another port and so another host as far as urls are concerned."""
+    yield from serve()
+
@@ -0,0 +1,112 @@
+import numpy as np
+
+from leonardo_texturing import obj_writer
+
+TRIANGLE = obj_writer.ObjMesh(
+    "triangle",
+    positions=[(0, 0, 0), (1, 0, 0), (0, 1, 0)],
+    loop_totals=[3],
+    loop_vertex_indices=[0, 1, 2],
+    loop_uvs=[(0, 0), (1, 0), (0, 1)],
+)
+
+
+def quad_and_triangle(name, loop_uvs=None):
+    """Two faces sharing an edge, the quad first."""
+    return obj_writer.ObjMesh(
+        name,
+        positions=[(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (2, 0, 0)],
+        loop_totals=[4, 3],
+        loop_vertex_indices=[0, 1, 2, 3, 1, 4, 2],
+        loop_uvs=loop_uvs,
+    )
+
+
+def write(tmp_path, meshes, **kwargs):
+    path = tmp_path / "mesh.obj"
+    obj_writer.write_obj(str(path), meshes, **kwargs)
+    return path.read_text().splitlines()
+
+
+def records(lines, kind):
+    return [line for line in lines if line.startswith(kind + " ")]
+
+
+def test_single_mesh(tmp_path):
+    lines = write(tmp_path, [TRIANGLE])
+
+    assert lines == [
+        "# Leonardo Blender Plugin",
+        "o triangle",
+        "v 0.000000 0.000000 0.000000",
+        "v 1.000000 0.000000 0.000000",
+        "v 0.000000 1.000000 0.000000",
+        "vt 0.000000 0.000000",
+        "vt 1.000000 0.000000",
+        "vt 0.000000 1.000000",
+        "f 1/1 2/2 3/3",
+    ]
+
+
+def test_offsets_across_meshes(tmp_path):
+    lines = write(tmp_path, [TRIANGLE, TRIANGLE], deduplicate_uvs=False)
+
+    assert records(lines, "o") == ["o triangle", "o triangle"]
+    assert len(records(lines, "v")) == 6
+    assert len(records(lines, "vt")) == 6
+    assert records(lines, "f") == ["f 1/1 2/2 3/3", "f 4/4 5/5 6/6"]
+
+
+def test_mesh_without_uvs_between_meshes_with_uvs(tmp_path):
+    lines = write(tmp_path, [TRIANGLE, quad_and_triangle("plain"), TRIANGLE])
+
+    assert records(lines, "f") == ["f 1/1 2/2 3/3", "f 4 5 6 7", "f 5 8 6", "f 9/4 10/5 11/6"]
+    assert len(records(lines, "vt")) == 6
+
+
+def test_empty_uvs_are_not_written(tmp_path):
+    lines = write(tmp_path, [quad_and_triangle("empty", loop_uvs=np.zeros((0, 2)))])
+
+    assert records(lines, "vt") == []
+    assert records(lines, "f") == ["f 1 2 3 4", "f 2 5 3"]
+
+
+def test_uvs_are_deduplicated(tmp_path):
+    # The shared edge has the same UVs in both faces.
+    uvs = [(0, 0), (0.5, 0), (0.5, 1), (0, 1), (0.5, 0), (1, 0), (0.5, 1)]
+    lines = write(tmp_path, [quad_and_triangle("shared", uvs)])
+
+    vts = records(lines, "vt")
+    assert len(vts) == 5
+    assert len(set(vts)) == 5
+    # Every corner still points at its own UV.
+    for face, face_uvs in zip(records(lines, "f"), [uvs[:4], uvs[4:]]):
+        uv_indices = [int(corner.split("/")[1]) for corner in face.split()[1:]]
+        assert [tuple(map(float, vts[index - 1].split()[1:])) for index in uv_indices] == face_uvs
+
+
+def test_uvs_without_deduplication(tmp_path):
+    uvs = [(0, 0), (0.5, 0), (0.5, 1), (0, 1), (0.5, 0), (1, 0), (0.5, 1)]
+    lines = write(tmp_path, [quad_and_triangle("shared", uvs)], deduplicate_uvs=False)
+
+    assert len(records(lines, "vt")) == 7
+    assert records(lines, "f") == ["f 1/1 2/2 3/3 4/4", "f 2/5 5/6 3/7"]
+
+
+def test_face_order_is_kept(tmp_path):
+    lines = write(tmp_path, [quad_and_triangle("mixed")])
+
+    assert records(lines, "f") == ["f 1 2 3 4", "f 2 5 3"]
+
+
+def test_face_order_is_kept_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(obj_writer, 'CHUNK_SIZE', 4)
+    rng = np.random.default_rng(0)
+    loop_totals = rng.integers(3, 6, size=11)
+    loop_vertex_indices = np.arange(loop_totals.sum()) % 8
+    mesh = obj_writer.ObjMesh("random", np.zeros((8, 3)), loop_totals, loop_vertex_indices)
+
+    faces = records(write(tmp_path, [mesh]), "f")
+
+    expected = np.split(loop_vertex_indices + 1, np.cumsum(loop_totals)[:-1])
+    assert faces == ["f " + " ".join(map(str, face)) for face in expected]
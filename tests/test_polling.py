@@ -0,0 +1,30 @@
+import pytest
+
+from leonardo_texturing import polling
+
+NOW = 1792310000.0
+
+
+@pytest.mark.parametrize('headers, delay', [
+    (None, None),
+    ({}, None),
+    ({'retry-after': "7"}, 7.0),
+    ({'retry-after': "-3"}, 0.0),
+    ({'retry-after': "Sun, 18 Oct 2026 07:53:30 GMT"}, 10.0),
+    ({'x-ratelimit-remaining': "3", 'x-ratelimit-reset': "60"}, None),
+    ({'x-ratelimit-remaining': "0", 'x-ratelimit-reset': "60"}, 60.0),
+    ({'x-ratelimit-remaining': "0", 'x-ratelimit-reset': str(NOW + 12)}, 12.0),
+    ({'x-ratelimit-remaining': "0", 'x-ratelimit-reset': "soon"}, None),
+])
+def test_server_delay(headers, delay):
+    assert polling.get_server_delay(headers, now=NOW) == delay
+
+
+def test_passed_rate_limit_reset_epoch_means_no_delay():
+    headers = {'x-ratelimit-remaining': "0", 'x-ratelimit-reset': str(NOW - 5)}
+    assert polling.get_server_delay(headers, now=NOW) == 0.0
+
+
+def test_retry_after_takes_precedence_over_rate_limit_headers():
+    headers = {'retry-after': "2", 'x-ratelimit-remaining': "0", 'x-ratelimit-reset': "60"}
+    assert polling.get_server_delay(headers, now=NOW) == 2.0
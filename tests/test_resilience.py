@@ -0,0 +1,227 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from conftest import send
+from leonardo_texturing import resilience
+from leonardo_texturing import transport
+
+HOST = "stub"
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(resilience, 'BACKOFF_BASE', 0.01)
+    resilience.reset_breakers()
+    yield
+    resilience.reset_breakers()
+
+
+@pytest.fixture
+def stall():
+    """Event the stalling handlers wait on, set at the end of the test so their threads finish."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def call(url, retry=True, timeout=None, stream=False):
+    """Requests url through resilience.call on a fresh AsyncioTransport, returning (response, body)."""
+    async def run():
+        client = transport.AsyncioTransport()
+        try:
+            response = await resilience.call(
+                lambda: client.request("GET", url, timeout=timeout, stream=stream), HOST, retry=retry)
+            return response, response.content
+        finally:
+            client.close()
+    return asyncio.run(run())
+
+
+def responses(*replies):
+    """Route handler answering with the (status, body, headers) replies in turn, repeating the last one."""
+    replies = list(replies)
+
+    def handler(request_handler):
+        status, body, headers = replies.pop(0) if len(replies) > 1 else replies[0]
+        send(request_handler, status, body, headers)
+    return handler
+
+
+def test_unavailable_then_ok_is_retried(stub_server):
+    stub_server.route("/status", responses((503, b"", {}), (200, b'{"status": "COMPLETE"}', {})))
+
+    response, _ = call(stub_server.url + "/status")
+
+    assert response.json() == {'status': "COMPLETE"}
+    assert len(stub_server.requests) == 2
+    assert resilience.get_breaker(HOST).state == 'CLOSED'
+
+
+def test_last_error_response_is_returned(stub_server):
+    stub_server.route("/status", responses((503, b'{"error": "Overloaded"}', {})))
+
+    response, _ = call(stub_server.url + "/status")
+
+    assert response.status_code == 503
+    assert len(stub_server.requests) == resilience.MAX_ATTEMPTS
+    with pytest.raises(resilience.LeonardoError, match="Status check failed: Overloaded \\(503\\)") as error:
+        resilience.raise_for_status(response, "Status check")
+    assert error.value.retryable
+
+
+def test_error_response_is_not_retried(stub_server):
+    stub_server.route("/status", responses((401, b'{"error": "Invalid key"}', {})))
+
+    response, _ = call(stub_server.url + "/status")
+
+    assert response.status_code == 401
+    assert len(stub_server.requests) == 1
+
+
+def test_rate_limit_waits_for_retry_after(stub_server, monkeypatch):
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, 'sleep', record_sleep)
+    stub_server.route("/status", responses((429, b"", {'Retry-After': "3"}), (200, b"{}", {})))
+
+    response, _ = call(stub_server.url + "/status")
+
+    assert response.status_code == 200
+    assert delays == [3.0]
+
+
+def test_retry_after_is_capped():
+    assert resilience.backoff_delay(0, {'retry-after': "3600"}) == resilience.BACKOFF_MAX
+    assert resilience.backoff_delay(0, {'retry-after': "2"}) == 2
+
+
+def test_stalled_head_times_out(stub_server, stall):
+    def stalled(handler):
+        stall.wait(5)
+        send(handler, 200, b"{}")
+
+    stub_server.route("/stalled", stalled)
+
+    started = time.monotonic()
+    with pytest.raises(resilience.LeonardoError, match="Timed out") as error:
+        call(stub_server.url + "/stalled", retry=False, timeout=(1, 0.2))
+
+    assert isinstance(error.value.__cause__, transport.RequestTimeout)
+    assert error.value.retryable
+    assert time.monotonic() - started < 2
+
+
+def test_stalled_body_times_out(stub_server, stall):
+    def stalled(handler):
+        handler.send_response(200)
+        handler.send_header('Content-Length', "1000")
+        handler.end_headers()
+        handler.wfile.write(b"x" * 10)
+        handler.wfile.flush()
+        stall.wait(5)
+
+    stub_server.route("/stalled", stalled)
+
+    async def run():
+        client = transport.AsyncioTransport()
+        try:
+            response = await client.request("GET", stub_server.url + "/stalled", stream=True, timeout=(1, 0.2))
+            return [chunk async for chunk in response.iter_chunks()]
+        finally:
+            client.close()
+
+    with pytest.raises(transport.RequestTimeout):
+        asyncio.run(run())
+
+
+def test_connection_errors_are_retried_then_raised():
+    async def refuse():
+        raise ConnectionRefusedError("Connection refused")
+
+    with pytest.raises(resilience.LeonardoError, match="Status check failed: Connection refused") as error:
+        asyncio.run(resilience.call(refuse, HOST, action="Status check"))
+
+    assert error.value.retryable
+    assert resilience.get_breaker(HOST).failures == resilience.MAX_ATTEMPTS
+
+
+def test_breaker_opens_and_half_opens(stub_server):
+    breaker = resilience._breakers[HOST] = resilience.CircuitBreaker(HOST, failure_threshold=2, reset_timeout=0.2)
+    stub_server.route("/status", responses((503, b"", {})))
+
+    for _ in range(2):
+        call(stub_server.url + "/status", retry=False)
+    assert breaker.state == 'OPEN'
+
+    with pytest.raises(resilience.CircuitOpenError) as error:
+        call(stub_server.url + "/status", retry=False)
+    assert 0 < error.value.retry_after <= 0.2
+    assert len(stub_server.requests) == 2
+
+    time.sleep(0.25)
+    assert breaker.state == 'HALF_OPEN'
+    # A failed trial request opens the breaker again right away.
+    call(stub_server.url + "/status", retry=False)
+    assert breaker.state == 'OPEN'
+
+    time.sleep(0.25)
+    stub_server.route("/status", responses((200, b"{}", {})))
+    response, _ = call(stub_server.url + "/status", retry=False)
+    assert response.status_code == 200
+    assert breaker.state == 'CLOSED'
+    assert len(stub_server.requests) == 4
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = resilience.CircuitBreaker(HOST, failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    breaker.check()
+    with pytest.raises(resilience.CircuitOpenError):
+        breaker.check()
+
+
+@pytest.mark.parametrize('error', [asyncio.CancelledError, ValueError])
+def test_interrupted_trial_releases_breaker(error):
+    breaker = resilience._breakers[HOST] = resilience.CircuitBreaker(HOST, failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    async def interrupted():
+        raise error()
+
+    with pytest.raises(error):
+        asyncio.run(resilience.call(interrupted, HOST))
+
+    breaker.check()
+
+
+def test_get_json(stub_server):
+    stub_server.route("/me", responses((200, b'{"user_details": [{"user": {"id": "u1"}}]}', {})))
+    response, _ = call(stub_server.url + "/me")
+
+    assert resilience.get_json(response, "Fetching your account", 'user_details', 0, 'user', 'id') == "u1"
+
+
+@pytest.mark.parametrize('keys', [('user',), ('user_details', 1), ('user_details', 0, 'user', 'id', 'name')])
+def test_get_json_missing_keys(stub_server, keys):
+    stub_server.route("/me", responses((200, b'{"user_details": [{"user": {"id": "u1"}}]}', {})))
+    response, _ = call(stub_server.url + "/me")
+
+    with pytest.raises(resilience.LeonardoError, match="Fetching your account failed: unexpected response"):
+        resilience.get_json(response, "Fetching your account", *keys)
+
+
+def test_get_json_invalid_body(stub_server):
+    stub_server.route("/me", responses((200, b"<html>Bad gateway</html>", {})))
+    response, _ = call(stub_server.url + "/me")
+
+    with pytest.raises(resilience.LeonardoError, match="unexpected response"):
+        resilience.get_json(response, "Fetching your account", 'user_details')
@@ -0,0 +1,261 @@
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+
+import pytest
+
+from conftest import read_body, send
+from leonardo_texturing import transport
+
+
+class SizedStream(io.BytesIO):
+    """File-like request body with a length, like mesh_upload.MultipartFileStream."""
+
+    def __len__(self):
+        return len(self.getbuffer())
+
+
+def request(url, method="GET", **kwargs):
+    """Runs one request on a fresh AsyncioTransport, returning (response, body)."""
+    async def run():
+        client = transport.AsyncioTransport()
+        try:
+            response = await client.request(method, url, **kwargs)
+            return response, response.content
+        finally:
+            client.close()
+    return asyncio.run(run())
+
+
+def send_chunked(handler, chunks, headers=None):
+    handler.send_response(200)
+    handler.send_header('Transfer-Encoding', "chunked")
+    for key, value in (headers or {}).items():
+        handler.send_header(key, value)
+    handler.end_headers()
+    for chunk in chunks:
+        handler.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+    handler.wfile.write(b"0\r\nX-Trailer: ignored\r\n\r\n")
+    handler.wfile.flush()
+
+
+def test_json_body(stub_server):
+    stub_server.route("/json", lambda handler: send(handler, 200, b'{"id": 42}', {'Content-Type': "application/json"}))
+
+    response, _ = request(stub_server.url + "/json", params={'limit': 5})
+
+    assert response.status_code == 200
+    assert response.json() == {'id': 42}
+    assert response.headers['content-type'] == "application/json"
+    assert stub_server.paths() == ["/json?limit=5"]
+
+
+def test_chunked_body(stub_server):
+    chunks = [b"first ", b"second " * 1000, b"third"]
+    stub_server.route("/chunked", lambda handler: send_chunked(handler, chunks))
+
+    _, body = request(stub_server.url + "/chunked")
+
+    assert body == b"".join(chunks)
+
+
+@pytest.mark.parametrize('raw', [b"5\r\nhello\r\n", b"5\r\nhello", b"5\r\nhel"])
+def test_truncated_chunked_body_raises(stub_server, raw):
+    def truncated(handler):
+        handler.send_response(200)
+        handler.send_header('Transfer-Encoding', "chunked")
+        handler.end_headers()
+        handler.wfile.write(raw)
+        handler.wfile.flush()
+        handler.close_connection = True
+
+    stub_server.route("/truncated", truncated)
+
+    with pytest.raises(ConnectionError):
+        request(stub_server.url + "/truncated")
+
+
+def test_gzip_body(stub_server):
+    content = json.dumps({'values': list(range(10000))}).encode()
+    stub_server.route("/gzip", lambda handler: send(handler, 200, gzip.compress(content), {'Content-Encoding': "gzip"}))
+
+    response, body = request(stub_server.url + "/gzip")
+
+    assert body == content
+    assert response.json()['values'][-1] == 9999
+
+
+def test_chunked_gzip_body_streamed(stub_server):
+    content = b"texture " * 50000
+    compressed = gzip.compress(content)
+    chunks = [compressed[index:index + 4096] for index in range(0, len(compressed), 4096)]
+    stub_server.route("/stream", lambda handler: send_chunked(handler, chunks, {'Content-Encoding': "gzip"}))
+
+    async def run():
+        client = transport.AsyncioTransport()
+        response = await client.request("GET", stub_server.url + "/stream", stream=True)
+        received = b"".join([chunk async for chunk in response.iter_chunks(chunk_size=1024)])
+        client.close()
+        return received
+
+    assert asyncio.run(run()) == content
+
+
+def test_keep_alive_reuses_connection(stub_server):
+    stub_server.route("/json", lambda handler: send(handler, 200, b"{}"))
+
+    async def run():
+        client = transport.AsyncioTransport()
+        for _ in range(3):
+            await client.request("GET", stub_server.url + "/json")
+        client.close()
+
+    asyncio.run(run())
+
+    ports = {port for _, _, port in stub_server.requests}
+    assert len(stub_server.requests) == 3
+    assert len(ports) == 1
+
+
+def test_connection_close_is_not_reused(stub_server):
+    stub_server.route("/close", lambda handler: send(handler, 200, b"{}", {'Connection': "close"}))
+
+    async def run():
+        client = transport.AsyncioTransport()
+        for _ in range(2):
+            await client.request("GET", stub_server.url + "/close")
+        client.close()
+
+    asyncio.run(run())
+
+    assert len({port for _, _, port in stub_server.requests}) == 2
+
+
+def test_stale_pooled_connection_is_retried(stub_server):
+    def close_silently(handler):
+        # Closes the connection after the response without announcing it, like an idle timeout on the server.
+        send(handler, 200, b"{}")
+        handler.close_connection = True
+
+    stub_server.route("/stale", close_silently)
+    stub_server.route("/json", lambda handler: send(handler, 200, b'{"ok": true}'))
+
+    async def run():
+        client = transport.AsyncioTransport()
+        await client.request("GET", stub_server.url + "/stale")
+        # No await in between: the pooled connection still looks open.
+        response = await client.request("GET", stub_server.url + "/json")
+        client.close()
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.json() == {'ok': True}
+    assert stub_server.paths() == ["/stale", "/json"]
+    assert len({port for _, _, port in stub_server.requests}) == 2
+
+
+def test_redirect_is_followed(stub_server):
+    stub_server.route("/old", lambda handler: send(handler, 301, headers={'Location': "/new"}))
+    stub_server.route("/new", lambda handler: send(handler, 200, b'{"moved": true}'))
+
+    response, _ = request(stub_server.url + "/old")
+
+    assert response.json() == {'moved': True}
+    assert response.url == stub_server.url + "/new"
+
+
+def test_redirect_to_other_host_drops_credentials(stub_server, other_stub_server):
+    received = {}
+
+    def record(handler):
+        received[handler.path] = (handler.headers['authorization'], handler.headers['cookie'])
+        send(handler, 302, headers={'Location': other_stub_server.url + "/file"})
+
+    def record_other(handler):
+        received[handler.path] = (handler.headers['authorization'], handler.headers['cookie'])
+        send(handler, 200, b"{}")
+
+    stub_server.route("/download", record)
+    other_stub_server.route("/file", record_other)
+
+    request(stub_server.url + "/download", headers={'Authorization': "Bearer SECRET", 'Cookie': "session=1"})
+
+    assert received == {"/download": ("Bearer SECRET", "session=1"), "/file": (None, None)}
+
+
+def test_redirect_on_same_host_keeps_credentials(stub_server):
+    received = []
+    stub_server.route("/old", lambda handler: send(handler, 307, headers={'Location': "/new"}))
+
+    def record(handler):
+        received.append(handler.headers['authorization'])
+        send(handler, 200, b"{}")
+
+    stub_server.route("/new", record)
+
+    request(stub_server.url + "/old", headers={'Authorization': "Bearer SECRET"})
+
+    assert received == ["Bearer SECRET"]
+
+
+def test_see_other_turns_post_into_get(stub_server):
+    def post(handler):
+        read_body(handler)
+        send(handler, 303, headers={'Location': stub_server.url + "/result"})
+
+    stub_server.route("/submit", post)
+    stub_server.route("/result", lambda handler: send(handler, 200, b'{"done": true}'))
+
+    response, _ = request(stub_server.url + "/submit", method="POST", json={'prompt': "oak"})
+
+    assert response.json() == {'done': True}
+    assert [(method, path) for method, path, _ in stub_server.requests] == [("POST", "/submit"), ("GET", "/result")]
+
+
+def test_redirect_loop_stops(stub_server):
+    stub_server.route("/loop", lambda handler: send(handler, 302, headers={'Location': "/loop"}))
+
+    response, _ = request(stub_server.url + "/loop")
+
+    assert response.status_code == 302
+    assert len(stub_server.requests) == transport.MAX_REDIRECTS + 1
+
+
+def test_streamed_upload(stub_server):
+    content = bytes(range(256)) * 4096
+    received = {}
+
+    def upload(handler):
+        received['length'] = int(handler.headers['content-length'])
+        received['digest'] = hashlib.sha256(read_body(handler)).hexdigest()
+        send(handler, 204)
+
+    stub_server.route("/upload", upload)
+
+    response, _ = request(stub_server.url + "/upload", method="POST", data=SizedStream(content))
+
+    assert response.status_code == 204
+    assert received == {'length': len(content), 'digest': hashlib.sha256(content).hexdigest()}
+
+
+def test_multipart_upload(stub_server):
+    received = {}
+
+    def upload(handler):
+        received['content_type'] = handler.headers['content-type']
+        received['body'] = read_body(handler)
+        send(handler, 204)
+
+    stub_server.route("/upload", upload)
+    mesh = io.BytesIO(b"v 0 0 0\n")
+    mesh.name = "mesh.obj"
+
+    request(stub_server.url + "/upload", method="POST", data={'key': "models/1.obj"}, files={'file': mesh})
+
+    assert received['content_type'].startswith("multipart/form-data; boundary=")
+    assert b'name="key"\r\n\r\nmodels/1.obj\r\n' in received['body']
+    assert b'filename="mesh.obj"' in received['body']
+    assert b"v 0 0 0\n" in received['body']
@@ -0,0 +1,171 @@
+"""Persistent on-disk cache for downloaded texture maps.
+
+Entries are keyed by generation id and texture map type, and remember the url
+and ETag they were downloaded from. A json index next to the cached files keeps
+track of sizes and access times, which are used for LRU eviction once the
+configured size limit is exceeded. The cache directory may live on a shared
+drive, so the index is always replaced atomically, and the cache is used from
+the I/O executor rather than the main thread. A size limit of 0 disables it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import bpy
+
+log = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.json"
+
+_cache = None
+
+
+class TextureCache:
+    """Thread-safe, as concurrent downloads use it from several executor threads."""
+
+    def __init__(self, directory, size_limit):
+        self.directory = directory
+        self.size_limit = size_limit
+        self.hits = 0
+        self.misses = 0
+        self._index_mtime = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(generation_id, map_type):
+        return hashlib.sha256(f"{generation_id}:{map_type}".encode()).hexdigest()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_FILENAME)
+
+    def _load_index(self):
+        # Other workstations may have changed the index on a shared drive.
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            self._entries = {}
+            self._index_mtime = None
+            return
+
+        if mtime == self._index_mtime:
+            return
+        try:
+            with open(self.index_path, 'r') as reader:
+                self._entries = json.load(reader)
+        except (OSError, ValueError):
+            log.warning("Texture cache index at %s is unreadable, starting empty", self.index_path)
+            self._entries = {}
+        self._index_mtime = mtime
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as writer:
+            json.dump(self._entries, writer)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime = os.path.getmtime(self.index_path)
+
+    def lookup(self, generation_id, map_type, url):
+        """Returns the path of the cached file, or None when it has to be downloaded."""
+        if not generation_id or not map_type or self.size_limit <= 0:
+            return None
+
+        with self._lock:
+            self._load_index()
+            key = self.make_key(generation_id, map_type)
+            entry = self._entries.get(key)
+            path = os.path.join(self.directory, entry['file']) if entry else None
+            if entry is None or entry.get('url') != url or not os.path.exists(path):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            entry['last_access'] = time.time()
+            self._save_index()
+            return path
+
+    def store(self, generation_id, map_type, url, source_path, etag=None):
+        """Copies a freshly downloaded file into the cache and evicts old entries."""
+        if not generation_id or not map_type or self.size_limit <= 0:
+            return
+
+        key = self.make_key(generation_id, map_type)
+        filename = key + os.path.splitext(source_path)[1]
+        os.makedirs(self.directory, exist_ok=True)
+        cache_path = os.path.join(self.directory, filename)
+        # The copy does not need the lock, each map has its own file.
+        shutil.copyfile(source_path, cache_path + ".part")
+        os.replace(cache_path + ".part", cache_path)
+
+        with self._lock:
+            self._load_index()
+            self._entries[key] = {
+                'file': filename,
+                'size': os.path.getsize(cache_path),
+                'last_access': time.time(),
+                'url': url,
+                'etag': etag,
+                'generation_id': generation_id,
+                'map_type': map_type,
+            }
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        total_size = sum(entry['size'] for entry in self._entries.values())
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1]['last_access']):
+            if total_size <= self.size_limit:
+                break
+            log.debug("Evicting %s from texture cache", entry['file'])
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except OSError:
+                pass
+            total_size -= entry['size']
+            del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            self._load_index()
+            return {
+                'entries': len(self._entries),
+                'size': sum(entry['size'] for entry in self._entries.values()),
+                'size_limit': self.size_limit,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            for entry in self._entries.values():
+                try:
+                    os.remove(os.path.join(self.directory, entry['file']))
+                except OSError:
+                    pass
+            self._entries = {}
+            self._save_index()
+
+
+def default_cache_directory():
+    return bpy.utils.user_resource('DATAFILES', path="leonardo_texture_cache")
+
+
+def get_cache():
+    """Returns the add-on wide cache, rebuilding it when its preferences have changed."""
+    global _cache
+
+    preferences = bpy.context.preferences.addons[__package__].preferences
+    directory = bpy.path.abspath(preferences.cache_directory) if preferences.cache_directory else default_cache_directory()
+    size_limit = preferences.cache_size_limit * 1024 * 1024
+    if _cache is None or _cache.directory != directory:
+        _cache = TextureCache(directory, size_limit)
+    _cache.size_limit = size_limit
+    return _cache
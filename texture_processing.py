@@ -0,0 +1,145 @@
+"""Optional post-processing of downloaded texture maps.
+
+Every map is decoded once in the CPU executor and downscaled into resolution
+variants, written next to the original file. The material shows a variant in
+the viewport and switches to the full resolution maps for final renders.
+Roughness and displacement can also be packed into the channels of a single
+image, so one texture less has to be loaded.
+"""
+
+import asyncio
+import os
+
+import bpy
+import numpy as np
+
+from . import async_computation
+
+# Longest side of each resolution variant in pixels. Maps that are already
+# smaller are used as they are.
+VARIANT_SIZES = {
+    '1K': 1024,
+    '2K': 2048,
+}
+
+VARIANT_DIRECTORY = 'variants'
+
+# Map type of the image holding roughness in its red and displacement in its green channel.
+PACKED_MAP = 'packed'
+PACKED_FILENAME = 'roughness_displacement.png'
+
+
+def get_preferences():
+    return bpy.context.preferences.addons[__package__].preferences
+
+
+def get_variant_path(path, variant):
+    return os.path.join(os.path.dirname(path), VARIANT_DIRECTORY, variant, os.path.basename(path))
+
+
+def write_resolution_variants(path, variants):
+    """Decodes the map at path once and writes a downscaled copy per variant.
+
+    Runs in the CPU executor, so only imbuf is used and never bpy.data.
+
+    :return: dict mapping each variant to its file path; the original path when
+        the map is not larger than the variant.
+    """
+    import imbuf
+
+    variant_paths = {}
+    image = None
+    try:
+        for variant in sorted(variants, key=VARIANT_SIZES.get, reverse=True):
+            variant_path = get_variant_path(path, variant)
+            if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= os.path.getmtime(path):
+                variant_paths[variant] = variant_path
+                continue
+
+            if image is None:
+                image = imbuf.load(path)
+            width, height = image.size
+            scale = VARIANT_SIZES[variant] / max(width, height)
+            if scale >= 1:
+                variant_paths[variant] = path
+                continue
+
+            # Downscale the largest variant first and keep shrinking the same buffer.
+            image.resize((max(1, round(width * scale)), max(1, round(height * scale))), method='BILINEAR')
+            os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+            imbuf.write(image, filepath=variant_path)
+            variant_paths[variant] = variant_path
+    finally:
+        if image is not None:
+            image.free()
+    return variant_paths
+
+
+def pack_channels(roughness_path, displacement_path):
+    """Writes roughness into the red and displacement into the green channel of one PNG.
+
+    Pixels are only accessible through bpy, so this runs on the main thread.
+
+    :return: the path of the packed image, or None when the maps differ in size.
+    """
+    packed_path = os.path.join(os.path.dirname(roughness_path), PACKED_FILENAME)
+    images = [bpy.data.images.load(path) for path in (roughness_path, displacement_path)]
+    try:
+        for image in images:
+            image.colorspace_settings.name = 'Non-Color'
+        if tuple(images[0].size) != tuple(images[1].size):
+            print(f"Not packing {roughness_path} and {displacement_path}, their sizes differ")
+            return None
+
+        width, height = images[0].size
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        packed = np.zeros((width * height, 4), dtype=np.float32)
+        packed[:, 3] = 1.0
+        for channel, image in enumerate(images):
+            image.pixels.foreach_get(pixels)
+            packed[:, channel] = pixels.reshape(-1, 4)[:, 0]
+
+        result = bpy.data.images.new(PACKED_FILENAME, width, height, alpha=False, is_data=True)
+        images.append(result)
+        result.pixels.foreach_set(packed.ravel())
+        result.filepath_raw = packed_path
+        result.file_format = 'PNG'
+        result.save()
+        return packed_path
+    finally:
+        for image in images:
+            bpy.data.images.remove(image)
+
+
+async def prepare_texture_maps(texture_paths):
+    """Runs the post-processing stage configured in the preferences.
+
+    :return: (texture_paths, viewport_paths). texture_paths holds the full
+        resolution maps to assign, with roughness and displacement replaced by the
+        packed map when packing is enabled. viewport_paths maps the same map types
+        to the variant shown in the viewport, and is empty when the stage is off.
+    """
+    preferences = get_preferences()
+    if not preferences.texture_post_processing:
+        return texture_paths, {}
+
+    texture_paths = dict(texture_paths)
+    if preferences.pack_channels and 'roughness' in texture_paths and 'displacement' in texture_paths:
+        packed_path = pack_channels(texture_paths['roughness'], texture_paths['displacement'])
+        if packed_path is not None:
+            del texture_paths['roughness'], texture_paths['displacement']
+            texture_paths[PACKED_MAP] = packed_path
+
+    map_types = list(texture_paths)
+    results = await asyncio.gather(*(
+        async_computation.run_in_executor(async_computation.CPU_EXECUTOR, write_resolution_variants,
+                                          texture_paths[map_type], list(VARIANT_SIZES))
+        for map_type in map_types))
+
+    viewport_size = preferences.viewport_texture_size
+    viewport_paths = {map_type: variants[viewport_size] for map_type, variants in zip(map_types, results)}
+    return texture_paths, viewport_paths
+
+
+def use_viewport_textures(scene):
+    return scene.leonardo_tools.texture_resolution == 'VIEWPORT'
@@ -0,0 +1,484 @@
+"""HTTP transports used by the Leonardo API client.
+
+Two interchangeable implementations are provided:
+
+* AsyncioTransport speaks HTTP/1.1 directly on asyncio streams, so requests
+  never occupy an executor thread while waiting on the network.
+* RequestsTransport runs a pooled requests.Session in the loop's executor and
+  is kept as a fallback for setups where the native transport misbehaves.
+
+Both return response objects with the same small interface: status_code,
+headers (lower-cased keys), content, json(), and for stream=True requests
+iter_chunks() and aclose().
+
+Request bodies can be bytes or a file-like object with read(), seek() and
+__len__(), which is streamed with a Content-Length header instead of being
+loaded into memory.
+"""
+
+import asyncio
+import functools
+import json as jsonlib
+import logging
+import ssl
+import urllib.parse
+import uuid
+import zlib
+
+import requests
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
+USER_AGENT = "leonardo-blender-plugin"
+
+
+class RequestTimeout(OSError):
+    """Connecting or waiting for data took longer than the request's timeout."""
+
+
+def split_timeout(timeout):
+    """Returns (connect timeout, read timeout) of a number, a pair or None."""
+    if timeout is None or isinstance(timeout, (int, float)):
+        return timeout, timeout
+    return tuple(timeout)
+
+
+async def wait_for(awaitable, timeout, what):
+    """Awaits awaitable, raising RequestTimeout after timeout seconds (None waits forever)."""
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise RequestTimeout(f"Timed out after {timeout}s while {what}") from None
+
+
+def encode_multipart(fields, files):
+    """Encodes form fields and files as a multipart/form-data body.
+
+    :return: (body bytes, content type header value)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
+        parts.append(str(value).encode() + b"\r\n")
+
+    for name, fileobj in (files or {}).items():
+        filename = getattr(fileobj, "name", name).replace("\\", "/").split("/")[-1]
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+        parts.append(fileobj.read())
+        parts.append(b"\r\n")
+
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _ssl_context():
+    try:
+        import certifi
+        return ssl.create_default_context(cafile=certifi.where())
+    except ImportError:
+        return ssl.create_default_context()
+
+
+class TransportResponse:
+    """Response interface shared by both transports."""
+
+    status_code = 0
+    headers = None
+    content = b""
+    url = ""
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+    async def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        yield self.content
+
+    async def aclose(self):
+        pass
+
+    def __repr__(self):
+        return f"<Response [{self.status_code}]>"
+
+
+# ------------------------------------------------------------------------
+#    requests + executor transport
+# ------------------------------------------------------------------------
+
+class RequestsResponse(TransportResponse):
+
+    def __init__(self, response, stream):
+        self._response = response
+        self._stream = stream
+        self.status_code = response.status_code
+        self.headers = {key.lower(): value for key, value in response.headers.items()}
+        self.url = response.url
+
+    @property
+    def content(self):
+        return self._response.content
+
+    async def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        loop = asyncio.get_event_loop()
+        iterator = self._response.iter_content(chunk_size)
+        while True:
+            try:
+                chunk = await loop.run_in_executor(None, next, iterator, None)
+            except requests.exceptions.Timeout as ex:
+                raise RequestTimeout(str(ex)) from ex
+            if chunk is None:
+                return
+            yield chunk
+
+    async def aclose(self):
+        self._response.close()
+
+
+class RequestsTransport:
+    """Blocking requests.Session calls, run in the asyncio default executor (the add-on's I/O pool)."""
+
+    name = "REQUESTS"
+
+    def __init__(self, pool_maxsize=10):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    async def request(self, method, url, headers=None, params=None, json=None, data=None, files=None,
+                      stream=False, timeout=None):
+        partial = functools.partial(self.session.request, method, url, headers=headers, params=params,
+                                    json=json, data=data, files=files, stream=stream,
+                                    timeout=split_timeout(timeout))
+        loop = asyncio.get_event_loop()
+        try:
+            response = await loop.run_in_executor(None, partial)
+        except requests.exceptions.Timeout as ex:
+            raise RequestTimeout(str(ex)) from ex
+        return RequestsResponse(response, stream)
+
+    def close(self):
+        self.session.close()
+
+
+# ------------------------------------------------------------------------
+#    Native asyncio transport
+# ------------------------------------------------------------------------
+
+class _Connection:
+
+    def __init__(self, key, reader, writer):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class _TimedReader:
+    """Applies the read timeout to every read from a StreamReader."""
+
+    def __init__(self, reader, timeout):
+        self._reader = reader
+        self._timeout = timeout
+
+    def read(self, size):
+        return wait_for(self._reader.read(size), self._timeout, "reading the response")
+
+    def readline(self):
+        return wait_for(self._reader.readline(), self._timeout, "reading the response")
+
+    async def readexactly(self, size):
+        try:
+            return await wait_for(self._reader.readexactly(size), self._timeout, "reading the response")
+        except asyncio.IncompleteReadError as ex:
+            # Not an OSError, so callers would not treat it as the broken connection it is.
+            raise ConnectionError(f"Connection closed with {ex.expected - len(ex.partial)} bytes left to read") from ex
+
+
+class AsyncioResponse(TransportResponse):
+
+    def __init__(self, transport, connection, method, url, status_code, headers, read_timeout=None):
+        self._transport = transport
+        self._connection = connection
+        self._method = method
+        self._read_timeout = read_timeout
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = b""
+        self._consumed = False
+        self._decoder = None
+        if headers.get("content-encoding", "").lower() == "gzip":
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _has_body(self):
+        return not (self._method == "HEAD" or self.status_code in (204, 304) or 100 <= self.status_code < 200)
+
+    async def _raw_chunks(self, chunk_size):
+        reader = _TimedReader(self._connection.reader, self._read_timeout)
+        if not self._has_body():
+            return
+
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await reader.readline()
+                if not size_line:
+                    raise ConnectionError("Connection closed before the last chunk")
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip optional trailers up to the terminating blank line.
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                remaining = size
+                while remaining:
+                    chunk = await reader.read(min(remaining, chunk_size))
+                    if not chunk:
+                        raise ConnectionError("Connection closed in the middle of a chunk")
+                    remaining -= len(chunk)
+                    yield chunk
+                await reader.readexactly(2)
+
+        elif "content-length" in self.headers:
+            remaining = int(self.headers["content-length"])
+            while remaining:
+                chunk = await reader.read(min(remaining, chunk_size))
+                if not chunk:
+                    raise ConnectionError(f"Connection closed with {remaining} bytes left to read")
+                remaining -= len(chunk)
+                yield chunk
+
+        else:
+            # Body is delimited by the server closing the connection.
+            self.headers["connection"] = "close"
+            while True:
+                chunk = await reader.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        if self._consumed:
+            if self.content:
+                yield self.content
+            return
+
+        try:
+            async for chunk in self._raw_chunks(chunk_size):
+                if self._decoder is not None:
+                    chunk = self._decoder.decompress(chunk)
+                    if not chunk:
+                        continue
+                yield chunk
+            if self._decoder is not None:
+                tail = self._decoder.flush()
+                if tail:
+                    yield tail
+        except BaseException:
+            self._release(reuse=False)
+            raise
+
+        self._consumed = True
+        self._release(reuse=True)
+
+    async def read(self):
+        if not self._consumed:
+            self.content = b"".join([chunk async for chunk in self.iter_chunks()])
+        return self.content
+
+    def _release(self, reuse):
+        if self._connection is None:
+            return
+        reuse = reuse and self.headers.get("connection", "").lower() != "close"
+        self._transport._release(self._connection, reuse)
+        self._connection = None
+
+    async def aclose(self):
+        # A partially read body leaves the connection in an unknown state.
+        self._release(reuse=self._consumed)
+
+
+class AsyncioTransport:
+    """Minimal keep-alive HTTP/1.1 client running entirely on the event loop."""
+
+    name = "ASYNCIO"
+
+    def __init__(self, pool_maxsize=10):
+        self.pool_maxsize = pool_maxsize
+        self._idle = {}
+        self._ssl_context = None
+
+    async def request(self, method, url, headers=None, params=None, json=None, data=None, files=None,
+                      stream=False, timeout=None):
+        body, content_type = self._encode_body(json, data, files)
+        request_headers = {"user-agent": USER_AGENT, "accept-encoding": "gzip"}
+        if content_type:
+            request_headers["content-type"] = content_type
+        request_headers.update({key.lower(): value for key, value in (headers or {}).items()})
+
+        if params:
+            separator = "&" if urllib.parse.urlsplit(url).query else "?"
+            url = f"{url}{separator}{urllib.parse.urlencode(params)}"
+
+        for redirects in range(MAX_REDIRECTS + 1):
+            response = await self._send(method, url, request_headers, body, timeout)
+            location = response.headers.get("location")
+            if response.status_code not in (301, 302, 303, 307, 308) or not location or redirects == MAX_REDIRECTS:
+                break
+            await response.aclose()
+            previous_host = urllib.parse.urlsplit(url).netloc
+            url = urllib.parse.urljoin(url, location)
+            if urllib.parse.urlsplit(url).netloc != previous_host:
+                # Like requests, never hand the API key or cookies over to another host.
+                request_headers.pop("authorization", None)
+                request_headers.pop("cookie", None)
+            if response.status_code == 303 or (response.status_code in (301, 302) and method == "POST"):
+                method, body = "GET", None
+                request_headers.pop("content-type", None)
+
+        if not stream:
+            await response.read()
+        return response
+
+    @staticmethod
+    def _encode_body(json, data, files):
+        if json is not None:
+            return jsonlib.dumps(json).encode(), "application/json"
+        if files:
+            return encode_multipart(data, files)
+        if isinstance(data, dict):
+            return urllib.parse.urlencode(data).encode(), "application/x-www-form-urlencoded"
+        if isinstance(data, str):
+            return data.encode(), None
+        return data, None
+
+    @staticmethod
+    async def _write_body(writer, body, timeout=None):
+        if body is None:
+            return
+        if isinstance(body, (bytes, bytearray)):
+            writer.write(body)
+            await wait_for(writer.drain(), timeout, "sending the request")
+            return
+
+        body.seek(0)
+        while True:
+            chunk = body.read(DEFAULT_CHUNK_SIZE)
+            if not chunk:
+                return
+            writer.write(chunk)
+            await wait_for(writer.drain(), timeout, "sending the request")
+
+    async def _send(self, method, url, headers, body, timeout=None):
+        parts = urllib.parse.urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        request_headers = {"host": parts.netloc, "connection": "keep-alive"}
+        request_headers.update(headers)
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            request_headers["content-length"] = str(len(body or b""))
+
+        head = f"{method} {target} HTTP/1.1\r\n"
+        head += "".join(f"{key}: {value}\r\n" for key, value in request_headers.items())
+        head = head.encode("latin-1") + b"\r\n"
+
+        # A pooled connection may have been closed by the server in the meantime,
+        # in which case the request is retried once on a fresh connection.
+        connect_timeout, read_timeout = split_timeout(timeout)
+        for attempt in range(2):
+            connection, reused = await self._acquire(parts, connect_timeout)
+            try:
+                connection.writer.write(head)
+                await self._write_body(connection.writer, body, read_timeout)
+                status_code, response_headers = await wait_for(self._read_head(connection.reader), read_timeout,
+                                                               "waiting for the response")
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError) as ex:
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                if isinstance(ex, asyncio.IncompleteReadError):
+                    raise ConnectionError("Connection closed while reading the response") from ex
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            return AsyncioResponse(self, connection, method, url, status_code, response_headers, read_timeout)
+
+    @staticmethod
+    async def _read_head(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before response")
+        status_code = int(status_line.split(b" ", 2)[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n"):
+                break
+            if not line:
+                raise ConnectionError("Connection closed while reading headers")
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        return status_code, headers
+
+    async def _acquire(self, parts, connect_timeout=None):
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        key = (parts.scheme, parts.hostname, port)
+
+        idle = self._idle.get(key, [])
+        while idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof() and not connection.writer.is_closing():
+                return connection, True
+            connection.close()
+
+        ssl_context = None
+        if secure:
+            if self._ssl_context is None:
+                self._ssl_context = _ssl_context()
+            ssl_context = self._ssl_context
+        reader, writer = await wait_for(asyncio.open_connection(parts.hostname, port, ssl=ssl_context,
+                                                                limit=2 * DEFAULT_CHUNK_SIZE),
+                                        connect_timeout, f"connecting to {parts.hostname}")
+        return _Connection(key, reader, writer), False
+
+    def _release(self, connection, reuse):
+        idle = self._idle.setdefault(connection.key, [])
+        if reuse and len(idle) < self.pool_maxsize:
+            idle.append(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+        self._idle.clear()
+
+
+TRANSPORTS = {
+    AsyncioTransport.name: AsyncioTransport,
+    RequestsTransport.name: RequestsTransport,
+}
+
+
+def create_transport(name, pool_maxsize=10):
+    """Creates the transport registered under name, falling back to requests."""
+    transport_class = TRANSPORTS.get(name, RequestsTransport)
+    log.debug("Using %s HTTP transport", transport_class.name)
+    return transport_class(pool_maxsize=pool_maxsize)